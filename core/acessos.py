@@ -0,0 +1,227 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import HistoricoAcesso, ResumoAcesso
+
+logger = logging.getLogger(__name__)
+
+Usuario = get_user_model()
+
+CONFIGURACAO_PADRAO = {
+    "ATIVO": True,
+    "TAMANHO_LOTE": 200,
+    "INTERVALO": 5.0,
+    "CAPACIDADE": 10000,
+    "POLITICA": "descartar",
+    "TAXA_AMOSTRAGEM": 10,
+}
+
+
+class BufferAcessos:
+    """Acumula registros de acesso em memória e os grava em lote
+
+    Os registros são gravados com bulk_create por uma thread em segundo plano
+    quando o buffer atinge TAMANHO_LOTE ou a cada INTERVALO segundos, e uma
+    última vez quando o processo termina. Com o buffer cheio (CAPACIDADE), novos
+    registros são descartados; com a política "amostrar", acima de metade da
+    capacidade apenas 1 a cada TAXA_AMOSTRAGEM registros é mantido.
+    """
+
+    def __init__(self, tamanho_lote, intervalo, capacidade, politica, taxa_amostragem):
+        if politica not in ("descartar", "amostrar"):
+            raise ValueError(f"Política de buffer desconhecida: {politica}")
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.capacidade = capacidade
+        self.politica = politica
+        self.taxa_amostragem = taxa_amostragem
+
+        self.recebidos = 0
+        self.descartados = 0
+        self.gravados = 0
+
+        self._registros = []
+        self._trava = threading.Lock()
+        self._sinal = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def registrar(self, usuario_id, ip):
+        with self._trava:
+            self.recebidos += 1
+            pendentes = len(self._registros)
+            if pendentes >= self.capacidade or (
+                self.politica == "amostrar"
+                and pendentes >= self.capacidade // 2
+                and self.recebidos % self.taxa_amostragem
+            ):
+                self.descartados += 1
+                return
+            self._registros.append((usuario_id, ip, timezone.now()))
+            cheio = len(self._registros) >= self.tamanho_lote
+
+        self._garantir_thread()
+        if cheio:
+            self._sinal.set()
+
+    def descarregar(self):
+        """Grava imediatamente todos os registros pendentes"""
+        with self._trava:
+            registros, self._registros = self._registros, []
+        if not registros:
+            return 0
+        try:
+            try:
+                gravar_acessos(registros, batch_size=self.tamanho_lote)
+            except IntegrityError:
+                # Um usuário apagado desde o acesso invalida o lote inteiro;
+                # descarta apenas os registros dele e tenta de novo
+                existentes = set(
+                    Usuario.objects.filter(
+                        id__in={registro[0] for registro in registros}
+                    ).values_list("id", flat=True)
+                )
+                validos = [r for r in registros if r[0] in existentes]
+                with self._trava:
+                    self.descartados += len(registros) - len(validos)
+                registros = validos
+                gravar_acessos(registros, batch_size=self.tamanho_lote)
+        except DatabaseError:
+            logger.exception("Falha ao gravar %d registros de acesso", len(registros))
+            with self._trava:
+                self.descartados += len(registros)
+            return 0
+        with self._trava:
+            self.gravados += len(registros)
+        return len(registros)
+
+    def _garantir_thread(self):
+        # Recria a thread em processos filhos criados por fork
+        if self._pid == os.getpid():
+            return
+        with self._trava:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._executar, name="buffer-acessos", daemon=True
+            )
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            self._sinal.wait(self.intervalo)
+            self._sinal.clear()
+            self.descarregar()
+            connection.close()
+
+
+def _configuracao():
+    return {**CONFIGURACAO_PADRAO, **getattr(settings, "HISTORICO_ACESSO_BUFFER", {})}
+
+
+_buffer = None
+_trava_buffer = threading.Lock()
+
+
+def obter_buffer():
+    """Buffer de acessos do processo, criado no primeiro uso"""
+    global _buffer
+    if _buffer is None:
+        with _trava_buffer:
+            if _buffer is None:
+                configuracao = _configuracao()
+                _buffer = BufferAcessos(
+                    tamanho_lote=configuracao["TAMANHO_LOTE"],
+                    intervalo=configuracao["INTERVALO"],
+                    capacidade=configuracao["CAPACIDADE"],
+                    politica=configuracao["POLITICA"],
+                    taxa_amostragem=configuracao["TAXA_AMOSTRAGEM"],
+                )
+                atexit.register(_buffer.descarregar)
+    return _buffer
+
+
+def registrar_acesso(usuario_id, ip):
+    """Registra um acesso pelo buffer, ou diretamente se ele estiver desativado"""
+    if _configuracao()["ATIVO"]:
+        obter_buffer().registrar(usuario_id, ip)
+    else:
+        gravar_acessos([(usuario_id, ip, timezone.now())])
+
+
+def acumular_resumos(contagens):
+    """Soma contagens de acesso aos resumos por usuário, IP e hora
+
+    `contagens` mapeia (usuario_id, ip, periodo) para [total, primeiro, ultimo].
+    Cada resumo é atualizado no próprio registro (total = total + n) e criado
+    quando ainda não existe.
+    """
+    with transaction.atomic(savepoint=False):
+        for (usuario_id, ip, periodo), (total, primeiro, ultimo) in contagens.items():
+            chave = {"usuario_id": usuario_id, "ip": ip, "periodo": periodo}
+            incremento = {
+                "total": F("total") + total,
+                "primeiro_acesso": Least("primeiro_acesso", Value(primeiro)),
+                "ultimo_acesso": Greatest("ultimo_acesso", Value(ultimo)),
+            }
+            if ResumoAcesso.objects.filter(**chave).update(**incremento):
+                continue
+            try:
+                with transaction.atomic():
+                    ResumoAcesso.objects.create(
+                        total=total,
+                        primeiro_acesso=primeiro,
+                        ultimo_acesso=ultimo,
+                        **chave,
+                    )
+            except IntegrityError:
+                # Criado por outro processo entre o UPDATE e o INSERT
+                ResumoAcesso.objects.filter(**chave).update(**incremento)
+
+
+def gravar_acessos(registros, batch_size=None):
+    """Grava tuplas (usuario_id, ip, data) conforme settings.HISTORICO_ACESSO_MODO
+
+    No modo "ambos", as linhas individuais e os resumos são gravados na mesma
+    transação.
+    """
+    modo = getattr(settings, "HISTORICO_ACESSO_MODO", "ambos")
+    if modo == "resumo":
+        acumular_resumos(contar_acessos(registros))
+        return
+
+    with transaction.atomic():
+        HistoricoAcesso.objects.bulk_create(
+            [
+                HistoricoAcesso(usuario_id=usuario_id, ip=ip, data_acesso=data)
+                for usuario_id, ip, data in registros
+            ],
+            batch_size=batch_size,
+        )
+        if modo == "ambos":
+            acumular_resumos(contar_acessos(registros))
+
+
+def contar_acessos(registros):
+    """{(usuario_id, ip, periodo): [total, primeiro, ultimo]} dos registros"""
+    contagens = {}
+    for usuario_id, ip, data in registros:
+        chave = (usuario_id, ip or "", ResumoAcesso.inicio_periodo(data))
+        contagem = contagens.get(chave)
+        if contagem is None:
+            contagens[chave] = [1, data, data]
+        else:
+            contagem[0] += 1
+            contagem[1] = min(contagem[1], data)
+            contagem[2] = max(contagem[2], data)
+    return contagens
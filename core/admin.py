@@ -9,9 +9,22 @@ from .models import (
     Avaliacao,
     AtividadeSugerida,
     HistoricoAcesso,
+    ResumoAcesso,
+    TarefaExportacao,
 )
 
 
+class RelacionadosDoRotuloMixin:
+    """Carrega as relações de list_select_related em todas as páginas
+
+    O __str__ destes modelos lê o usuário (e a pergunta), usado no título das
+    páginas de edição e de exclusão.
+    """
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
 class CustomUserAdmin(UserAdmin):
     fieldsets = (
         (None, {"fields": ("username", "password")}),
@@ -65,19 +78,25 @@ class PerguntaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Resposta)
-class RespostaAdmin(admin.ModelAdmin):
+class RespostaAdmin(RelacionadosDoRotuloMixin, admin.ModelAdmin):
     list_display = ("usuario", "pergunta", "resposta", "data_resposta")
     list_filter = ("resposta", "data_resposta")
     search_fields = ("usuario__username", "pergunta__texto")
     date_hierarchy = "data_resposta"
+    list_select_related = ("usuario", "pergunta")
+    # Campo de id no formulário em vez de um <select> com todos os usuários e
+    # avaliações
+    raw_id_fields = ("usuario", "avaliacao")
 
 
 @admin.register(Avaliacao)
-class AvaliacaoAdmin(admin.ModelAdmin):
+class AvaliacaoAdmin(RelacionadosDoRotuloMixin, admin.ModelAdmin):
     list_display = ("usuario", "pontuacao_total", "nivel_sofrimento", "data_avaliacao")
     list_filter = ("nivel_sofrimento", "data_avaliacao")
     search_fields = ("usuario__username",)
     date_hierarchy = "data_avaliacao"
+    list_select_related = ("usuario",)
+    raw_id_fields = ("usuario",)
 
 
 @admin.register(AtividadeSugerida)
@@ -88,11 +107,40 @@ class AtividadeSugeridaAdmin(admin.ModelAdmin):
 
 
 @admin.register(HistoricoAcesso)
-class HistoricoAcessoAdmin(admin.ModelAdmin):
+class HistoricoAcessoAdmin(RelacionadosDoRotuloMixin, admin.ModelAdmin):
     list_display = ("usuario", "data_acesso", "ip")
     list_filter = ("data_acesso",)
     search_fields = ("usuario__username", "ip")
     date_hierarchy = "data_acesso"
+    list_select_related = ("usuario",)
+    raw_id_fields = ("usuario",)
+
+
+@admin.register(ResumoAcesso)
+class ResumoAcessoAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "ip", "periodo", "total", "ultimo_acesso")
+    list_filter = ("periodo",)
+    search_fields = ("usuario__username", "ip")
+    date_hierarchy = "periodo"
+    list_select_related = ("usuario",)
+    raw_id_fields = ("usuario",)
+
+
+@admin.register(TarefaExportacao)
+class TarefaExportacaoAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "formato",
+        "situacao",
+        "processadas",
+        "total",
+        "tamanho",
+        "solicitante",
+        "criado_em",
+    )
+    list_filter = ("situacao", "formato")
+    list_select_related = ("solicitante",)
+    raw_id_fields = ("solicitante",)
 
 
 admin.site.register(Usuario, CustomUserAdmin)
@@ -0,0 +1,67 @@
+from bisect import bisect_left
+
+from .models import Avaliacao, Resposta
+
+
+def lotes_de_usuarios(tamanho_lote):
+    """Percorre, em ordem, os IDs dos usuários com avaliações em lotes de tamanho fixo
+
+    Usa paginação por chave (usuario_id > último visto), sem OFFSET.
+    """
+    ultimo = 0
+    while True:
+        lote = list(
+            Avaliacao.objects.filter(usuario_id__gt=ultimo)
+            .order_by("usuario_id")
+            .values_list("usuario_id", flat=True)
+            .distinct()[:tamanho_lote]
+        )
+        if not lote:
+            return
+        yield lote
+        ultimo = lote[-1]
+
+
+def agrupar_respostas(avaliacoes, respostas):
+    """Associa respostas antigas (sem vínculo) à avaliação a que pertencem
+
+    `avaliacoes` são tuplas (id, usuario_id, data_avaliacao) e `respostas` são
+    tuplas (id, usuario_id, pergunta_id, resposta, data_resposta). Cada resposta
+    pertence à primeira avaliação do mesmo usuário feita no mesmo instante ou
+    depois dela, já que o questionário grava as respostas antes da avaliação.
+    Respostas posteriores à última avaliação do usuário ficam de fora.
+
+    Retorna {avaliacao_id: [(resposta_id, pergunta_id, resposta), ...]}.
+    """
+    por_usuario = {}
+    for avaliacao_id, usuario_id, data in sorted(
+        avaliacoes, key=lambda avaliacao: (avaliacao[1], avaliacao[2], avaliacao[0])
+    ):
+        datas, ids = por_usuario.setdefault(usuario_id, ([], []))
+        datas.append(data)
+        ids.append(avaliacao_id)
+
+    grupos = {}
+    for resposta_id, usuario_id, pergunta_id, resposta, data in respostas:
+        if usuario_id not in por_usuario:
+            continue
+        datas, ids = por_usuario[usuario_id]
+        posicao = bisect_left(datas, data)
+        if posicao == len(datas):
+            continue
+        grupos.setdefault(ids[posicao], []).append((resposta_id, pergunta_id, resposta))
+    return grupos
+
+
+def agrupar_respostas_dos_usuarios(usuarios, somente_sem_vinculo=False):
+    """Carrega e agrupa por avaliação as respostas de um lote de usuários"""
+    avaliacoes = Avaliacao.objects.filter(usuario_id__in=usuarios).values_list(
+        "id", "usuario_id", "data_avaliacao"
+    )
+    respostas = Resposta.objects.filter(usuario_id__in=usuarios)
+    if somente_sem_vinculo:
+        respostas = respostas.filter(avaliacao__isnull=True)
+    respostas = respostas.values_list(
+        "id", "usuario_id", "pergunta_id", "resposta", "data_resposta"
+    )
+    return agrupar_respostas(avaliacoes, respostas.iterator(chunk_size=2000))
@@ -0,0 +1,99 @@
+import gzip
+import json
+import os
+from datetime import date
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def diretorio_arquivo():
+    return settings.HISTORICO_ACESSO_ARQUIVO_DIR
+
+
+def caminho_particao(dia, diretorio=None):
+    """Arquivo do dia: <diretorio>/AAAA/MM/AAAA-MM-DD.ndjson.gz"""
+    return os.path.join(
+        diretorio or diretorio_arquivo(),
+        f"{dia.year:04d}",
+        f"{dia.month:02d}",
+        f"{dia.isoformat()}.ndjson.gz",
+    )
+
+
+def registros_para_arquivar(consulta):
+    """Linhas de HistoricoAcesso da consulta no formato gravado no arquivo"""
+    registros = list(
+        consulta.values("id", "usuario", "usuario__username", "ip", "data_acesso")
+    )
+    for registro in registros:
+        registro["username"] = registro.pop("usuario__username")
+    return registros
+
+
+def anexar_registros(registros, diretorio=None):
+    """Anexa registros de acesso aos arquivos compactados de cada dia
+
+    Cada chamada grava um novo membro gzip no fim do arquivo do dia (o formato
+    permite concatenar membros) e força a gravação em disco antes de retornar,
+    para que as linhas só sejam apagadas do banco depois de arquivadas.
+    """
+    por_dia = {}
+    for registro in registros:
+        dia = timezone.localtime(registro["data_acesso"]).date()
+        por_dia.setdefault(dia, []).append(registro)
+
+    for dia, itens in por_dia.items():
+        caminho = caminho_particao(dia, diretorio)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "ab") as arquivo:
+            with gzip.GzipFile(fileobj=arquivo, mode="wb") as compactado:
+                for item in itens:
+                    data = timezone.localtime(item["data_acesso"])
+                    linha = {**item, "data_acesso": data.isoformat()}
+                    compactado.write((json.dumps(linha) + "\n").encode())
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+
+def particoes(de=None, ate=None, diretorio=None):
+    """Arquivos de partição existentes entre as datas `de` e `ate`, em ordem"""
+    diretorio = diretorio or diretorio_arquivo()
+    if not os.path.isdir(diretorio):
+        return
+    for raiz, pastas, arquivos in os.walk(diretorio):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            if not nome.endswith(".ndjson.gz"):
+                continue
+            try:
+                dia = date.fromisoformat(nome[: -len(".ndjson.gz")])
+            except ValueError:
+                continue
+            if (de and dia < de) or (ate and dia > ate):
+                continue
+            yield os.path.join(raiz, nome)
+
+
+def buscar(de=None, ate=None, usuario=None, ip=None, diretorio=None):
+    """Percorre o arquivo linha a linha, sem carregá-lo no banco ou na memória
+
+    Registros repetidos (de um arquivamento interrompido e refeito) são
+    retornados uma única vez dentro de cada partição.
+    """
+    for caminho in particoes(de, ate, diretorio):
+        vistos = set()
+        with gzip.open(caminho, "rt") as arquivo:
+            for linha in arquivo:
+                registro = json.loads(linha)
+                if registro["id"] in vistos:
+                    continue
+                vistos.add(registro["id"])
+                if usuario is not None and usuario not in (
+                    registro["usuario"],
+                    registro["username"],
+                ):
+                    continue
+                if ip is not None and registro["ip"] != ip:
+                    continue
+                yield registro
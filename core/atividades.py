@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.db import DatabaseError
+
+from .models import AtividadeSugerida
+from .questionario import expirado
+from .serializers import AtividadeSugeridaSerializer
+
+_trava = threading.Lock()
+_indice = None
+_montado_em = None
+_geracao = 0
+
+
+def _montar_indice():
+    indice = {}
+    atividades = AtividadeSugerida.objects.all().order_by("id")
+    for atividade in AtividadeSugeridaSerializer(atividades, many=True).data:
+        indice.setdefault(atividade["nivel_sofrimento"], []).append(atividade)
+    return indice
+
+
+def atividades_por_nivel(nivel_sofrimento):
+    """Atividades sugeridas já serializadas para o nível, sem consultar o banco
+
+    O índice é montado com uma única consulta no primeiro acesso e mantido
+    em memória até ser invalidado pelos sinais de AtividadeSugerida ou até
+    expirar (ver core.questionario.expirado), o que leva as alterações feitas
+    em outros processos a este.
+    """
+    global _indice, _montado_em
+    indice, montado_em = _indice, _montado_em
+    if indice is None or expirado(montado_em):
+        with _trava:
+            indice = _indice
+            if indice is None or expirado(_montado_em):
+                geracao = _geracao
+                indice = _montar_indice()
+                if geracao == _geracao:
+                    _indice, _montado_em = indice, time.monotonic()
+    return indice.get(nivel_sofrimento, [])
+
+
+def invalidar_atividades():
+    global _indice, _geracao
+    _geracao += 1
+    _indice = None
+
+
+def aquecer_atividades():
+    """Monta o índice na inicialização do servidor, se o banco já estiver migrado"""
+    try:
+        atividades_por_nivel(None)
+    except DatabaseError:
+        pass
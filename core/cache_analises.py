@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+CONFIGURACAO_PADRAO = {
+    "TTL": 30.0,
+    "TTL_OBSOLETO": 300.0,
+    "MAX_ENTRADAS": 256,
+}
+
+
+class Entrada:
+    def __init__(self):
+        self.valor = None
+        self.calculado_em = None
+        self.trava = threading.Lock()
+
+
+class CacheAnalises:
+    """Cache em memória de resultados de consultas analíticas
+
+    Cada entrada vale por TTL segundos. Depois disso, o primeiro chamador
+    recalcula o resultado enquanto os demais recebem o valor anterior, por até
+    TTL_OBSOLETO segundos; sem valor utilizável, os demais aguardam o cálculo em
+    andamento em vez de repeti-lo.
+    """
+
+    def __init__(self, ttl, ttl_obsoleto, max_entradas):
+        self.ttl = ttl
+        self.ttl_obsoleto = ttl_obsoleto
+        self.max_entradas = max_entradas
+
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+        self._metricas = {}
+
+    def obter(self, nome, parametros, calcular):
+        """Retorna (valor, situacao), com situacao "hit", "obsoleto" ou "miss"
+
+        `parametros` identifica a consulta junto com `nome`; `calcular` é chamado
+        sem argumentos quando o resultado precisa ser refeito. Exceções lançadas
+        por `calcular` não são guardadas e chegam ao chamador.
+        """
+        entrada = self._entrada((nome, tuple(sorted(parametros.items()))))
+
+        idade = self._idade(entrada)
+        if idade is not None and idade < self.ttl:
+            self._contar(nome, "hits")
+            return entrada.valor, "hit"
+
+        if idade is not None and idade < self.ttl_obsoleto:
+            # Outro chamador já está recalculando: serve o valor anterior
+            if not entrada.trava.acquire(blocking=False):
+                self._contar(nome, "obsoletos")
+                return entrada.valor, "obsoleto"
+        else:
+            entrada.trava.acquire()
+
+        try:
+            # Recalculado por outro chamador enquanto este aguardava a trava
+            idade = self._idade(entrada)
+            if idade is not None and idade < self.ttl:
+                self._contar(nome, "hits")
+                return entrada.valor, "hit"
+
+            inicio = time.perf_counter()
+            valor = calcular()
+            duracao = time.perf_counter() - inicio
+
+            entrada.valor = valor
+            entrada.calculado_em = time.monotonic()
+            self._contar(nome, "misses", duracao)
+            return valor, "miss"
+        finally:
+            entrada.trava.release()
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+    def metricas(self):
+        """Acertos, valores obsoletos servidos, recálculos e seus tempos por consulta"""
+        with self._trava:
+            resultado = {}
+            for nome, contagem in self._metricas.items():
+                misses = contagem["misses"]
+                resultado[nome] = {
+                    **contagem,
+                    "tempo_medio_recalculo": (
+                        contagem["tempo_total_recalculo"] / misses if misses else 0
+                    ),
+                }
+            return {
+                "ttl": self.ttl,
+                "ttl_obsoleto": self.ttl_obsoleto,
+                "entradas": len(self._entradas),
+                "consultas": resultado,
+            }
+
+    def _entrada(self, chave):
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                entrada = self._entradas[chave] = Entrada()
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+            else:
+                self._entradas.move_to_end(chave)
+            return entrada
+
+    def _idade(self, entrada):
+        if entrada.calculado_em is None:
+            return None
+        return time.monotonic() - entrada.calculado_em
+
+    def _contar(self, nome, campo, duracao=None):
+        with self._trava:
+            contagem = self._metricas.setdefault(
+                nome,
+                {
+                    "hits": 0,
+                    "obsoletos": 0,
+                    "misses": 0,
+                    "tempo_total_recalculo": 0.0,
+                    "tempo_maximo_recalculo": 0.0,
+                },
+            )
+            contagem[campo] += 1
+            if duracao is not None:
+                contagem["tempo_total_recalculo"] += duracao
+                contagem["tempo_maximo_recalculo"] = max(
+                    contagem["tempo_maximo_recalculo"], duracao
+                )
+
+
+_cache = None
+_trava_cache = threading.Lock()
+
+
+def obter_cache():
+    """Cache de análises do processo, criado no primeiro uso"""
+    global _cache
+    if _cache is None:
+        with _trava_cache:
+            if _cache is None:
+                configuracao = {
+                    **CONFIGURACAO_PADRAO,
+                    **getattr(settings, "SRQ20_CACHE_ANALISES", {}),
+                }
+                _cache = CacheAnalises(
+                    ttl=configuracao["TTL"],
+                    ttl_obsoleto=configuracao["TTL_OBSOLETO"],
+                    max_entradas=configuracao["MAX_ENTRADAS"],
+                )
+    return _cache
+
+
+def em_cache(nome, parametros, calcular):
+    """Atalho para obter_cache().obter(...)"""
+    return obter_cache().obter(nome, parametros, calcular)
@@ -0,0 +1,258 @@
+import math
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, F, Sum
+from django.db.models.functions import Cast, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Avaliacao, EstatisticaAvaliacao
+
+Usuario = get_user_model()
+
+
+def _chaves(avaliacao, genero):
+    return (
+        ("nivel", avaliacao.nivel_sofrimento),
+        ("genero", genero or ""),
+        ("dia", timezone.localdate(avaliacao.data_avaliacao).isoformat()),
+    )
+
+
+def _somar(incrementos):
+    """Aplica {(dimensao, chave): [total, soma, soma_quadrados]} às estatísticas"""
+    for (dimensao, chave), (total, soma, soma_quadrados) in incrementos.items():
+        linhas = EstatisticaAvaliacao.objects.filter(dimensao=dimensao, chave=chave)
+        incremento = {
+            "total": F("total") + total,
+            "soma_pontuacao": F("soma_pontuacao") + soma,
+            "soma_quadrados": F("soma_quadrados") + soma_quadrados,
+        }
+        if linhas.update(**incremento):
+            continue
+        try:
+            with transaction.atomic():
+                EstatisticaAvaliacao.objects.create(
+                    dimensao=dimensao,
+                    chave=chave,
+                    total=total,
+                    soma_pontuacao=soma,
+                    soma_quadrados=soma_quadrados,
+                )
+        except IntegrityError:
+            # Criada por outra transação entre o UPDATE e o INSERT
+            linhas.update(**incremento)
+
+
+def acumular(avaliacoes, generos, sinal=1):
+    """Soma (sinal=1) ou subtrai (sinal=-1) avaliações das estatísticas
+
+    `generos` mapeia usuario_id para o gênero do usuário. Deve ser chamada na
+    mesma transação que grava ou apaga as avaliações.
+    """
+    incrementos = {}
+    for avaliacao in avaliacoes:
+        pontuacao = avaliacao.pontuacao_total
+        for chave in _chaves(avaliacao, generos.get(avaliacao.usuario_id)):
+            acumulado = incrementos.setdefault(chave, [0, 0, 0])
+            acumulado[0] += sinal
+            acumulado[1] += sinal * pontuacao
+            acumulado[2] += sinal * pontuacao * pontuacao
+    _somar(incrementos)
+
+
+def genero_do_usuario(avaliacao):
+    if Avaliacao.usuario.is_cached(avaliacao):
+        return avaliacao.usuario.genero
+    return (
+        Usuario.objects.filter(id=avaliacao.usuario_id)
+        .values_list("genero", flat=True)
+        .first()
+    )
+
+
+def acumular_lote(avaliacoes):
+    """Soma às estatísticas avaliações gravadas em lote, buscando os gêneros"""
+    generos = dict(
+        Usuario.objects.filter(
+            id__in={avaliacao.usuario_id for avaliacao in avaliacoes}
+        ).values_list("id", "genero")
+    )
+    acumular(avaliacoes, generos)
+
+
+def mover_genero(usuario_id, genero_anterior, genero_novo):
+    """Passa as avaliações de um usuário de um gênero para outro nas estatísticas
+
+    Deve ser chamada na mesma transação que grava o novo gênero.
+    """
+    pontuacao = Cast("pontuacao_total", BigIntegerField())
+    agregado = Avaliacao.objects.filter(usuario_id=usuario_id).aggregate(
+        n=Count("id"), soma=Sum("pontuacao_total"), soma_q=Sum(pontuacao * pontuacao)
+    )
+    if not agregado["n"]:
+        return
+    valores = (agregado["n"], agregado["soma"] or 0, agregado["soma_q"] or 0)
+    _somar(
+        {
+            ("genero", genero_anterior or ""): [-valor for valor in valores],
+            ("genero", genero_novo or ""): list(valores),
+        }
+    )
+
+
+def recalcular():
+    """Refaz todas as estatísticas a partir da tabela Avaliacao"""
+    pontuacao = Cast("pontuacao_total", BigIntegerField())
+    agregados = {
+        "n": Count("id"),
+        "soma": Sum("pontuacao_total"),
+        "soma_q": Sum(pontuacao * pontuacao),
+    }
+    dimensoes = (
+        ("nivel", "nivel_sofrimento"),
+        ("genero", "usuario__genero"),
+        ("dia", "data_avaliacao__date"),
+    )
+    incrementos = {}
+    for dimensao, campo in dimensoes:
+        for grupo in Avaliacao.objects.values(campo).annotate(**agregados).order_by():
+            chave = grupo[campo]
+            if dimensao == "dia":
+                chave = chave.isoformat()
+            acumulado = incrementos.setdefault((dimensao, chave or ""), [0, 0, 0])
+            acumulado[0] += grupo["n"]
+            acumulado[1] += grupo["soma"] or 0
+            acumulado[2] += grupo["soma_q"] or 0
+
+    with transaction.atomic():
+        EstatisticaAvaliacao.objects.all().delete()
+        EstatisticaAvaliacao.objects.bulk_create(
+            EstatisticaAvaliacao(
+                dimensao=dimensao,
+                chave=chave,
+                total=total,
+                soma_pontuacao=soma,
+                soma_quadrados=soma_quadrados,
+            )
+            for (dimensao, chave), (total, soma, soma_quadrados) in incrementos.items()
+        )
+    return len(incrementos)
+
+
+def _descrever(total, soma, soma_quadrados):
+    """Média, variância e desvio padrão (populacionais) a partir das somas"""
+    if not total:
+        return None, None, None
+    media = soma / total
+    variancia = max(soma_quadrados / total - media * media, 0.0)
+    return media, variancia, math.sqrt(variancia)
+
+
+def resumo():
+    """Estatísticas gerais, por nível e por gênero, lidas das tabelas de resumo"""
+    linhas = EstatisticaAvaliacao.objects.filter(
+        dimensao__in=("nivel", "genero"), total__gt=0
+    ).order_by("dimensao", "chave")
+
+    distribuicao_niveis = []
+    por_genero = []
+    total = soma = soma_quadrados = 0
+    for linha in linhas:
+        media, _, desvio = _descrever(
+            linha.total, linha.soma_pontuacao, linha.soma_quadrados
+        )
+        if linha.dimensao == "nivel":
+            total += linha.total
+            soma += linha.soma_pontuacao
+            soma_quadrados += linha.soma_quadrados
+            distribuicao_niveis.append(
+                {
+                    "nivel_sofrimento": linha.chave,
+                    "total": linha.total,
+                    "media": media,
+                    "desvio_padrao": desvio,
+                }
+            )
+        else:
+            por_genero.append(
+                {
+                    "usuario__genero": linha.chave or None,
+                    "media": media,
+                    "total": linha.total,
+                    "desvio_padrao": desvio,
+                }
+            )
+
+    media, variancia, desvio = _descrever(total, soma, soma_quadrados)
+    return {
+        "total_avaliacoes": total,
+        "media_pontuacao": media,
+        "variancia_pontuacao": variancia,
+        "desvio_padrao_pontuacao": desvio,
+        "distribuicao_niveis": distribuicao_niveis,
+        "por_genero": por_genero,
+    }
+
+
+TRUNCAMENTOS = {"dia": TruncDay, "semana": TruncWeek, "mes": TruncMonth}
+
+
+def _ler_data(valor, nome):
+    try:
+        data = date.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"Parâmetro {nome} inválido; use o formato AAAA-MM-DD.")
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def serie_temporal(inicio=None, fim=None, granularidade="dia"):
+    """Média e distribuição por nível em cada dia, semana ou mês do intervalo
+
+    `inicio` e `fim` são datas AAAA-MM-DD inclusivas (no fuso local). Executa
+    uma única consulta agrupada, com o truncamento de data feito pelo banco
+    e o filtro de intervalo usando o índice de data_avaliacao.
+    """
+    if granularidade not in TRUNCAMENTOS:
+        raise ValueError(
+            "Parâmetro granularidade inválido; use "
+            + ", ".join(f'"{opcao}"' for opcao in TRUNCAMENTOS)
+            + "."
+        )
+
+    avaliacoes = Avaliacao.objects.all()
+    if inicio:
+        avaliacoes = avaliacoes.filter(data_avaliacao__gte=_ler_data(inicio, "inicio"))
+    if fim:
+        avaliacoes = avaliacoes.filter(
+            data_avaliacao__lt=_ler_data(fim, "fim") + timedelta(days=1)
+        )
+
+    grupos = (
+        avaliacoes.annotate(periodo=TRUNCAMENTOS[granularidade]("data_avaliacao"))
+        .values("periodo", "nivel_sofrimento")
+        .annotate(total=Count("id"), soma=Sum("pontuacao_total"))
+        .order_by("periodo", "nivel_sofrimento")
+    )
+
+    serie = []
+    for grupo in grupos:
+        periodo = timezone.localtime(grupo["periodo"]).date().isoformat()
+        if not serie or serie[-1]["periodo"] != periodo:
+            serie.append(
+                {
+                    "periodo": periodo,
+                    "total": 0,
+                    "soma": 0,
+                    "distribuicao_niveis": {},
+                }
+            )
+        balde = serie[-1]
+        balde["total"] += grupo["total"]
+        balde["soma"] += grupo["soma"]
+        balde["distribuicao_niveis"][grupo["nivel_sofrimento"]] = grupo["total"]
+
+    for balde in serie:
+        balde["media_pontuacao"] = balde.pop("soma") / balde["total"]
+    return serie
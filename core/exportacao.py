@@ -0,0 +1,357 @@
+import base64
+import binascii
+import csv
+import io
+import json
+import os
+import re
+from datetime import datetime
+from itertools import groupby
+
+from django.db.models import Max
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .models import Avaliacao, Resposta
+
+TAMANHO_LOTE = 2000
+
+CAMPOS = (
+    "id",
+    "usuario__username",
+    "pontuacao_total",
+    "nivel_sofrimento",
+    "data_avaliacao",
+    "usuario__genero",
+)
+
+# Nomes das colunas nos formatos JSON, NDJSON, Parquet e Arrow
+COLUNAS = ("id", "usuario", "pontuacao", "nivel", "data", "genero")
+
+CABECALHO_CSV = ["ID", "Usuário", "Pontuação", "Nível de Sofrimento", "Data", "Gênero"]
+
+# Modo "matriz": as mesmas colunas seguidas de uma coluna por pergunta, em ordem
+ORDENS = range(1, Avaliacao.TOTAL_PERGUNTAS + 1)
+COLUNAS_MATRIZ = COLUNAS + tuple(f"p{ordem}" for ordem in ORDENS)
+CABECALHO_CSV_MATRIZ = CABECALHO_CSV + [f"P{ordem}" for ordem in ORDENS]
+
+
+def criar_cursor(ultimo_id):
+    """Cursor opaco que marca a última avaliação já exportada"""
+    dados = json.dumps({"id": ultimo_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(dados).decode().rstrip("=")
+
+
+def ler_cursor(cursor):
+    """Retorna o ID da última avaliação exportada (0 para um cursor vazio)"""
+    if not cursor:
+        return 0
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        ultimo_id = int(dados["id"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Cursor de exportação inválido.")
+    if ultimo_id < 0:
+        raise ValueError("Cursor de exportação inválido.")
+    return ultimo_id
+
+
+def avaliacoes_desde(cursor, avaliacoes=None):
+    """Avaliações gravadas depois do cursor, em ordem de ID, e o cursor seguinte
+
+    O cursor guarda o último ID exportado, e não uma data: avaliações enviadas
+    em lote podem ter data_avaliacao no passado, mas sempre recebem um ID maior.
+    A consulta percorre apenas o trecho novo da chave primária. O limite
+    superior é fixado no início, para que o cursor devolvido corresponda
+    exatamente às linhas exportadas mesmo com gravações durante a exportação.
+    """
+    if avaliacoes is None:
+        avaliacoes = Avaliacao.objects.all()
+    inicio = ler_cursor(cursor)
+    ultimo = Avaliacao.objects.aggregate(ultimo=Max("id"))["ultimo"] or 0
+    fim = max(inicio, ultimo)
+    return (
+        avaliacoes.filter(id__gt=inicio, id__lte=fim).order_by("id"),
+        criar_cursor(fim),
+    )
+
+
+def linhas_avaliacoes(avaliacoes=None, tamanho_lote=TAMANHO_LOTE):
+    """Percorre as avaliações como tuplas (id, usuario, pontuacao, nivel, data, genero)
+
+    Lê do cursor do banco em blocos de `tamanho_lote` linhas, sem criar
+    instâncias de modelo nem manter o resultado inteiro em memória.
+    """
+    if avaliacoes is None:
+        avaliacoes = Avaliacao.objects.all()
+    return avaliacoes.values_list(*CAMPOS).iterator(chunk_size=tamanho_lote)
+
+
+def linhas_matriz(avaliacoes=None, tamanho_lote=TAMANHO_LOTE):
+    """Percorre as avaliações como linhas da matriz de respostas, por usuário e data
+
+    Cada linha traz as colunas de `linhas_avaliacoes` seguidas de 20 valores
+    True/False (None se a resposta não foi gravada), um por pergunta em ordem.
+    As respostas vêm do bitmask da avaliação; nas avaliações antigas, sem
+    bitmask, vêm das linhas de Resposta vinculadas a elas, lidas em uma segunda
+    consulta com a mesma ordenação e intercaladas em uma única passada.
+    """
+    if avaliacoes is None:
+        avaliacoes = Avaliacao.objects.all()
+    avaliacoes = avaliacoes.order_by("usuario_id", "data_avaliacao", "id")
+    respostas = (
+        Resposta.objects.filter(
+            avaliacao__in=avaliacoes.filter(respostas_bitmask__isnull=True).values("id")
+        )
+        .order_by("avaliacao__usuario_id", "avaliacao__data_avaliacao", "avaliacao_id")
+        .values_list("avaliacao_id", "pergunta__ordem", "resposta")
+        .iterator(chunk_size=tamanho_lote)
+    )
+    grupos = groupby(respostas, key=lambda resposta: resposta[0])
+    proximo = next(grupos, None)
+
+    vazias = (None,) * Avaliacao.TOTAL_PERGUNTAS
+    for *linha, bitmask in avaliacoes.values_list(
+        *CAMPOS, "respostas_bitmask"
+    ).iterator(chunk_size=tamanho_lote):
+        if bitmask is not None:
+            yield (
+                *linha,
+                *(bool(bitmask & Avaliacao.bit_da_pergunta(ordem)) for ordem in ORDENS),
+            )
+            continue
+
+        if proximo is None or proximo[0] != linha[0]:
+            yield (*linha, *vazias)
+            continue
+        valores = list(vazias)
+        for _, ordem, resposta in proximo[1]:
+            if 1 <= ordem <= Avaliacao.TOTAL_PERGUNTAS:
+                valores[ordem - 1] = resposta
+        proximo = next(grupos, None)
+        yield (*linha, *valores)
+
+
+def _em_blocos(linhas, tamanho_lote):
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_lote:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def gerar_csv(linhas, cabecalho=CABECALHO_CSV, tamanho_lote=TAMANHO_LOTE):
+    """Gera o CSV em pedaços de texto de até `tamanho_lote` linhas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(cabecalho)
+    for bloco in _em_blocos(linhas, tamanho_lote):
+        writer.writerows(bloco)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _para_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} não é serializável em JSON")
+
+
+def gerar_ndjson(linhas, colunas=COLUNAS, tamanho_lote=TAMANHO_LOTE):
+    """Gera um objeto JSON por linha, com as mesmas chaves da exportação JSON"""
+    for bloco in _em_blocos(linhas, tamanho_lote):
+        yield "".join(
+            json.dumps(
+                dict(zip(colunas, linha)), ensure_ascii=False, default=_para_json
+            )
+            + "\n"
+            for linha in bloco
+        )
+
+
+class _Coletor(io.RawIOBase):
+    """Destino de escrita do pyarrow cujo conteúdo é retirado a cada lote"""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        conteudo, self._partes = b"".join(self._partes), []
+        return conteudo
+
+
+def gerar_colunar(linhas, formato, matriz=False, tamanho_lote=TAMANHO_LOTE):
+    """Gera o arquivo Parquet ou Arrow IPC (stream) um lote de registros por vez
+
+    Requer o pacote opcional pyarrow.
+    """
+    import pyarrow as pa
+
+    campos = [
+        ("id", pa.int64()),
+        ("usuario", pa.string()),
+        ("pontuacao", pa.int16()),
+        ("nivel", pa.string()),
+        ("data", pa.timestamp("us", tz="UTC")),
+        ("genero", pa.string()),
+    ]
+    if matriz:
+        campos += [(coluna, pa.bool_()) for coluna in COLUNAS_MATRIZ[len(COLUNAS) :]]
+    esquema = pa.schema(campos)
+    destino = _Coletor()
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        escritor = pq.ParquetWriter(destino, esquema, compression="zstd")
+    else:
+        escritor = pa.ipc.new_stream(destino, esquema)
+
+    with escritor:
+        for bloco in _em_blocos(linhas, tamanho_lote):
+            lote = pa.record_batch(list(zip(*bloco)), schema=esquema)
+            if formato == "parquet":
+                escritor.write_batch(lote, row_group_size=tamanho_lote)
+            else:
+                escritor.write_batch(lote)
+            conteudo = destino.retirar()
+            if conteudo:
+                yield conteudo
+    yield destino.retirar()
+
+
+def resposta_download(conteudo, content_type, nome_arquivo):
+    response = StreamingHttpResponse(conteudo, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{nome_arquivo}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def ler_range(cabecalho, tamanho):
+    """Interpreta um cabeçalho Range de um único intervalo
+
+    Retorna (inicio, fim) inclusivos, None se o cabeçalho deve ser ignorado
+    (sintaxe inválida ou vários intervalos) ou False se o intervalo não pode ser
+    atendido.
+    """
+    correspondencia = _RANGE.match(cabecalho.strip())
+    if not correspondencia:
+        return None
+    inicio, fim = correspondencia.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # Sufixo: os últimos `fim` bytes
+        if int(fim) == 0:
+            return False
+        return max(tamanho - int(fim), 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _ler_arquivo(caminho, inicio, quantidade, tamanho_bloco=64 * 1024):
+    with open(caminho, "rb") as arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            bloco = arquivo.read(min(tamanho_bloco, quantidade))
+            if not bloco:
+                return
+            quantidade -= len(bloco)
+            yield bloco
+
+
+def resposta_arquivo(request, caminho, content_type, nome_arquivo, etag):
+    """Resposta HTTP com o arquivo, atendendo Range para retomar downloads
+
+    Com If-Range diferente do ETag atual o arquivo inteiro é enviado.
+    """
+    tamanho = os.path.getsize(caminho)
+    inicio, fim = 0, tamanho - 1
+    status = 200
+
+    cabecalho = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if cabecalho and (not if_range or if_range == etag):
+        intervalo = ler_range(cabecalho, tamanho)
+        if intervalo is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{tamanho}"
+            return response
+        if intervalo is not None:
+            inicio, fim = intervalo
+            status = 206
+
+    response = resposta_download(
+        _ler_arquivo(caminho, inicio, fim - inicio + 1), content_type, nome_arquivo
+    )
+    response.status_code = status
+    response["Content-Length"] = str(fim - inicio + 1)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if status == 206:
+        response["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+    return response
+
+
+def linhas_exportacao(avaliacoes=None, matriz=False):
+    """Linhas de `linhas_matriz` com `matriz`, senão de `linhas_avaliacoes`"""
+    if matriz:
+        return linhas_matriz(avaliacoes)
+    return linhas_avaliacoes(avaliacoes)
+
+
+def gerar(formato, linhas, matriz=False):
+    """Conteúdo da exportação em csv, ndjson, parquet ou arrow"""
+    if formato == "csv":
+        return gerar_csv(linhas, CABECALHO_CSV_MATRIZ if matriz else CABECALHO_CSV)
+    if formato == "ndjson":
+        return gerar_ndjson(linhas, COLUNAS_MATRIZ if matriz else COLUNAS)
+    return gerar_colunar(linhas, formato, matriz)
+
+
+FORMATOS_COLUNARES = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+TIPOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    **FORMATOS_COLUNARES,
+}
+
+
+def pyarrow_disponivel():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def exportar(formato, avaliacoes=None, matriz=False):
+    """Resposta HTTP que transmite a exportação à medida que é lida do banco"""
+    content_type, extensao = TIPOS[formato]
+    nome = "matriz_respostas" if matriz else "avaliacoes"
+    return resposta_download(
+        gerar(formato, linhas_exportacao(avaliacoes, matriz), matriz),
+        content_type,
+        f"{nome}.{extensao}",
+    )
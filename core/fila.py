@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import time
+
+from django.conf import settings
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS submissoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    enfileirado_em REAL NOT NULL,
+    erro TEXT
+)
+"""
+
+
+def _conectar():
+    conexao = sqlite3.connect(str(settings.SRQ20_FILA_PATH), timeout=30)
+    conexao.execute("PRAGMA journal_mode=WAL")
+    conexao.execute("PRAGMA synchronous=NORMAL")
+    conexao.execute(_ESQUEMA)
+    return conexao
+
+
+def enfileirar(payload):
+    """Grava uma submissão no diário local; retorna o ID da entrada na fila"""
+    conexao = _conectar()
+    try:
+        with conexao:
+            cursor = conexao.execute(
+                "INSERT INTO submissoes (payload, enfileirado_em) VALUES (?, ?)",
+                (json.dumps(payload), time.time()),
+            )
+        return cursor.lastrowid
+    finally:
+        conexao.close()
+
+
+def proximas(limite):
+    """Retorna até `limite` entradas pendentes, das mais antigas para as mais novas"""
+    conexao = _conectar()
+    try:
+        linhas = conexao.execute(
+            "SELECT id, payload FROM submissoes WHERE erro IS NULL "
+            "ORDER BY id LIMIT ?",
+            (limite,),
+        ).fetchall()
+    finally:
+        conexao.close()
+    return [(id_entrada, json.loads(payload)) for id_entrada, payload in linhas]
+
+
+def remover(ids):
+    """Remove do diário as entradas já persistidas no banco principal"""
+    if not ids:
+        return
+    conexao = _conectar()
+    try:
+        with conexao:
+            conexao.executemany(
+                "DELETE FROM submissoes WHERE id = ?", [(i,) for i in ids]
+            )
+    finally:
+        conexao.close()
+
+
+def marcar_erro(id_entrada, erro):
+    """Retira uma entrada da drenagem, mantendo-a no diário para inspeção"""
+    conexao = _conectar()
+    try:
+        with conexao:
+            conexao.execute(
+                "UPDATE submissoes SET erro = ? WHERE id = ?", (erro, id_entrada)
+            )
+    finally:
+        conexao.close()
+
+
+def estatisticas():
+    """Profundidade da fila, entradas com erro e atraso de drenagem em segundos"""
+    conexao = _conectar()
+    try:
+        pendentes, mais_antiga = conexao.execute(
+            "SELECT COUNT(*), MIN(enfileirado_em) FROM submissoes WHERE erro IS NULL"
+        ).fetchone()
+        (com_erro,) = conexao.execute(
+            "SELECT COUNT(*) FROM submissoes WHERE erro IS NOT NULL"
+        ).fetchone()
+    finally:
+        conexao.close()
+    return {
+        "pendentes": pendentes,
+        "com_erro": com_erro,
+        "atraso_segundos": (
+            round(time.time() - mais_antiga, 3) if mais_antiga is not None else 0
+        ),
+    }
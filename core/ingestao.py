@@ -0,0 +1,143 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Pergunta
+from .services import (
+    SubmissaoInvalida,
+    normalizar_id,
+    validar_formato_respostas,
+    validar_respostas,
+    montar_submissao,
+    gravar_submissoes,
+)
+
+Usuario = get_user_model()
+
+TAMANHO_LOTE = 500
+
+
+def ler_ndjson(stream):
+    """Lê o corpo NDJSON linha a linha, sem carregá-lo inteiro na memória
+
+    Gera tuplas (numero_da_linha, item) em que item é o objeto decodificado ou
+    uma SubmissaoInvalida quando a linha não é JSON válido.
+    """
+    if stream is None:
+        return
+    for numero, linha in enumerate(iter(stream.readline, b""), start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            item = json.loads(linha)
+        except ValueError:
+            yield numero, SubmissaoInvalida("JSON inválido")
+            continue
+        if not isinstance(item, dict):
+            item = SubmissaoInvalida("Cada linha deve ser um objeto JSON")
+        yield numero, item
+
+
+def _validar_item(item, ids_perguntas, ids_usuarios):
+    """Retorna o par (avaliacao, respostas) pronto para gravação ou lança SubmissaoInvalida"""
+    usuario_id = normalizar_id(item.get("usuario"))
+    if usuario_id not in ids_usuarios:
+        raise SubmissaoInvalida(f"Usuário com ID {item.get('usuario')} não existe")
+
+    respostas_data = item.get("respostas")
+    validar_formato_respostas(respostas_data)
+    respostas = validar_respostas(respostas_data, ids_perguntas)
+
+    data = timezone.now()
+    if item.get("data_avaliacao") is not None:
+        try:
+            data = parse_datetime(str(item["data_avaliacao"]))
+        except ValueError:
+            data = None
+        if data is None:
+            raise SubmissaoInvalida("Data de avaliação inválida")
+        if timezone.is_naive(data):
+            data = timezone.make_aware(data)
+
+    return montar_submissao(usuario_id, respostas, data)
+
+
+def _marcar_gravado(resultado, avaliacao):
+    resultado.update(
+        status="ok",
+        avaliacao=avaliacao.id,
+        pontuacao_total=avaliacao.pontuacao_total,
+        nivel_sofrimento=avaliacao.nivel_sofrimento,
+    )
+
+
+def _processar_lote(lote, ids_perguntas):
+    ids = {
+        normalizar_id(item.get("usuario")) for _, item in lote if isinstance(item, dict)
+    }
+    ids_usuarios = set(Usuario.objects.filter(id__in=ids).values_list("id", flat=True))
+
+    resultados = []
+    validas = []
+    for numero, item in lote:
+        resultado = {"linha": numero}
+        if isinstance(item, dict):
+            if "ref" in item:
+                resultado["ref"] = item["ref"]
+            try:
+                validas.append(
+                    (resultado, _validar_item(item, ids_perguntas, ids_usuarios))
+                )
+            except SubmissaoInvalida as e:
+                resultado.update(status="erro", erro=str(e))
+        else:
+            resultado.update(status="erro", erro=str(item))
+        resultados.append(resultado)
+
+    if validas:
+        try:
+            avaliacoes = gravar_submissoes([submissao for _, submissao in validas])
+        except DatabaseError:
+            # Grava os itens um a um para que só os que falham fiquem com erro
+            for resultado, submissao in validas:
+                try:
+                    (avaliacao,) = gravar_submissoes([submissao])
+                except DatabaseError as e:
+                    resultado.update(status="erro", erro=f"Falha ao gravar: {e}")
+                else:
+                    _marcar_gravado(resultado, avaliacao)
+        else:
+            for (resultado, _), avaliacao in zip(validas, avaliacoes):
+                _marcar_gravado(resultado, avaliacao)
+    return resultados
+
+
+def ingerir_ndjson(stream, tamanho_lote=TAMANHO_LOTE):
+    """Processa um envio em lote de questionários no formato NDJSON
+
+    Cada linha é um objeto {"usuario", "respostas", "data_avaliacao"?, "ref"?}.
+    As linhas são validadas contra o mapa de perguntas carregado uma única vez e
+    gravadas em blocos de tamanho_lote, cada bloco em sua própria transação.
+    Gera uma linha de resultado por item, na ordem de envio, seguida de um resumo.
+    """
+    ids_perguntas = set(Pergunta.objects.values_list("id", flat=True))
+    total = {"ok": 0, "erro": 0}
+
+    lote = []
+    for entrada in ler_ndjson(stream):
+        lote.append(entrada)
+        if len(lote) >= tamanho_lote:
+            for resultado in _processar_lote(lote, ids_perguntas):
+                total[resultado["status"]] += 1
+                yield resultado
+            lote = []
+    if lote:
+        for resultado in _processar_lote(lote, ids_perguntas):
+            total[resultado["status"]] += 1
+            yield resultado
+
+    yield {"resumo": {"total": total["ok"] + total["erro"], **total}}
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.arquivo import anexar_registros, registros_para_arquivar
+from core.models import HistoricoAcesso
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives HistoricoAcesso rows older than the retention period into "
+        "compressed daily files and deletes them in small transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dias",
+            type=int,
+            default=settings.HISTORICO_ACESSO_RETENCAO_DIAS,
+            help="Retention period in days (rows older than this are archived)",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=1000,
+            help="Number of rows archived and deleted per transaction",
+        )
+        parser.add_argument(
+            "--diretorio",
+            help="Archive directory (default: settings.HISTORICO_ACESSO_ARQUIVO_DIR)",
+        )
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Only report how many rows would be archived",
+        )
+
+    def handle(self, *args, **options):
+        corte = timezone.now() - timedelta(days=options["dias"])
+        antigos = HistoricoAcesso.objects.filter(data_acesso__lt=corte)
+
+        if options["simular"]:
+            self.stdout.write(
+                f"{antigos.count()} rows older than {corte:%Y-%m-%d %H:%M}"
+            )
+            return
+
+        total = 0
+        while True:
+            registros = registros_para_arquivar(
+                antigos.order_by("id")[: options["lote"]]
+            )
+            if not registros:
+                break
+
+            anexar_registros(registros, options["diretorio"])
+            with transaction.atomic():
+                HistoricoAcesso.objects.filter(
+                    id__in=[registro["id"] for registro in registros]
+                ).delete()
+
+            total += len(registros)
+            self.stdout.write(f"{total} rows archived")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archiving complete: {total} rows older than {corte:%Y-%m-%d} archived"
+            )
+        )
@@ -0,0 +1,92 @@
+import itertools
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Avaliacao, HistoricoAcesso, Resposta
+from core.serializacao import codificar_json, obter_leitura, orjson
+from core.serializers import (
+    AvaliacaoSerializer,
+    HistoricoAcessoSerializer,
+    RespostaSerializer,
+)
+
+LISTAGENS = (
+    ("avaliacoes", Avaliacao, AvaliacaoSerializer),
+    ("respostas", Resposta, RespostaSerializer),
+    ("historico-acessos", HistoricoAcesso, HistoricoAcessoSerializer),
+)
+
+
+def _repetir(linhas, total):
+    """`total` linhas, repetindo as existentes se a tabela tiver menos"""
+    return list(itertools.islice(itertools.cycle(linhas), total))
+
+
+def _medir(funcao, linhas, minimo_linhas):
+    """Segundos por linha de funcao(linhas), repetida até somar `minimo_linhas`"""
+    repeticoes = max(1, minimo_linhas // len(linhas))
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao(linhas)
+    return (time.perf_counter() - inicio) / (repeticoes * len(linhas)), resultado
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the per-row cost of encoding list pages as JSON with the "
+        "ModelSerializers versus the .values() fast path"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--linhas",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000, 10000],
+            help="Page sizes to measure",
+        )
+        parser.add_argument(
+            "--minimo",
+            type=int,
+            default=20000,
+            help="Repeat each measurement until at least this many rows are encoded",
+        )
+
+    def handle(self, *args, **options):
+        tamanhos = options["linhas"]
+        renderer = JSONRenderer()
+        self.stdout.write(
+            f"JSON encoder: {'orjson' if orjson is not None else 'json (stdlib)'}"
+        )
+
+        for nome, modelo, serializer_class in LISTAGENS:
+            leitura = obter_leitura(serializer_class)
+            consulta = modelo.objects.order_by("-id")[: max(tamanhos)]
+            instancias = list(consulta)
+            if not instancias:
+                self.stdout.write(f"{nome}: no rows, skipped")
+                continue
+            valores = list(consulta.values(*leitura.colunas))
+
+            self.stdout.write(f"\n{nome} ({len(instancias)} distinct rows)")
+            for tamanho in tamanhos:
+                tempo_serializer, esperado = _medir(
+                    lambda linhas: renderer.render(
+                        serializer_class(linhas, many=True).data
+                    ),
+                    _repetir(instancias, tamanho),
+                    options["minimo"],
+                )
+                tempo_rapido, obtido = _medir(
+                    lambda linhas: codificar_json(leitura.linhas(linhas)),
+                    _repetir(valores, tamanho),
+                    options["minimo"],
+                )
+                self.stdout.write(
+                    f"{tamanho:>6} rows: serializer {tempo_serializer * 1e6:7.2f} us/row, "
+                    f"fast path {tempo_rapido * 1e6:6.2f} us/row, "
+                    f"{tempo_serializer / tempo_rapido:5.1f}x, "
+                    f"{'identical' if obtido == esperado else 'DIFFERENT'} output"
+                )
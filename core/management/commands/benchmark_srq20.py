@@ -0,0 +1,94 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Usuario, Pergunta, Resposta, Avaliacao
+from core.services import registrar_submissao
+
+
+def submissao_legada(usuario, respostas_data):
+    """Reproduz o caminho de gravação anterior, uma consulta por resposta
+
+    Grava o mesmo que registrar_submissao (avaliação com bitmask e respostas
+    vinculadas a ela, sem o registro de acesso, feito pelo middleware nos dois
+    casos), de modo que a comparação mede só a forma de gravar.
+    """
+    perguntas = [
+        (Pergunta.objects.get(id=resposta_data.get("pergunta")), resposta_data)
+        for resposta_data in respostas_data
+    ]
+    pontuacao_total = sum(
+        1 for resposta in respostas_data if resposta.get("resposta") is True
+    )
+    avaliacao = Avaliacao.objects.create(
+        usuario=usuario,
+        pontuacao_total=pontuacao_total,
+        nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(pontuacao_total),
+        respostas_bitmask=Avaliacao.codificar_respostas(
+            {
+                pergunta.ordem: resposta_data.get("resposta")
+                for pergunta, resposta_data in perguntas
+            }
+        ),
+    )
+    for pergunta, resposta_data in perguntas:
+        Resposta.objects.create(
+            usuario=usuario,
+            pergunta=pergunta,
+            avaliacao=avaliacao,
+            resposta=resposta_data.get("resposta"),
+        )
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the SRQ-20 submission write path (queries per submission and submissions/sec)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--submissoes",
+            type=int,
+            default=200,
+            help="Number of submissions to write for each implementation",
+        )
+
+    def handle(self, *args, **options):
+        total = options["submissoes"]
+        perguntas = list(Pergunta.objects.values_list("id", flat=True))
+        if not perguntas:
+            raise CommandError("No questions found. Run populate_srq20 first.")
+
+        respostas_data = [
+            {"pergunta": pergunta_id, "resposta": i % 2 == 0}
+            for i, pergunta_id in enumerate(perguntas)
+        ]
+        nome = f"benchmark-{uuid.uuid4().hex[:8]}"
+        usuario = Usuario.objects.create_user(
+            username=nome, email=f"{nome}@benchmark.local"
+        )
+
+        implementacoes = (
+            ("legado", submissao_legada),
+            ("em lote", registrar_submissao),
+        )
+        try:
+            for nome_impl, funcao in implementacoes:
+                # A primeira submissão cria as chaves de estatística do dia
+                funcao(usuario, respostas_data)
+                with CaptureQueriesContext(connection) as consultas:
+                    funcao(usuario, respostas_data)
+
+                inicio = time.perf_counter()
+                for _ in range(total):
+                    funcao(usuario, respostas_data)
+                duracao = time.perf_counter() - inicio
+
+                self.stdout.write(
+                    f"{nome_impl:>8}: {len(consultas):3d} queries/submission, "
+                    f"{total / duracao:8.1f} submissions/sec "
+                    f"({total} submissions in {duracao:.2f}s)"
+                )
+        finally:
+            usuario.delete()
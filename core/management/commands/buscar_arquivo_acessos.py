@@ -0,0 +1,44 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.arquivo import buscar
+
+
+class Command(BaseCommand):
+    help = "Searches the archived access history without loading it into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--de", type=date.fromisoformat, help="First day (AAAA-MM-DD)"
+        )
+        parser.add_argument(
+            "--ate", type=date.fromisoformat, help="Last day (AAAA-MM-DD)"
+        )
+        parser.add_argument("--usuario", help="User ID or username")
+        parser.add_argument("--ip", help="IP address")
+        parser.add_argument("--diretorio", help="Archive directory")
+        parser.add_argument(
+            "--contar",
+            action="store_true",
+            help="Only print the number of matching records",
+        )
+
+    def handle(self, *args, **options):
+        usuario = options["usuario"]
+        if usuario is not None and usuario.isdigit():
+            usuario = int(usuario)
+
+        registros = buscar(
+            de=options["de"],
+            ate=options["ate"],
+            usuario=usuario,
+            ip=options["ip"],
+            diretorio=options["diretorio"],
+        )
+        if options["contar"]:
+            self.stdout.write(str(sum(1 for _ in registros)))
+            return
+        for registro in registros:
+            self.stdout.write(json.dumps(registro))
@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import psicometria
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes item prevalence, inter-item correlations, Cronbach's alpha and "
+        "category subscores over all assessments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bloco",
+            type=int,
+            default=psicometria.TAMANHO_BLOCO,
+            help="Number of assessments loaded into memory at a time",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the full result as JSON"
+        )
+
+    def handle(self, *args, **options):
+        resultado = psicometria.calcular(tamanho_bloco=options["bloco"])
+        if options["json"]:
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(
+            f"Assessments: {resultado['total_avaliacoes']} "
+            f"(without bitmask, skipped: {resultado['sem_bitmask']})"
+        )
+        if not resultado["total_avaliacoes"]:
+            return
+
+        self.stdout.write(f"Cronbach's alpha: {_formatar(resultado['alfa_cronbach'])}")
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'item':>4}  {'prevalence':>10}  {'item-total r':>12}  text"
+        )
+        for item in resultado["itens"]:
+            self.stdout.write(
+                f"{item['ordem']:>4}  {_formatar(item['prevalencia']):>10}  "
+                f"{_formatar(item['correlacao_item_total']):>12}  {item['texto']}"
+            )
+        self.stdout.write("")
+        for subescala in resultado["subescalas"]:
+            self.stdout.write(
+                f"{subescala['categoria']}: {len(subescala['ordens'])} items, "
+                f"mean {_formatar(subescala['media'])}, "
+                f"sd {_formatar(subescala['desvio_padrao'])}, "
+                f"alpha {_formatar(subescala['alfa_cronbach'])}"
+            )
+
+
+def _formatar(valor):
+    return "n/a" if valor is None else f"{valor:.3f}"
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.acessos import acumular_resumos, contar_acessos
+from core.arquivo import anexar_registros, registros_para_arquivar
+from core.models import HistoricoAcesso, ResumoAcesso
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls raw HistoricoAcesso rows up into hourly ResumoAcesso counters, "
+        "archiving each batch before deleting it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=5000,
+            help="Number of raw rows rolled up (and deleted) per transaction",
+        )
+        parser.add_argument(
+            "--ate",
+            help="Only compact accesses before this date/time "
+            "(default: start of the current hour)",
+        )
+        parser.add_argument(
+            "--diretorio",
+            help="Archive directory (default: settings.HISTORICO_ACESSO_ARQUIVO_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        modo = getattr(settings, "HISTORICO_ACESSO_MODO", "ambos")
+        if modo != "detalhado":
+            # Nos outros modos os contadores já são somados a cada acesso gravado
+            raise CommandError(
+                f'HISTORICO_ACESSO_MODO is "{modo}": ResumoAcesso is already '
+                "updated on every write, so compacting would count accesses twice. "
+                "Use arquivar_historico_acessos to purge old raw rows."
+            )
+
+        if options["ate"]:
+            corte = parse_datetime(options["ate"]) or parse_datetime(
+                f"{options['ate']}T00:00:00"
+            )
+            if corte is None:
+                raise CommandError(f"Invalid date: {options['ate']}")
+            if timezone.is_naive(corte):
+                corte = timezone.make_aware(corte)
+        else:
+            corte = ResumoAcesso.inicio_periodo(timezone.now())
+
+        antigos = HistoricoAcesso.objects.filter(data_acesso__lt=corte)
+        total = 0
+        while True:
+            registros = registros_para_arquivar(
+                antigos.order_by("id")[: options["lote"]]
+            )
+            if not registros:
+                break
+
+            # Só apaga linhas já gravadas no arquivo; se o processo parar antes
+            # do commit, o lote é arquivado de novo (a busca ignora repetidos)
+            # e somado uma única vez
+            anexar_registros(registros, options["diretorio"])
+            with transaction.atomic():
+                acumular_resumos(
+                    contar_acessos(
+                        (registro["usuario"], registro["ip"], registro["data_acesso"])
+                        for registro in registros
+                    )
+                )
+                HistoricoAcesso.objects.filter(
+                    id__in=[registro["id"] for registro in registros]
+                ).delete()
+
+            total += len(registros)
+            self.stdout.write(f"{total} raw access rows compacted")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compaction complete: {total} raw access rows rolled up and archived"
+            )
+        )
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.agrupamento import agrupar_respostas_dos_usuarios, lotes_de_usuarios
+from core.models import Avaliacao, Pergunta
+
+
+class Command(BaseCommand):
+    help = "Backfills Avaliacao.respostas_bitmask from the existing Resposta rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=200,
+            help="Number of users processed (and committed) per transaction",
+        )
+        parser.add_argument(
+            "--refazer",
+            action="store_true",
+            help="Recompute bitmasks that are already filled in",
+        )
+
+    def handle(self, *args, **options):
+        ordens = dict(Pergunta.objects.values_list("id", "ordem"))
+        total = 0
+
+        for usuarios in lotes_de_usuarios(options["lote"]):
+            grupos = agrupar_respostas_dos_usuarios(usuarios)
+            avaliacoes = Avaliacao.objects.filter(usuario_id__in=usuarios)
+            if not options["refazer"]:
+                avaliacoes = avaliacoes.filter(respostas_bitmask__isnull=True)
+
+            alteradas = []
+            for avaliacao in avaliacoes.only("id", "respostas_bitmask"):
+                if avaliacao.id not in grupos:
+                    continue
+                avaliacao.respostas_bitmask = Avaliacao.codificar_respostas(
+                    {
+                        ordens[pergunta_id]: resposta
+                        for _, pergunta_id, resposta in grupos[avaliacao.id]
+                    }
+                )
+                alteradas.append(avaliacao)
+
+            with transaction.atomic():
+                Avaliacao.objects.bulk_update(
+                    alteradas, ["respostas_bitmask"], batch_size=500
+                )
+            total += len(alteradas)
+            self.stdout.write(
+                f"{total} assessments updated (up to user {usuarios[-1]})"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfill complete: {total} assessments updated")
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.tarefas import executar_pendentes
+
+
+class Command(BaseCommand):
+    help = "Runs the pending background export jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting when none are pending",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls in continuous mode",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            executadas = executar_pendentes()
+            if executadas:
+                self.stdout.write(f"Ran {executadas} export jobs")
+                continue
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+
+        self.stdout.write(self.style.SUCCESS("No pending export jobs"))
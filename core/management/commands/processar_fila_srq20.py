@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import fila
+from core.services import drenar_fila
+
+
+class Command(BaseCommand):
+    help = "Drains the queued SRQ-20 submissions into the database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="Number of queued submissions written per transaction",
+        )
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Keep polling the queue instead of exiting when it is empty",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls in continuous mode",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Only print the queue depth and drain lag",
+        )
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.imprimir_status()
+            return
+
+        while True:
+            gravadas, com_erro = drenar_fila(options["lote"])
+            if gravadas or com_erro:
+                self.stdout.write(
+                    f"Persisted {gravadas} submissions ({com_erro} failed)"
+                )
+                continue
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+
+        self.imprimir_status()
+
+    def imprimir_status(self):
+        estatisticas = fila.estatisticas()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Pending: {estatisticas['pendentes']}, "
+                f"failed: {estatisticas['com_erro']}, "
+                f"drain lag: {estatisticas['atraso_segundos']:.1f}s"
+            )
+        )
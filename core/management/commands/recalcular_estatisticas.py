@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core import estatisticas
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the assessment summary statistics from the Avaliacao table"
+
+    def handle(self, *args, **options):
+        linhas = estatisticas.recalcular()
+        self.stdout.write(
+            self.style.SUCCESS(f"Statistics rebuilt: {linhas} summary rows")
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.tendencias import recalcular_transicoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the distress-level transition matrix from consecutive "
+        "assessments of each user"
+    )
+
+    def handle(self, *args, **options):
+        linhas = recalcular_transicoes()
+        self.stdout.write(
+            self.style.SUCCESS(f"Transition matrix rebuilt: {linhas} transitions")
+        )
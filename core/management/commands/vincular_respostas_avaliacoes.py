@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.agrupamento import agrupar_respostas_dos_usuarios, lotes_de_usuarios
+from core.models import Resposta
+
+
+class Command(BaseCommand):
+    help = "Links existing Resposta rows without an assessment to their Avaliacao"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=200,
+            help="Number of users processed (and committed) per transaction",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        for usuarios in lotes_de_usuarios(options["lote"]):
+            grupos = agrupar_respostas_dos_usuarios(usuarios, somente_sem_vinculo=True)
+            respostas = [
+                Resposta(id=resposta_id, avaliacao_id=avaliacao_id)
+                for avaliacao_id, itens in grupos.items()
+                for resposta_id, _, _ in itens
+            ]
+
+            with transaction.atomic():
+                Resposta.objects.bulk_update(respostas, ["avaliacao"], batch_size=500)
+            total += len(respostas)
+            self.stdout.write(f"{total} answers linked (up to user {usuarios[-1]})")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfill complete: {total} answers linked")
+        )
@@ -1,5 +1,4 @@
-from django.utils import timezone
-from .models import HistoricoAcesso
+from .acessos import registrar_acesso
 
 
 class HistoricoAcessoMiddleware:
@@ -20,8 +19,8 @@ class HistoricoAcessoMiddleware:
             # Get IP address
             ip = self.get_client_ip(request)
 
-            # Register access
-            HistoricoAcesso.objects.create(usuario=request.user, ip=ip)
+            # Register access (buffered and written in batches)
+            registrar_acesso(request.user.id, ip)
 
         return response
 
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="avaliacao",
+            name="respostas_bitmask",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="O bit n-1 fica ligado quando a pergunta de ordem n foi respondida com Sim",
+                null=True,
+                verbose_name="Respostas (bitmask)",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 07:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_avaliacao_respostas_bitmask"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resposta",
+            name="avaliacao",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="respostas",
+                to="core.avaliacao",
+                verbose_name="Avaliação",
+            ),
+        ),
+    ]
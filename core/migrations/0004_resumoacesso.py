@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 07:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_resposta_avaliacao"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumoAcesso",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "ip",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=45,
+                        verbose_name="Endereço IP",
+                    ),
+                ),
+                ("periodo", models.DateTimeField(verbose_name="Início do período")),
+                (
+                    "total",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Total de acessos"
+                    ),
+                ),
+                (
+                    "primeiro_acesso",
+                    models.DateTimeField(verbose_name="Primeiro acesso"),
+                ),
+                ("ultimo_acesso", models.DateTimeField(verbose_name="Último acesso")),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumos_acesso",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumo de Acesso",
+                "verbose_name_plural": "Resumos de Acesso",
+                "ordering": ["-periodo"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="resumoacesso",
+            constraint=models.UniqueConstraint(
+                fields=("usuario", "ip", "periodo"), name="resumo_acesso_unico"
+            ),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 4.2 on 2026-10-18 07:48
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def popular_estatisticas(apps, schema_editor):
+    Avaliacao = apps.get_model("core", "Avaliacao")
+    EstatisticaAvaliacao = apps.get_model("core", "EstatisticaAvaliacao")
+
+    agregados = {
+        "n": Count("id"),
+        "soma": Sum("pontuacao_total"),
+        "soma_q": Sum(F("pontuacao_total") * F("pontuacao_total")),
+    }
+    dimensoes = (
+        ("nivel", "nivel_sofrimento"),
+        ("genero", "usuario__genero"),
+        ("dia", "data_avaliacao__date"),
+    )
+    totais = {}
+    for dimensao, campo in dimensoes:
+        for grupo in Avaliacao.objects.values(campo).annotate(**agregados).order_by():
+            chave = grupo[campo]
+            if hasattr(chave, "isoformat"):
+                chave = chave.isoformat()
+            acumulado = totais.setdefault((dimensao, chave or ""), [0, 0, 0])
+            acumulado[0] += grupo["n"]
+            acumulado[1] += grupo["soma"] or 0
+            acumulado[2] += grupo["soma_q"] or 0
+    EstatisticaAvaliacao.objects.bulk_create(
+        EstatisticaAvaliacao(
+            dimensao=dimensao,
+            chave=chave,
+            total=total,
+            soma_pontuacao=soma,
+            soma_quadrados=soma_quadrados,
+        )
+        for (dimensao, chave), (total, soma, soma_quadrados) in totais.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_resumoacesso"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EstatisticaAvaliacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "dimensao",
+                    models.CharField(
+                        choices=[
+                            ("nivel", "Nível de sofrimento"),
+                            ("genero", "Gênero"),
+                            ("dia", "Dia"),
+                        ],
+                        max_length=10,
+                        verbose_name="Dimensão",
+                    ),
+                ),
+                (
+                    "chave",
+                    models.CharField(blank=True, max_length=20, verbose_name="Chave"),
+                ),
+                (
+                    "total",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Total"),
+                ),
+                (
+                    "soma_pontuacao",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Soma das pontuações"
+                    ),
+                ),
+                (
+                    "soma_quadrados",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Soma dos quadrados das pontuações"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Estatística de Avaliações",
+                "verbose_name_plural": "Estatísticas de Avaliações",
+                "ordering": ["dimensao", "chave"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="estatisticaavaliacao",
+            constraint=models.UniqueConstraint(
+                fields=("dimensao", "chave"), name="estatistica_avaliacao_unica"
+            ),
+        ),
+        migrations.RunPython(popular_estatisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 07:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_estatisticaavaliacao"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="avaliacao",
+            name="data_avaliacao",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Data da avaliação",
+            ),
+        ),
+    ]
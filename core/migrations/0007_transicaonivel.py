@@ -0,0 +1,87 @@
+# Generated by Django 4.2 on 2026-10-18 07:54
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_avaliacao_data_avaliacao_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransicaoNivel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "nivel_origem",
+                    models.CharField(
+                        choices=[
+                            ("Nenhum", "Nenhum"),
+                            ("Leve", "Leve"),
+                            ("Moderado", "Moderado"),
+                            ("Grave", "Grave"),
+                        ],
+                        max_length=20,
+                        verbose_name="Nível de origem",
+                    ),
+                ),
+                (
+                    "nivel_destino",
+                    models.CharField(
+                        choices=[
+                            ("Nenhum", "Nenhum"),
+                            ("Leve", "Leve"),
+                            ("Moderado", "Moderado"),
+                            ("Grave", "Grave"),
+                        ],
+                        max_length=20,
+                        verbose_name="Nível de destino",
+                    ),
+                ),
+                (
+                    "total",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Total"),
+                ),
+                (
+                    "soma_variacao",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Soma das variações de pontuação"
+                    ),
+                ),
+                (
+                    "atualizado_em",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Atualizado em"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Transição de Nível",
+                "verbose_name_plural": "Transições de Nível",
+                "ordering": ["nivel_origem", "nivel_destino"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="avaliacao",
+            index=models.Index(
+                fields=["usuario", "data_avaliacao"], name="avaliacao_usuario_data_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transicaonivel",
+            constraint=models.UniqueConstraint(
+                fields=("nivel_origem", "nivel_destino"), name="transicao_nivel_unica"
+            ),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 4.2 on 2026-10-18 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_transicaonivel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TarefaExportacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "formato",
+                    models.CharField(
+                        choices=[
+                            ("csv", "CSV"),
+                            ("ndjson", "NDJSON"),
+                            ("parquet", "Parquet"),
+                            ("arrow", "Arrow IPC"),
+                        ],
+                        max_length=10,
+                        verbose_name="Formato",
+                    ),
+                ),
+                (
+                    "parametros",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Parâmetros"
+                    ),
+                ),
+                (
+                    "chave",
+                    models.CharField(
+                        help_text="Hash do formato e dos parâmetros, usado para reaproveitar arquivos",
+                        max_length=64,
+                        verbose_name="Chave",
+                    ),
+                ),
+                (
+                    "situacao",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("executando", "Executando"),
+                            ("concluida", "Concluída"),
+                            ("erro", "Erro"),
+                        ],
+                        default="pendente",
+                        max_length=12,
+                        verbose_name="Situação",
+                    ),
+                ),
+                (
+                    "total",
+                    models.PositiveBigIntegerField(
+                        blank=True, null=True, verbose_name="Total de avaliações"
+                    ),
+                ),
+                (
+                    "processadas",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Avaliações processadas"
+                    ),
+                ),
+                (
+                    "arquivo",
+                    models.FileField(
+                        blank=True, upload_to="exportacoes/", verbose_name="Arquivo"
+                    ),
+                ),
+                (
+                    "tamanho",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Tamanho do arquivo (bytes)"
+                    ),
+                ),
+                (
+                    "cursor_seguinte",
+                    models.CharField(
+                        blank=True,
+                        help_text="Cursor para a próxima exportação incremental",
+                        max_length=100,
+                        verbose_name="Cursor seguinte",
+                    ),
+                ),
+                ("erro", models.TextField(blank=True, verbose_name="Erro")),
+                (
+                    "criado_em",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Criado em"
+                    ),
+                ),
+                (
+                    "iniciado_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Iniciado em"
+                    ),
+                ),
+                (
+                    "concluido_em",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Concluído em"
+                    ),
+                ),
+                (
+                    "solicitante",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="exportacoes",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Solicitante",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Tarefa de Exportação",
+                "verbose_name_plural": "Tarefas de Exportação",
+                "ordering": ["-criado_em"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="tarefaexportacao",
+            index=models.Index(
+                fields=["chave", "criado_em"], name="exportacao_chave_idx"
+            ),
+        ),
+    ]
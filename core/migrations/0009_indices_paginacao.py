@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 08:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_tarefaexportacao"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="historicoacesso",
+            name="data_acesso",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Data de acesso",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="resposta",
+            name="data_resposta",
+            field=models.DateTimeField(
+                db_index=True,
+                default=django.utils.timezone.now,
+                verbose_name="Data da resposta",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="resumoacesso",
+            name="periodo",
+            field=models.DateTimeField(db_index=True, verbose_name="Início do período"),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_indices_paginacao"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="avaliacao",
+            index=models.Index(
+                fields=["nivel_sofrimento", "data_avaliacao"],
+                name="avaliacao_nivel_data_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicoacesso",
+            index=models.Index(
+                fields=["usuario", "data_acesso"], name="acesso_usuario_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resposta",
+            index=models.Index(
+                fields=["usuario", "data_resposta"], name="resposta_usuario_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resposta",
+            index=models.Index(
+                fields=["usuario", "pergunta", "data_resposta"],
+                name="resposta_usuario_perg_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resumoacesso",
+            index=models.Index(
+                fields=["usuario", "periodo"], name="resumo_acesso_usuario_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 08:31
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_indices_compostos"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="resposta",
+            options={
+                "base_manager_name": "objetos_com_rotulo",
+                "verbose_name": "Resposta",
+                "verbose_name_plural": "Respostas",
+            },
+        ),
+        migrations.AlterModelManagers(
+            name="resposta",
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("objetos_com_rotulo", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
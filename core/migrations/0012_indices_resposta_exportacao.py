@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 08:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_resposta_base_manager"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="resposta",
+            name="usuario",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="respostas",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Usuário",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tarefaexportacao",
+            index=models.Index(fields=["criado_em"], name="exportacao_criado_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tarefaexportacao",
+            index=models.Index(
+                fields=["situacao", "iniciado_em"], name="exportacao_situacao_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+def encadear_avaliacoes(apps, schema_editor):
+    Avaliacao = apps.get_model("core", "Avaliacao")
+
+    alteradas = []
+    anterior = None
+    for avaliacao in Avaliacao.objects.order_by(
+        "usuario_id", "data_avaliacao", "id"
+    ).only("id", "usuario_id", "pontuacao_total", "nivel_sofrimento", "data_avaliacao"):
+        if anterior is not None and anterior.usuario_id == avaliacao.usuario_id:
+            avaliacao.pontuacao_anterior = anterior.pontuacao_total
+            avaliacao.nivel_anterior = anterior.nivel_sofrimento
+            avaliacao.data_anterior = anterior.data_avaliacao
+            alteradas.append(avaliacao)
+            if len(alteradas) >= 1000:
+                Avaliacao.objects.bulk_update(
+                    alteradas,
+                    ["pontuacao_anterior", "nivel_anterior", "data_anterior"],
+                )
+                alteradas = []
+        anterior = avaliacao
+    Avaliacao.objects.bulk_update(
+        alteradas, ["pontuacao_anterior", "nivel_anterior", "data_anterior"]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_indices_resposta_exportacao"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="avaliacao",
+            name="data_anterior",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Data da anterior"
+            ),
+        ),
+        migrations.AddField(
+            model_name="avaliacao",
+            name="nivel_anterior",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("Nenhum", "Nenhum"),
+                    ("Leve", "Leve"),
+                    ("Moderado", "Moderado"),
+                    ("Grave", "Grave"),
+                ],
+                editable=False,
+                max_length=20,
+                null=True,
+                verbose_name="Nível anterior",
+            ),
+        ),
+        migrations.AddField(
+            model_name="avaliacao",
+            name="pontuacao_anterior",
+            field=models.PositiveSmallIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Pontuação anterior"
+            ),
+        ),
+        migrations.RunPython(encadear_avaliacoes, migrations.RunPython.noop),
+    ]
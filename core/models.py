@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -32,6 +32,12 @@ class Usuario(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        # Uma troca de gênero move as estatísticas das avaliações do usuário na
+        # mesma transação (ver core.signals.mover_estatisticas_de_genero)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Pergunta(models.Model):
     CATEGORIAS = (
@@ -58,11 +64,25 @@ class Pergunta(models.Model):
         return f"{self.ordem}. {self.texto[:50]}..."
 
 
+class RespostaBaseManager(models.Manager):
+    """Carrega o usuário e a pergunta lidos pelo __str__
+
+    Usado pelo Django ao coletar objetos relacionados, como na página de
+    confirmação de exclusão do admin, que lista cada resposta de uma avaliação
+    ou de um usuário apagado sem uma consulta por resposta.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("usuario", "pergunta")
+
+
 class Resposta(models.Model):
+    # Sem índice próprio: resposta_usuario_data_idx começa por usuario
     usuario = models.ForeignKey(
         Usuario,
         on_delete=models.CASCADE,
         related_name="respostas",
+        db_index=False,
         verbose_name=_("Usuário"),
     )
     pergunta = models.ForeignKey(
@@ -71,20 +91,44 @@ class Resposta(models.Model):
         related_name="respostas",
         verbose_name=_("Pergunta"),
     )
+    avaliacao = models.ForeignKey(
+        "Avaliacao",
+        on_delete=models.CASCADE,
+        related_name="respostas",
+        blank=True,
+        null=True,
+        verbose_name=_("Avaliação"),
+    )
     resposta = models.BooleanField(verbose_name=_("Resposta"))
     data_resposta = models.DateTimeField(
-        default=timezone.now, verbose_name=_("Data da resposta")
+        default=timezone.now, db_index=True, verbose_name=_("Data da resposta")
     )
 
+    objects = models.Manager()
+    objetos_com_rotulo = RespostaBaseManager()
+
     class Meta:
         verbose_name = _("Resposta")
         verbose_name_plural = _("Respostas")
+        base_manager_name = "objetos_com_rotulo"
+        indexes = [
+            # Respostas de um usuário por data, e de uma pergunta dele por data
+            models.Index(
+                fields=["usuario", "data_resposta"], name="resposta_usuario_data_idx"
+            ),
+            models.Index(
+                fields=["usuario", "pergunta", "data_resposta"],
+                name="resposta_usuario_perg_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.pergunta.ordem} - {'Sim' if self.resposta else 'Não'}"
 
 
 class Avaliacao(models.Model):
+    TOTAL_PERGUNTAS = 20
+
     NIVEIS_SOFRIMENTO = (
         ("Nenhum", "Nenhum"),
         ("Leve", "Leve"),
@@ -105,13 +149,48 @@ class Avaliacao(models.Model):
         max_length=20, choices=NIVEIS_SOFRIMENTO, verbose_name=_("Nível de sofrimento")
     )
     data_avaliacao = models.DateTimeField(
-        default=timezone.now, verbose_name=_("Data da avaliação")
+        default=timezone.now, db_index=True, verbose_name=_("Data da avaliação")
+    )
+    respostas_bitmask = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name=_("Respostas (bitmask)"),
+        help_text=_(
+            "O bit n-1 fica ligado quando a pergunta de ordem n foi respondida com Sim"
+        ),
+    )
+    # Avaliação anterior do mesmo usuário, mantida por core.tendencias
+    pontuacao_anterior = models.PositiveSmallIntegerField(
+        blank=True, null=True, editable=False, verbose_name=_("Pontuação anterior")
+    )
+    nivel_anterior = models.CharField(
+        max_length=20,
+        choices=NIVEIS_SOFRIMENTO,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name=_("Nível anterior"),
+    )
+    data_anterior = models.DateTimeField(
+        blank=True, null=True, editable=False, verbose_name=_("Data da anterior")
     )
 
     class Meta:
         verbose_name = _("Avaliação")
         verbose_name_plural = _("Avaliações")
         ordering = ["-data_avaliacao"]
+        indexes = [
+            # Histórico de cada usuário em ordem (core.tendencias.encadear);
+            # também percorrido de trás para frente nas listagens por data
+            # decrescente
+            models.Index(
+                fields=["usuario", "data_avaliacao"], name="avaliacao_usuario_data_idx"
+            ),
+            models.Index(
+                fields=["nivel_sofrimento", "data_avaliacao"],
+                name="avaliacao_nivel_data_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.nivel_sofrimento} ({self.pontuacao_total} pontos)"
@@ -127,6 +206,29 @@ class Avaliacao(models.Model):
         else:  # 15-20
             return "Grave"
 
+    @staticmethod
+    def bit_da_pergunta(ordem):
+        """Máscara do bit que representa a pergunta de ordem `ordem` (1 a 20)"""
+        return 1 << (ordem - 1)
+
+    @classmethod
+    def codificar_respostas(cls, respostas_por_ordem):
+        """Empacota um dicionário {ordem: resposta} em um inteiro"""
+        bitmask = 0
+        for ordem, resposta in respostas_por_ordem.items():
+            if resposta is True:
+                bitmask |= cls.bit_da_pergunta(ordem)
+        return bitmask
+
+    def decodificar_respostas(self):
+        """Retorna {ordem: resposta} a partir do bitmask, ou None se não preenchido"""
+        if self.respostas_bitmask is None:
+            return None
+        return {
+            ordem: bool(self.respostas_bitmask & self.bit_da_pergunta(ordem))
+            for ordem in range(1, self.TOTAL_PERGUNTAS + 1)
+        }
+
 
 class AtividadeSugerida(models.Model):
     NIVEIS_SOFRIMENTO = (
@@ -156,7 +258,7 @@ class HistoricoAcesso(models.Model):
         verbose_name=_("Usuário"),
     )
     data_acesso = models.DateTimeField(
-        default=timezone.now, verbose_name=_("Data de acesso")
+        default=timezone.now, db_index=True, verbose_name=_("Data de acesso")
     )
     ip = models.GenericIPAddressField(
         blank=True, null=True, verbose_name=_("Endereço IP")
@@ -166,6 +268,211 @@ class HistoricoAcesso(models.Model):
         verbose_name = _("Histórico de Acesso")
         verbose_name_plural = _("Históricos de Acesso")
         ordering = ["-data_acesso"]
+        indexes = [
+            models.Index(
+                fields=["usuario", "data_acesso"], name="acesso_usuario_data_idx"
+            )
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.data_acesso.strftime('%d/%m/%Y %H:%M:%S')}"
+
+
+class ResumoAcesso(models.Model):
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name="resumos_acesso",
+        verbose_name=_("Usuário"),
+    )
+    ip = models.CharField(
+        max_length=45, blank=True, default="", verbose_name=_("Endereço IP")
+    )
+    periodo = models.DateTimeField(db_index=True, verbose_name=_("Início do período"))
+    total = models.PositiveIntegerField(default=0, verbose_name=_("Total de acessos"))
+    primeiro_acesso = models.DateTimeField(verbose_name=_("Primeiro acesso"))
+    ultimo_acesso = models.DateTimeField(verbose_name=_("Último acesso"))
+
+    class Meta:
+        verbose_name = _("Resumo de Acesso")
+        verbose_name_plural = _("Resumos de Acesso")
+        ordering = ["-periodo"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["usuario", "ip", "periodo"], name="resumo_acesso_unico"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["usuario", "periodo"], name="resumo_acesso_usuario_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.periodo.strftime('%d/%m/%Y %H:%M')} ({self.total})"
+
+    @staticmethod
+    def inicio_periodo(data):
+        """Início da hora (no fuso local) a que `data` pertence"""
+        return timezone.localtime(data).replace(minute=0, second=0, microsecond=0)
+
+
+class EstatisticaAvaliacao(models.Model):
+    """Totais acumulados das avaliações por nível, por gênero e por dia
+
+    Mantidos na mesma transação de cada avaliação gravada (ver
+    core.estatisticas) para que as estatísticas não precisem varrer Avaliacao.
+    """
+
+    DIMENSOES = (
+        ("nivel", "Nível de sofrimento"),
+        ("genero", "Gênero"),
+        ("dia", "Dia"),
+    )
+
+    dimensao = models.CharField(
+        max_length=10, choices=DIMENSOES, verbose_name=_("Dimensão")
+    )
+    chave = models.CharField(max_length=20, blank=True, verbose_name=_("Chave"))
+    total = models.PositiveBigIntegerField(default=0, verbose_name=_("Total"))
+    soma_pontuacao = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("Soma das pontuações")
+    )
+    soma_quadrados = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("Soma dos quadrados das pontuações")
+    )
+
+    class Meta:
+        verbose_name = _("Estatística de Avaliações")
+        verbose_name_plural = _("Estatísticas de Avaliações")
+        ordering = ["dimensao", "chave"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dimensao", "chave"], name="estatistica_avaliacao_unica"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.dimensao}={self.chave or '-'} ({self.total})"
+
+
+class TransicaoNivel(models.Model):
+    """Quantas vezes avaliações consecutivas de um usuário passaram de um nível a outro
+
+    Pré-calculada por `python manage.py recalcular_transicoes` (ver core.tendencias).
+    """
+
+    nivel_origem = models.CharField(
+        max_length=20,
+        choices=Avaliacao.NIVEIS_SOFRIMENTO,
+        verbose_name=_("Nível de origem"),
+    )
+    nivel_destino = models.CharField(
+        max_length=20,
+        choices=Avaliacao.NIVEIS_SOFRIMENTO,
+        verbose_name=_("Nível de destino"),
+    )
+    total = models.PositiveBigIntegerField(default=0, verbose_name=_("Total"))
+    soma_variacao = models.BigIntegerField(
+        default=0, verbose_name=_("Soma das variações de pontuação")
+    )
+    atualizado_em = models.DateTimeField(
+        default=timezone.now, verbose_name=_("Atualizado em")
+    )
+
+    class Meta:
+        verbose_name = _("Transição de Nível")
+        verbose_name_plural = _("Transições de Nível")
+        ordering = ["nivel_origem", "nivel_destino"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["nivel_origem", "nivel_destino"], name="transicao_nivel_unica"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.nivel_origem} → {self.nivel_destino} ({self.total})"
+
+
+class TarefaExportacao(models.Model):
+    """Exportação de avaliações gerada em segundo plano (ver core.tarefas)"""
+
+    FORMATOS = (
+        ("csv", "CSV"),
+        ("ndjson", "NDJSON"),
+        ("parquet", "Parquet"),
+        ("arrow", "Arrow IPC"),
+    )
+    SITUACOES = (
+        ("pendente", "Pendente"),
+        ("executando", "Executando"),
+        ("concluida", "Concluída"),
+        ("erro", "Erro"),
+    )
+
+    solicitante = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="exportacoes",
+        verbose_name=_("Solicitante"),
+    )
+    formato = models.CharField(
+        max_length=10, choices=FORMATOS, verbose_name=_("Formato")
+    )
+    parametros = models.JSONField(
+        default=dict, blank=True, verbose_name=_("Parâmetros")
+    )
+    chave = models.CharField(
+        max_length=64,
+        verbose_name=_("Chave"),
+        help_text=_(
+            "Hash do formato e dos parâmetros, usado para reaproveitar arquivos"
+        ),
+    )
+    situacao = models.CharField(
+        max_length=12, choices=SITUACOES, default="pendente", verbose_name=_("Situação")
+    )
+    total = models.PositiveBigIntegerField(
+        blank=True, null=True, verbose_name=_("Total de avaliações")
+    )
+    processadas = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("Avaliações processadas")
+    )
+    arquivo = models.FileField(
+        upload_to="exportacoes/", blank=True, verbose_name=_("Arquivo")
+    )
+    tamanho = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("Tamanho do arquivo (bytes)")
+    )
+    cursor_seguinte = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name=_("Cursor seguinte"),
+        help_text=_("Cursor para a próxima exportação incremental"),
+    )
+    erro = models.TextField(blank=True, verbose_name=_("Erro"))
+    criado_em = models.DateTimeField(default=timezone.now, verbose_name=_("Criado em"))
+    iniciado_em = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Iniciado em")
+    )
+    concluido_em = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Concluído em")
+    )
+
+    class Meta:
+        verbose_name = _("Tarefa de Exportação")
+        verbose_name_plural = _("Tarefas de Exportação")
+        ordering = ["-criado_em"]
+        indexes = [
+            models.Index(fields=["chave", "criado_em"], name="exportacao_chave_idx"),
+            # Listagem (ordering) e busca das tarefas pendentes ou abandonadas
+            models.Index(fields=["criado_em"], name="exportacao_criado_idx"),
+            models.Index(
+                fields=["situacao", "iniciado_em"], name="exportacao_situacao_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.formato} #{self.id} ({self.situacao})"
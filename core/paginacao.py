@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoPorCursor(CursorPagination):
+    """Paginação por cursor (keyset) em ordem decrescente de data
+
+    Cada página filtra a partir da posição codificada no cursor (ex.:
+    data_avaliacao < última vista), em vez de contar a tabela e pular as linhas
+    anteriores com OFFSET, de modo que páginas profundas custam o mesmo que a
+    primeira. A ordenação vem de `ordenacao_cursor` na view e deve começar por
+    uma coluna indexada. `?page_size=` ajusta o tamanho da página até
+    settings.SRQ20_PAGINACAO_MAXIMA.
+    """
+
+    page_size_query_param = "page_size"
+    ordering = ("-id",)
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, "SRQ20_PAGINACAO_MAXIMA", 100)
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "ordenacao_cursor", self.ordering)
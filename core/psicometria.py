@@ -0,0 +1,155 @@
+import math
+
+import numpy as np
+
+from .models import Avaliacao, Pergunta
+
+TAMANHO_BLOCO = 10000
+
+_BITS = np.arange(Avaliacao.TOTAL_PERGUNTAS, dtype=np.uint32)
+
+
+def blocos_de_respostas(tamanho_bloco=TAMANHO_BLOCO):
+    """Percorre as avaliações em blocos de matrizes avaliações × 20 itens (0/1)
+
+    Lê apenas o bitmask de cada avaliação, com paginação por chave (id > último
+    visto), de modo que a memória usada depende só do tamanho do bloco. A coluna
+    j corresponde à pergunta de ordem j + 1. Avaliações sem bitmask ficam de fora
+    (veja `preencher_bitmask_respostas`).
+    """
+    ultimo = 0
+    while True:
+        linhas = list(
+            Avaliacao.objects.filter(id__gt=ultimo, respostas_bitmask__isnull=False)
+            .order_by("id")
+            .values_list("id", "respostas_bitmask")[:tamanho_bloco]
+        )
+        if not linhas:
+            return
+        ultimo = linhas[-1][0]
+        bitmasks = np.fromiter(
+            (bitmask for _, bitmask in linhas), dtype=np.uint32, count=len(linhas)
+        )
+        yield ((bitmasks[:, None] >> _BITS) & 1).astype(np.float64)
+
+
+class Acumulador:
+    """Somas suficientes para médias e covariâncias dos itens, bloco a bloco"""
+
+    def __init__(self, itens=Avaliacao.TOTAL_PERGUNTAS):
+        self.n = 0
+        self.soma = np.zeros(itens)
+        self.produtos = np.zeros((itens, itens))
+
+    def adicionar(self, matriz):
+        self.n += matriz.shape[0]
+        self.soma += matriz.sum(axis=0)
+        self.produtos += matriz.T @ matriz
+
+    def medias(self):
+        return self.soma / self.n
+
+    def covariancia(self):
+        """Matriz de covariância populacional dos itens"""
+        medias = self.medias()
+        return self.produtos / self.n - np.outer(medias, medias)
+
+
+def _numero(valor):
+    """Converte para float, trocando NaN e infinito (variância nula) por None"""
+    valor = float(valor)
+    return valor if math.isfinite(valor) else None
+
+
+def alfa_cronbach(covariancia):
+    """Alfa de Cronbach a partir da matriz de covariância dos itens"""
+    k = covariancia.shape[0]
+    variancia_total = covariancia.sum()
+    if k < 2 or variancia_total <= 0:
+        return None
+    return _numero(k / (k - 1) * (1 - np.trace(covariancia) / variancia_total))
+
+
+def _correlacao(covariancia):
+    desvios = np.sqrt(np.diag(covariancia))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return covariancia / np.outer(desvios, desvios)
+
+
+def _correlacao_item_total(covariancia):
+    """Correlação de cada item com a soma dos demais (item-total corrigida)"""
+    variancias = np.diag(covariancia)
+    cov_com_total = covariancia.sum(axis=1) - variancias
+    variancia_resto = covariancia.sum() - 2 * covariancia.sum(axis=1) + variancias
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov_com_total / np.sqrt(variancias * variancia_resto)
+
+
+def calcular(tamanho_bloco=TAMANHO_BLOCO):
+    """Prevalência, correlações entre itens, alfa de Cronbach e subescalas
+
+    Os itens são as 20 perguntas do SRQ-20 e cada avaliação é uma observação.
+    Subescalas são formadas pelas perguntas de cada `Pergunta.categoria`.
+    """
+    acumulador = Acumulador()
+    for matriz in blocos_de_respostas(tamanho_bloco):
+        acumulador.adicionar(matriz)
+
+    perguntas = list(
+        Pergunta.objects.order_by("ordem").values("id", "ordem", "texto", "categoria")
+    )
+    resultado = {
+        "total_avaliacoes": acumulador.n,
+        "sem_bitmask": Avaliacao.objects.filter(respostas_bitmask__isnull=True).count(),
+    }
+    if not acumulador.n:
+        return {
+            **resultado,
+            "alfa_cronbach": None,
+            "itens": [],
+            "correlacao": [],
+            "subescalas": [],
+        }
+
+    medias = acumulador.medias()
+    covariancia = acumulador.covariancia()
+    correlacao = _correlacao(covariancia)
+    item_total = _correlacao_item_total(covariancia)
+
+    itens = []
+    for pergunta in perguntas:
+        indice = pergunta["ordem"] - 1
+        if not 0 <= indice < Avaliacao.TOTAL_PERGUNTAS:
+            continue
+        itens.append(
+            {
+                **pergunta,
+                "prevalencia": _numero(medias[indice]),
+                "variancia": _numero(covariancia[indice, indice]),
+                "correlacao_item_total": _numero(item_total[indice]),
+            }
+        )
+
+    categorias = {}
+    for item in itens:
+        categorias.setdefault(item["categoria"], []).append(item["ordem"] - 1)
+    subescalas = []
+    for categoria, indices in categorias.items():
+        sub = covariancia[np.ix_(indices, indices)]
+        subescalas.append(
+            {
+                "categoria": categoria,
+                "ordens": [indice + 1 for indice in indices],
+                "media": _numero(medias[indices].sum()),
+                "desvio_padrao": _numero(math.sqrt(max(sub.sum(), 0))),
+                "alfa_cronbach": alfa_cronbach(sub),
+            }
+        )
+
+    return {
+        **resultado,
+        "alfa_cronbach": alfa_cronbach(covariancia),
+        "itens": itens,
+        "correlacao": [[_numero(valor) for valor in linha] for linha in correlacao],
+        "subescalas": subescalas,
+    }
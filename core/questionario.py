@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .models import Pergunta
+from .serializers import PerguntaSerializer
+
+CACHE_CONTROL = "public, no-cache"
+
+_trava = threading.Lock()
+_questionario = None
+_geracao = 0
+
+
+class Questionario:
+    """Perguntas do SRQ-20 já serializadas, com a versão derivada do conteúdo"""
+
+    def __init__(self, perguntas):
+        self.perguntas = perguntas
+        self.ordens = {pergunta["id"]: pergunta["ordem"] for pergunta in perguntas}
+        self.corpo = JSONRenderer().render(perguntas)
+        self.versao = hashlib.sha256(self.corpo).hexdigest()[:16]
+        self.etag = f'"{self.versao}"'
+        self.montado_em = time.monotonic()
+
+    def etag_para(self, caminho):
+        """ETag de uma representação derivada (ex.: página filtrada da listagem)"""
+        digest = hashlib.sha256(f"{self.versao}:{caminho}".encode()).hexdigest()
+        return f'"{digest[:16]}"'
+
+
+def expirado(montado_em):
+    """Se um cache montado em `montado_em` (time.monotonic) já deve ser refeito
+
+    Os sinais invalidam os caches em memória só no processo que gravou a
+    alteração; os demais processos do servidor os remontam depois de
+    settings.SRQ20_CACHE_LOCAL_VALIDADE segundos.
+    """
+    validade = getattr(settings, "SRQ20_CACHE_LOCAL_VALIDADE", 60.0)
+    return time.monotonic() - montado_em >= validade
+
+
+def obter_questionario():
+    """Retorna o questionário em cache, montando-o com uma consulta se necessário
+
+    Remontado depois da validade do cache (ver expirado); como a versão deriva
+    do conteúdo, o ETag só muda se as perguntas tiverem mudado.
+    """
+    global _questionario
+    questionario = _questionario
+    if questionario is not None and not expirado(questionario.montado_em):
+        return questionario
+
+    with _trava:
+        questionario = _questionario
+        if questionario is not None and not expirado(questionario.montado_em):
+            return questionario
+        geracao = _geracao
+        perguntas = PerguntaSerializer(
+            Pergunta.objects.all().order_by("ordem"), many=True
+        ).data
+        questionario = Questionario(perguntas)
+        # Não guarda o resultado se o cache foi invalidado durante a montagem
+        if geracao == _geracao:
+            _questionario = questionario
+    return questionario
+
+
+def invalidar_questionario():
+    global _questionario, _geracao
+    _geracao += 1
+    _questionario = None
+
+
+def aquecer_questionario():
+    """Monta o cache na inicialização do servidor, se o banco já estiver migrado"""
+    try:
+        obter_questionario()
+    except DatabaseError:
+        pass
+
+
+def etag_corresponde(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in etags
+
+
+def adicionar_cabecalhos(response, etag, versao):
+    response["ETag"] = etag
+    response["Cache-Control"] = CACHE_CONTROL
+    response["X-Questionario-Versao"] = versao
+    return response
+
+
+def resposta_questionario(request):
+    """Resposta HTTP com o questionário pré-serializado, ou 304 se o cliente já o tem"""
+    questionario = obter_questionario()
+    if etag_corresponde(request, questionario.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(questionario.corpo, content_type="application/json")
+    return adicionar_cabecalhos(response, questionario.etag, questionario.versao)
@@ -0,0 +1,296 @@
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.http import HttpResponse
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele, usa o encoder do DRF
+    orjson = None
+
+# Campos cujo to_representation devolve o próprio valor lido do banco
+CAMPOS_IDENTIDADE = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+)
+
+# Campos convertidos pelo próprio to_representation do DRF; a saída é sempre
+# texto, então o orjson a codifica igual ao json da biblioteca padrão (o que não
+# vale para float)
+CAMPOS_CONVERTIDOS = (
+    serializers.DateTimeField,
+    serializers.DateField,
+    serializers.TimeField,
+    serializers.DurationField,
+    serializers.UUIDField,
+)
+
+_renderer = JSONRenderer()
+_encoder = JSONEncoder()
+
+# O orjson só é usado quando o JSONRenderer está no modo padrão do DRF (compacto
+# e UTF-8), em que a saída dos dois é a mesma
+_usar_orjson = (
+    orjson is not None and JSONRenderer.compact and not JSONRenderer.ensure_ascii
+)
+
+
+def _coluna(modelo, campo):
+    """Coluna de .values() que alimenta `campo`, ou ValueError se não houver"""
+    if isinstance(campo, serializers.PrimaryKeyRelatedField):
+        if campo.pk_field is not None:
+            raise ValueError(f"Campo não suportado: {campo.field_name}")
+        return modelo._meta.get_field(campo.source).attname
+    suportados = (serializers.ChoiceField, *CAMPOS_IDENTIDADE, *CAMPOS_CONVERTIDOS)
+    if not isinstance(campo, suportados):
+        raise ValueError(f"Campo não suportado: {campo.field_name}")
+    try:
+        campo_modelo = modelo._meta.get_field(campo.source)
+    except FieldDoesNotExist:
+        raise ValueError(f"Campo não suportado: {campo.field_name}")
+    if campo_modelo.is_relation:
+        raise ValueError(f"Campo não suportado: {campo.field_name}")
+    return campo_modelo.attname
+
+
+def _identidade(campo):
+    if isinstance(campo, (serializers.PrimaryKeyRelatedField, *CAMPOS_IDENTIDADE)):
+        return True
+    # Com chaves de texto, ChoiceField devolve o próprio valor
+    return isinstance(campo, serializers.ChoiceField) and all(
+        isinstance(chave, str) for chave in campo.choice_strings_to_values.values()
+    )
+
+
+def _conversor(campo):
+    """Função valor -> saída de `campo.to_representation(valor)`
+
+    Para DateTimeField em ISO 8601, o fuso horário é resolvido uma única vez,
+    e não a cada linha como em DateTimeField.enforce_timezone.
+    """
+    if not isinstance(campo, serializers.DateTimeField):
+        return campo.to_representation
+    formato = getattr(campo, "format", api_settings.DATETIME_FORMAT)
+    fuso = campo.timezone if hasattr(campo, "timezone") else campo.default_timezone()
+    if formato is None or formato.lower() != ISO_8601 or fuso is None:
+        return campo.to_representation
+
+    def converter(valor):
+        if isinstance(valor, str) or valor.utcoffset() is None:
+            return campo.to_representation(valor)
+        texto = valor.astimezone(fuso).isoformat()
+        return texto[:-6] + "Z" if texto.endswith("+00:00") else texto
+
+    return converter
+
+
+class LeituraRapida:
+    """Monta a saída de um serializer a partir das linhas de .values()
+
+    O mapeamento de colunas para campos é calculado uma vez por serializer;
+    por linha restam um zip e a conversão dos campos que não são devolvidos
+    como vieram do banco (datas). Levanta ValueError para serializers com
+    campos calculados, aninhados ou numéricos de ponto flutuante.
+    """
+
+    def __init__(self, serializer_class, campos=None):
+        serializer = serializer_class()
+        modelo = serializer.Meta.model
+        self.nomes = []
+        self.colunas = []
+        self.conversoes = []
+        for nome, campo in serializer.fields.items():
+            if campo.write_only or (campos is not None and nome not in campos):
+                continue
+            self.nomes.append(nome)
+            self.colunas.append(_coluna(modelo, campo))
+            if not _identidade(campo):
+                self.conversoes.append((nome, campo))
+        if not self.colunas:
+            raise ValueError("O serializer não tem campos de leitura.")
+
+        if len(self.colunas) == 1:
+            coluna = self.colunas[0]
+            self._valores = lambda linha: (linha[coluna],)
+        else:
+            self._valores = itemgetter(*self.colunas)
+
+    def linhas(self, linhas):
+        """Lista de dicionários, como `serializer_class(many=True).data`"""
+        nomes, valores = self.nomes, self._valores
+        conversoes = [(nome, _conversor(campo)) for nome, campo in self.conversoes]
+        resultado = []
+        for linha in linhas:
+            dados = dict(zip(nomes, valores(linha)))
+            for nome, converter in conversoes:
+                valor = dados[nome]
+                if valor is not None:
+                    dados[nome] = converter(valor)
+            resultado.append(dados)
+        return resultado
+
+
+@lru_cache(maxsize=None)
+def obter_leitura(serializer_class, campos=None):
+    """LeituraRapida de `serializer_class` (só com `campos`, uma tupla, se dada),
+    ou None se ele não for suportado"""
+    try:
+        return LeituraRapida(serializer_class, campos)
+    except ValueError:
+        return None
+
+
+def codificar_json(dados):
+    """Os mesmos bytes que o JSONRenderer do DRF, com orjson quando instalado"""
+    if not _usar_orjson:
+        return _renderer.render(dados)
+    conteudo = orjson.dumps(
+        dados, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME
+    )
+    # Como o DRF, escapa U+2028 e U+2029 para que o JSON seja JavaScript válido
+    return conteudo.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+def _json_compacto(request):
+    renderer = getattr(request, "accepted_renderer", None)
+    return (
+        isinstance(renderer, JSONRenderer)
+        and renderer.format == "json"
+        and renderer.get_indent(request.accepted_media_type, {}) is None
+    )
+
+
+@lru_cache(maxsize=None)
+def campos_de_leitura(serializer_class):
+    """(nome, campo do modelo lido) de cada campo de leitura de `serializer_class`
+
+    O campo do modelo é None para campos calculados (SerializerMethodField,
+    source com pontos, anotações), que podem ler qualquer atributo.
+    """
+    serializer = serializer_class()
+    modelo = serializer.Meta.model
+    campos = []
+    for nome, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        try:
+            campo_modelo = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            campo_modelo = None
+        if campo_modelo is not None and not campo_modelo.concrete:
+            campo_modelo = None
+        campos.append((nome, campo_modelo and campo_modelo.name))
+    return tuple(campos)
+
+
+def _lista_de_campos(valor):
+    return [nome.strip() for nome in valor.split(",") if nome.strip()]
+
+
+class ProjecaoMixin:
+    """?fields=a,b ou ?exclude=c para escolher os campos de list e retrieve
+
+    Os campos escolhidos seguem no contexto do serializer (ver
+    core.serializers.CamposDinamicosMixin) e restringem o SELECT com .only().
+    """
+
+    acoes_projetaveis = ("list", "retrieve")
+
+    def campos_projetados(self):
+        """Tupla com os campos pedidos, na ordem do serializer, ou None para todos"""
+        if not hasattr(self, "_campos_projetados"):
+            self._campos_projetados = self._ler_campos_projetados()
+        return self._campos_projetados
+
+    def _ler_campos_projetados(self):
+        params = self.request.query_params
+        if (
+            self.action not in self.acoes_projetaveis
+            or self.request.method not in SAFE_METHODS
+            or not (params.get("fields") or params.get("exclude"))
+        ):
+            return None
+
+        nomes = [nome for nome, _ in campos_de_leitura(self.get_serializer_class())]
+        pedidos = _lista_de_campos(params.get("fields", "")) or nomes
+        excluidos = _lista_de_campos(params.get("exclude", ""))
+        desconhecidos = sorted(set(pedidos + excluidos) - set(nomes))
+        if desconhecidos:
+            raise ValidationError(
+                {
+                    "error": f"Campos desconhecidos: {', '.join(desconhecidos)}. "
+                    f"Disponíveis: {', '.join(nomes)}."
+                }
+            )
+        campos = tuple(
+            nome for nome in nomes if nome in pedidos and nome not in excluidos
+        )
+        if not campos:
+            raise ValidationError({"error": "Nenhum campo selecionado."})
+        return campos
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        contexto["campos"] = self.campos_projetados()
+        return contexto
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        campos = self.campos_projetados()
+        if campos is None:
+            return queryset
+        fontes = dict(campos_de_leitura(self.get_serializer_class()))
+        colunas = {fontes[nome] for nome in campos}
+        if None in colunas:
+            # Campo calculado: não há como saber quais colunas ele usa
+            return queryset
+        # A paginação por cursor lê os campos de ordenação de cada objeto
+        colunas.update(
+            campo.lstrip("-") for campo in getattr(self, "ordenacao_cursor", ())
+        )
+        return queryset.only(*colunas)
+
+
+class ListagemRapidaMixin(ProjecaoMixin):
+    """list() pela LeituraRapida quando a resposta é JSON compacto
+
+    A API navegável, ?format=api e Accept com indent=N seguem pelo serializer,
+    assim como serializers não suportados. Desligue com
+    SRQ20_LEITURA_RAPIDA = False.
+    """
+
+    def list(self, request, *args, **kwargs):
+        leitura = obter_leitura(self.get_serializer_class(), self.campos_projetados())
+        if (
+            leitura is None
+            or not getattr(settings, "SRQ20_LEITURA_RAPIDA", True)
+            or not _json_compacto(request)
+        ):
+            return super().list(request, *args, **kwargs)
+
+        # A paginação por cursor lê os campos de ordenação de cada linha
+        colunas = list(leitura.colunas)
+        for campo in getattr(self, "ordenacao_cursor", ()):
+            if campo.lstrip("-") not in colunas:
+                colunas.append(campo.lstrip("-"))
+
+        linhas = self.filter_queryset(self.get_queryset()).values(*colunas)
+        pagina = self.paginate_queryset(linhas)
+        if pagina is None:
+            dados = leitura.linhas(linhas)
+        else:
+            dados = self.get_paginated_response(leitura.linhas(pagina)).data
+        return HttpResponse(
+            codificar_json(dados), content_type=request.accepted_media_type
+        )
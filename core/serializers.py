@@ -1,12 +1,36 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from .models import Pergunta, Resposta, Avaliacao, AtividadeSugerida, HistoricoAcesso
+from .models import (
+    Pergunta,
+    Resposta,
+    Avaliacao,
+    AtividadeSugerida,
+    HistoricoAcesso,
+    ResumoAcesso,
+    TarefaExportacao,
+)
 
 Usuario = get_user_model()
 
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class CamposDinamicosMixin:
+    """Mantém apenas os campos de context["campos"], quando informado
+
+    Preenchido por core.serializacao.ProjecaoMixin a partir de ?fields= e
+    ?exclude=.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = self.context.get("campos")
+        if campos is not None:
+            for nome in set(self.fields) - set(campos):
+                self.fields.pop(nome)
+
+
+class UsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Usuario
         fields = (
@@ -51,14 +75,14 @@ class UsuarioRegistroSerializer(serializers.ModelSerializer):
         return user
 
 
-class PerguntaSerializer(serializers.ModelSerializer):
+class PerguntaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Pergunta
         fields = ("id", "texto", "categoria", "ordem")
         read_only_fields = ("id",)
 
 
-class RespostaSerializer(serializers.ModelSerializer):
+class RespostaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Resposta
         fields = ("id", "usuario", "pergunta", "resposta", "data_resposta")
@@ -77,7 +101,7 @@ class RespostaCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class AvaliacaoSerializer(serializers.ModelSerializer):
+class AvaliacaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Avaliacao
         fields = (
@@ -96,15 +120,103 @@ class AvaliacaoSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class AtividadeSugeridaSerializer(serializers.ModelSerializer):
+class VariacaoAvaliacaoSerializer(serializers.ModelSerializer):
+    """Avaliação com a anterior do mesmo usuário (ver core.tendencias.variacoes)"""
+
+    variacao = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Avaliacao
+        fields = (
+            "id",
+            "usuario",
+            "pontuacao_total",
+            "nivel_sofrimento",
+            "data_avaliacao",
+            "pontuacao_anterior",
+            "nivel_anterior",
+            "data_anterior",
+            "variacao",
+        )
+        read_only_fields = fields
+
+
+class AtividadeSugeridaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = AtividadeSugerida
         fields = ("id", "nivel_sofrimento", "descricao")
         read_only_fields = ("id",)
 
 
-class HistoricoAcessoSerializer(serializers.ModelSerializer):
+class HistoricoAcessoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = HistoricoAcesso
         fields = ("id", "usuario", "data_acesso", "ip")
         read_only_fields = ("id", "data_acesso")
+
+
+class ResumoAcessoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ResumoAcesso
+        fields = (
+            "id",
+            "usuario",
+            "ip",
+            "periodo",
+            "total",
+            "primeiro_acesso",
+            "ultimo_acesso",
+        )
+        read_only_fields = fields
+
+
+class TarefaExportacaoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    modo = serializers.ChoiceField(
+        choices=("avaliacoes", "matriz"), write_only=True, required=False
+    )
+    cursor = serializers.CharField(
+        write_only=True, required=False, allow_blank=True, max_length=100
+    )
+    progresso = serializers.SerializerMethodField()
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TarefaExportacao
+        fields = (
+            "id",
+            "formato",
+            "modo",
+            "cursor",
+            "parametros",
+            "situacao",
+            "total",
+            "processadas",
+            "progresso",
+            "tamanho",
+            "cursor_seguinte",
+            "erro",
+            "criado_em",
+            "iniciado_em",
+            "concluido_em",
+            "download",
+        )
+        read_only_fields = tuple(
+            campo for campo in fields if campo not in ("formato", "modo", "cursor")
+        )
+
+    def get_progresso(self, obj):
+        """Percentual de avaliações já gravadas no arquivo"""
+        if obj.situacao == "concluida":
+            return 100.0
+        if not obj.total:
+            return 0.0
+        return round(100 * obj.processadas / obj.total, 1)
+
+    def get_download(self, obj):
+        if obj.situacao != "concluida":
+            return None
+        return reverse(
+            "tarefaexportacao-download",
+            args=[obj.id],
+            request=self.context.get("request"),
+        )
@@ -0,0 +1,216 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import estatisticas, fila, tendencias
+from .models import Pergunta, Resposta, Avaliacao
+from .questionario import obter_questionario, invalidar_questionario
+
+
+class SubmissaoInvalida(Exception):
+    """Erro de validação de uma submissão do SRQ-20."""
+
+
+def normalizar_id(valor):
+    """Converte um ID recebido na requisição para inteiro, ou None se inválido"""
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def carregar_ids_perguntas(ids):
+    """Retorna o conjunto dos IDs de pergunta existentes, com uma única consulta"""
+    return set(Pergunta.objects.filter(id__in=ids).values_list("id", flat=True))
+
+
+def validar_formato_respostas(respostas_data):
+    """Lança SubmissaoInvalida se `respostas_data` não for uma lista de objetos"""
+    if not isinstance(respostas_data, list) or not all(
+        isinstance(resposta_data, dict) for resposta_data in respostas_data
+    ):
+        raise SubmissaoInvalida("O campo respostas deve ser uma lista de objetos")
+
+
+def validar_respostas(respostas_data, ids_perguntas):
+    """Converte as respostas recebidas em pares (pergunta_id, resposta)
+
+    Lança SubmissaoInvalida na primeira pergunta que não existe em ids_perguntas
+    ou cuja resposta não é um booleano.
+    """
+    respostas = []
+    for resposta_data in respostas_data:
+        pergunta_id = normalizar_id(resposta_data.get("pergunta"))
+        if pergunta_id not in ids_perguntas:
+            raise SubmissaoInvalida(
+                f"Pergunta com ID {resposta_data.get('pergunta')} não existe"
+            )
+        resposta = resposta_data.get("resposta")
+        if not isinstance(resposta, bool):
+            raise SubmissaoInvalida(
+                f"A resposta da pergunta {pergunta_id} deve ser true ou false"
+            )
+        respostas.append((pergunta_id, resposta))
+    return respostas
+
+
+def calcular_pontuacao(respostas):
+    return sum(1 for _, resposta in respostas if resposta is True)
+
+
+def ordens_perguntas(ids):
+    """Mapa {pergunta_id: ordem} do questionário em cache, cobrindo todos os `ids`"""
+    ordens = obter_questionario().ordens
+    if not ordens.keys() >= set(ids):
+        # O cache deste processo pode estar desatualizado; remonta uma vez
+        invalidar_questionario()
+        ordens = obter_questionario().ordens
+    return ordens
+
+
+def montar_submissao(usuario_id, respostas, data):
+    """Cria (sem gravar) a avaliação e as respostas de uma submissão validada"""
+    pontuacao_total = calcular_pontuacao(respostas)
+    ordens = ordens_perguntas(pergunta_id for pergunta_id, _ in respostas)
+    avaliacao = Avaliacao(
+        usuario_id=usuario_id,
+        pontuacao_total=pontuacao_total,
+        nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(pontuacao_total),
+        data_avaliacao=data,
+        respostas_bitmask=Avaliacao.codificar_respostas(
+            {ordens[pergunta_id]: resposta for pergunta_id, resposta in respostas}
+        ),
+    )
+    if not settings.SRQ20_GRAVAR_RESPOSTAS_INDIVIDUAIS:
+        return avaliacao, []
+    objetos_resposta = [
+        Resposta(
+            usuario_id=usuario_id,
+            avaliacao=avaliacao,
+            pergunta_id=pergunta_id,
+            resposta=resposta,
+            data_resposta=data,
+        )
+        for pergunta_id, resposta in respostas
+    ]
+    return avaliacao, objetos_resposta
+
+
+def gravar_submissoes(submissoes):
+    """Grava em lote uma lista de pares (avaliacao, respostas) de montar_submissao
+
+    Todas as avaliações e respostas são inseridas na mesma transação.
+    As respostas precisam dos IDs das avaliações; em bancos que não os retornam
+    na inserção em lote, as avaliações são gravadas uma a uma.
+    """
+    avaliacoes = [avaliacao for avaliacao, _ in submissoes]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            fora_de_ordem = tendencias.preencher_anteriores(avaliacoes)
+            Avaliacao.objects.bulk_create(avaliacoes)
+            estatisticas.acumular_lote(avaliacoes)
+            for usuario_id, desde in fora_de_ordem.items():
+                tendencias.encadear(usuario_id, desde)
+        else:
+            # save() dispara os sinais que atualizam as estatísticas
+            for avaliacao in avaliacoes:
+                avaliacao.save()
+        Resposta.objects.bulk_create(
+            [resposta for _, respostas in submissoes for resposta in respostas]
+        )
+    return avaliacoes
+
+
+def _validar_submissao(respostas_data):
+    validar_formato_respostas(respostas_data)
+    ids = {
+        normalizar_id(resposta_data.get("pergunta")) for resposta_data in respostas_data
+    }
+    return validar_respostas(respostas_data, carregar_ids_perguntas(ids))
+
+
+def registrar_submissao(usuario, respostas_data):
+    """Valida e grava uma submissão completa do SRQ-20 em uma única transação
+
+    Executa uma consulta para validar as perguntas e, na transação, a leitura
+    da avaliação anterior do usuário (ver core.tendencias), a inserção da
+    avaliação, três UPDATEs nas estatísticas (nível, gênero e dia, com uma
+    inserção a mais para cada chave ainda inexistente, ver core.estatisticas) e
+    a inserção das respostas em lote. Nada é gravado se a submissão for
+    inválida ou se alguma das gravações falhar. O acesso é registrado pelo
+    middleware.
+    """
+    respostas = _validar_submissao(respostas_data)
+    agora = timezone.now()
+    avaliacao, objetos_resposta = montar_submissao(usuario.id, respostas, agora)
+    avaliacao.usuario = usuario
+
+    with transaction.atomic():
+        # save() dispara os sinais que atualizam as estatísticas
+        avaliacao.save()
+        Resposta.objects.bulk_create(objetos_resposta)
+
+    return avaliacao
+
+
+def enfileirar_submissao(usuario, respostas_data):
+    """Valida e calcula a avaliação em memória, adiando a gravação para a fila
+
+    Retorna a avaliação ainda não gravada (sem ID). A persistência é feita pelo
+    comando processar_fila_srq20.
+    """
+    respostas = _validar_submissao(respostas_data)
+    agora = timezone.now()
+    avaliacao, _ = montar_submissao(usuario.id, respostas, agora)
+    fila.enfileirar(
+        {
+            "usuario": usuario.id,
+            "respostas": respostas,
+            "data": agora.isoformat(),
+        }
+    )
+    return avaliacao
+
+
+def _montar_entrada(payload):
+    return montar_submissao(
+        payload["usuario"],
+        [tuple(resposta) for resposta in payload["respostas"]],
+        parse_datetime(payload["data"]),
+    )
+
+
+def drenar_fila(tamanho_lote):
+    """Persiste um lote de submissões da fila; retorna (gravadas, com_erro)
+
+    O lote é gravado em uma única transação e só então removido da fila, de
+    modo que uma falha no meio do processo não perde submissões. Se o lote
+    falhar, as entradas são gravadas uma a uma e as inválidas ficam marcadas
+    com erro no diário, qualquer que seja a exceção, para não bloquearem as
+    seguintes.
+    """
+    entradas = fila.proximas(tamanho_lote)
+    if not entradas:
+        return 0, 0
+
+    try:
+        gravar_submissoes([_montar_entrada(payload) for _, payload in entradas])
+    except Exception:
+        gravadas = []
+        com_erro = 0
+        for id_entrada, payload in entradas:
+            try:
+                gravar_submissoes([_montar_entrada(payload)])
+            except Exception as e:
+                fila.marcar_erro(id_entrada, f"{type(e).__name__}: {e}")
+                com_erro += 1
+            else:
+                gravadas.append(id_entrada)
+        fila.remover(gravadas)
+        return len(gravadas), com_erro
+
+    fila.remover([id_entrada for id_entrada, _ in entradas])
+    return len(entradas), 0
@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import estatisticas, tendencias
+from .atividades import invalidar_atividades
+from .models import Pergunta, Avaliacao, AtividadeSugerida, Usuario
+from .questionario import invalidar_questionario
+
+
+@receiver([post_save, post_delete], sender=Pergunta)
+def invalidar_cache_questionario(sender, **kwargs):
+    invalidar_questionario()
+    # Invalida de novo após o commit, caso o cache tenha sido remontado
+    # com os dados antigos enquanto a transação estava aberta
+    transaction.on_commit(invalidar_questionario)
+
+
+@receiver([post_save, post_delete], sender=AtividadeSugerida)
+def invalidar_cache_atividades(sender, **kwargs):
+    invalidar_atividades()
+    transaction.on_commit(invalidar_atividades)
+
+
+@receiver(pre_save, sender=Avaliacao)
+def guardar_avaliacao_anterior(sender, instance, raw=False, **kwargs):
+    # Numa alteração, as estatísticas precisam descontar os valores antigos
+    instance._avaliacao_anterior = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._avaliacao_anterior = (
+            Avaliacao.objects.filter(pk=instance.pk)
+            .only("usuario_id", "pontuacao_total", "nivel_sofrimento", "data_avaliacao")
+            .first()
+        )
+
+
+@receiver(pre_save, sender=Avaliacao)
+def preencher_avaliacao_anterior(sender, instance, raw=False, **kwargs):
+    # Uma avaliação nova recebe a anterior do mesmo usuário já na inserção
+    instance._reencadear = {}
+    if not raw and instance._state.adding:
+        instance._reencadear = tendencias.preencher_anteriores([instance])
+
+
+@receiver(post_save, sender=Avaliacao)
+def encadear_avaliacoes(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        # Inserida antes de avaliações já gravadas: as seguintes mudam de anterior
+        for usuario_id, desde in instance._reencadear.items():
+            tendencias.encadear(usuario_id, desde)
+        return
+
+    anterior = getattr(instance, "_avaliacao_anterior", None)
+    if anterior is None:
+        return
+    if anterior.usuario_id == instance.usuario_id and all(
+        getattr(anterior, campo) == getattr(instance, campo)
+        for campo in tendencias.CAMPOS_ANTERIOR.values()
+    ):
+        return
+    alteradas = tendencias.encadear(
+        anterior.usuario_id, min(anterior.data_avaliacao, instance.data_avaliacao)
+    )
+    if instance.usuario_id != anterior.usuario_id:
+        alteradas += tendencias.encadear(instance.usuario_id, instance.data_avaliacao)
+    for alterada in alteradas:
+        if alterada.pk == instance.pk:
+            for campo in tendencias.CAMPOS_ANTERIOR:
+                setattr(instance, campo, getattr(alterada, campo))
+
+
+@receiver(post_save, sender=Avaliacao)
+def atualizar_estatisticas_ao_gravar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_avaliacao_anterior", None)
+    if anterior is not None:
+        estatisticas.acumular(
+            [anterior],
+            {anterior.usuario_id: estatisticas.genero_do_usuario(anterior)},
+            sinal=-1,
+        )
+    estatisticas.acumular(
+        [instance], {instance.usuario_id: estatisticas.genero_do_usuario(instance)}
+    )
+
+
+@receiver(post_delete, sender=Avaliacao)
+def atualizar_estatisticas_ao_apagar(sender, instance, **kwargs):
+    estatisticas.acumular(
+        [instance],
+        {instance.usuario_id: estatisticas.genero_do_usuario(instance)},
+        sinal=-1,
+    )
+    # A avaliação seguinte do usuário passa a apontar para a anterior a esta
+    tendencias.encadear(instance.usuario_id, instance.data_avaliacao)
+
+
+@receiver(pre_save, sender=Usuario)
+def guardar_genero_anterior(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._genero_anterior = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and "genero" not in update_fields:
+        return
+    instance._genero_anterior = (
+        Usuario.objects.filter(pk=instance.pk).values_list("genero", flat=True).first()
+        or ""
+    )
+
+
+@receiver(post_save, sender=Usuario)
+def mover_estatisticas_de_genero(sender, instance, raw=False, **kwargs):
+    # As estatísticas por gênero usam o gênero atual do usuário; Usuario.save
+    # envolve a gravação e esta atualização na mesma transação
+    anterior = getattr(instance, "_genero_anterior", None)
+    if raw or anterior is None or anterior == (instance.genero or ""):
+        return
+    estatisticas.mover_genero(instance.pk, anterior, instance.genero)
@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .exportacao import TAMANHO_LOTE, avaliacoes_desde, gerar, linhas_exportacao
+from .models import Avaliacao, TarefaExportacao
+
+logger = logging.getLogger(__name__)
+
+CONFIGURACAO_PADRAO = {
+    "JANELA_REUSO": 600,
+    "EXECUTAR_EM_THREAD": True,
+    "TEMPO_LIMITE": 3600,
+}
+
+# Extensão e tipo do arquivo gravado, e se ele é comprimido com gzip (Parquet
+# já é comprimido internamente)
+ARQUIVOS = {
+    "csv": (".csv.gz", "application/gzip", True),
+    "ndjson": (".ndjson.gz", "application/gzip", True),
+    "arrow": (".arrows.gz", "application/gzip", True),
+    "parquet": (".parquet", "application/vnd.apache.parquet", False),
+}
+
+
+def _configuracao():
+    return {**CONFIGURACAO_PADRAO, **getattr(settings, "SRQ20_EXPORTACAO", {})}
+
+
+def chave_exportacao(formato, parametros):
+    conteudo = json.dumps(
+        {"formato": formato, "parametros": parametros}, sort_keys=True
+    )
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def marcar_abandonadas():
+    """Marca com erro as tarefas em execução há mais de TEMPO_LIMITE segundos
+
+    O processo que as executava terminou sem concluí-las (ex.: reinício do
+    servidor com a thread em andamento). Retorna quantas foram marcadas.
+    """
+    limite = timezone.now() - timedelta(seconds=_configuracao()["TEMPO_LIMITE"])
+    return TarefaExportacao.objects.filter(
+        situacao="executando", iniciado_em__lt=limite
+    ).update(
+        situacao="erro",
+        erro="A exportação foi interrompida antes de terminar.",
+        concluido_em=timezone.now(),
+    )
+
+
+def criar_tarefa(solicitante, formato, parametros):
+    """Cria uma tarefa de exportação, ou reaproveita uma idêntica e recente
+
+    Uma tarefa com o mesmo formato e parâmetros criada há menos de JANELA_REUSO
+    segundos, e que não falhou nem foi abandonada, é devolvida no lugar de uma
+    nova. Retorna (tarefa, criada).
+    """
+    marcar_abandonadas()
+    chave = chave_exportacao(formato, parametros)
+    limite = timezone.now() - timedelta(seconds=_configuracao()["JANELA_REUSO"])
+    existente = (
+        TarefaExportacao.objects.filter(chave=chave, criado_em__gte=limite)
+        .exclude(situacao="erro")
+        .order_by("-criado_em")
+        .first()
+    )
+    if existente is not None:
+        return existente, False
+
+    tarefa = TarefaExportacao.objects.create(
+        solicitante=solicitante, formato=formato, parametros=parametros, chave=chave
+    )
+    if _configuracao()["EXECUTAR_EM_THREAD"]:
+        transaction.on_commit(lambda: iniciar_em_thread(tarefa.id))
+    return tarefa, True
+
+
+def iniciar_em_thread(tarefa_id):
+    threading.Thread(
+        target=_executar_em_thread,
+        args=(tarefa_id,),
+        name=f"exportacao-{tarefa_id}",
+        daemon=True,
+    ).start()
+
+
+def _executar_em_thread(tarefa_id):
+    try:
+        tarefa = TarefaExportacao.objects.filter(id=tarefa_id).first()
+        if tarefa is not None:
+            executar(tarefa)
+    finally:
+        connection.close()
+
+
+def _com_progresso(tarefa_id, linhas):
+    processadas = 0
+    for linha in linhas:
+        yield linha
+        processadas += 1
+        if processadas % TAMANHO_LOTE == 0:
+            TarefaExportacao.objects.filter(id=tarefa_id).update(
+                processadas=processadas
+            )
+
+
+def executar(tarefa):
+    """Gera o arquivo de uma tarefa pendente em MEDIA_ROOT/exportacoes/
+
+    Retorna False se a tarefa já foi assumida por outro processo. O arquivo é
+    gravado com um nome temporário e renomeado ao final, de modo que um download
+    nunca vê um arquivo incompleto.
+    """
+    assumida = TarefaExportacao.objects.filter(
+        id=tarefa.id, situacao="pendente"
+    ).update(situacao="executando", iniciado_em=timezone.now())
+    if not assumida:
+        return False
+
+    extensao, _, comprimir = ARQUIVOS[tarefa.formato]
+    nome = f"exportacoes/{uuid.uuid4().hex}{extensao}"
+    caminho = os.path.join(settings.MEDIA_ROOT, nome)
+    temporario = caminho + ".parcial"
+    try:
+        avaliacoes = Avaliacao.objects.all()
+        cursor_seguinte = ""
+        if "cursor" in tarefa.parametros:
+            avaliacoes, cursor_seguinte = avaliacoes_desde(
+                tarefa.parametros["cursor"], avaliacoes
+            )
+        total = avaliacoes.count()
+        TarefaExportacao.objects.filter(id=tarefa.id).update(total=total)
+
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        matriz = tarefa.parametros.get("modo") == "matriz"
+        linhas = linhas_exportacao(avaliacoes, matriz)
+        conteudo = gerar(tarefa.formato, _com_progresso(tarefa.id, linhas), matriz)
+        with open(temporario, "wb") as bruto:
+            destino = gzip.GzipFile(fileobj=bruto, mode="wb") if comprimir else bruto
+            with destino:
+                for parte in conteudo:
+                    destino.write(parte.encode() if isinstance(parte, str) else parte)
+        os.replace(temporario, caminho)
+    except Exception as e:
+        logger.exception("Falha na exportação %s", tarefa.id)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        TarefaExportacao.objects.filter(id=tarefa.id).update(
+            situacao="erro", erro=str(e), concluido_em=timezone.now()
+        )
+        return True
+
+    TarefaExportacao.objects.filter(id=tarefa.id).update(
+        situacao="concluida",
+        arquivo=nome,
+        tamanho=os.path.getsize(caminho),
+        processadas=total,
+        cursor_seguinte=cursor_seguinte,
+        concluido_em=timezone.now(),
+    )
+    return True
+
+
+def executar_pendentes():
+    """Executa as tarefas pendentes, das mais antigas para as mais novas
+
+    Antes, marca com erro as tarefas abandonadas (ver marcar_abandonadas).
+    """
+    marcar_abandonadas()
+    executadas = 0
+    for tarefa in TarefaExportacao.objects.filter(situacao="pendente").order_by(
+        "criado_em"
+    ):
+        if executar(tarefa):
+            executadas += 1
+    return executadas
+
+
+def arquivo_download(tarefa):
+    """Retorna (content_type, nome do arquivo) para o download de uma tarefa"""
+    extensao, content_type, _ = ARQUIVOS[tarefa.formato]
+    nome = (
+        "matriz_respostas"
+        if tarefa.parametros.get("modo") == "matriz"
+        else "avaliacoes"
+    )
+    return content_type, f"{nome}-{tarefa.id}{extensao}"
@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Avaliacao, TransicaoNivel, Usuario
+
+# Campos copiados da avaliação anterior do mesmo usuário para cada avaliação
+CAMPOS_ANTERIOR = {
+    "pontuacao_anterior": "pontuacao_total",
+    "nivel_anterior": "nivel_sofrimento",
+    "data_anterior": "data_avaliacao",
+}
+
+
+def _valores_anteriores(anterior):
+    """{campo_anterior: valor} copiados de `anterior` (um dicionário ou None)"""
+    return {
+        campo: anterior[origem] if anterior else None
+        for campo, origem in CAMPOS_ANTERIOR.items()
+    }
+
+
+def preencher_anteriores(avaliacoes):
+    """Preenche os campos *_anterior de avaliações ainda não gravadas
+
+    Com uma consulta, lê a avaliação mais recente de cada usuário do lote e
+    encadeia as do lote em ordem de data. Retorna {usuario_id: data} dos
+    usuários com avaliações do lote anteriores a uma já gravada, cujas
+    seguintes precisam ser encadeadas de novo depois da gravação (ver
+    encadear).
+    """
+    por_usuario = {}
+    for avaliacao in avaliacoes:
+        por_usuario.setdefault(avaliacao.usuario_id, []).append(avaliacao)
+
+    ultimas = {
+        ultima["usuario_id"]: ultima
+        for ultima in Avaliacao.objects.filter(
+            id__in=Usuario.objects.filter(id__in=por_usuario).values(
+                ultima=Subquery(
+                    Avaliacao.objects.filter(usuario_id=OuterRef("id"))
+                    .order_by("-data_avaliacao", "-id")
+                    .values("id")[:1]
+                )
+            )
+        ).values("usuario_id", *CAMPOS_ANTERIOR.values())
+    }
+
+    fora_de_ordem = {}
+    for usuario_id, itens in por_usuario.items():
+        # Ordenação estável: avaliações da mesma data ficam na ordem de inserção,
+        # que é também a ordem dos IDs
+        itens.sort(key=lambda avaliacao: avaliacao.data_avaliacao)
+        anterior = ultimas.get(usuario_id)
+        if anterior and anterior["data_avaliacao"] > itens[0].data_avaliacao:
+            fora_de_ordem[usuario_id] = itens[0].data_avaliacao
+        for avaliacao in itens:
+            for campo, valor in _valores_anteriores(anterior).items():
+                setattr(avaliacao, campo, valor)
+            anterior = {
+                origem: getattr(avaliacao, origem)
+                for origem in CAMPOS_ANTERIOR.values()
+            }
+    return fora_de_ordem
+
+
+def encadear(usuario_id, desde=None):
+    """Recalcula os campos *_anterior das avaliações do usuário desde `desde`
+
+    Lê a última avaliação antes de `desde` e as seguintes, em ordem, e grava
+    apenas as que mudaram. Sem `desde`, refaz o histórico inteiro do usuário.
+    Retorna as avaliações alteradas.
+    """
+    avaliacoes = Avaliacao.objects.filter(usuario_id=usuario_id).order_by(
+        "data_avaliacao", "id"
+    )
+    anterior = None
+    if desde is not None:
+        anterior = (
+            avaliacoes.filter(data_avaliacao__lt=desde)
+            .order_by("-data_avaliacao", "-id")
+            .values(*CAMPOS_ANTERIOR.values())
+            .first()
+        )
+        avaliacoes = avaliacoes.filter(data_avaliacao__gte=desde)
+
+    alteradas = []
+    for avaliacao in avaliacoes.only("id", *CAMPOS_ANTERIOR.values(), *CAMPOS_ANTERIOR):
+        valores = _valores_anteriores(anterior)
+        if any(getattr(avaliacao, campo) != valor for campo, valor in valores.items()):
+            for campo, valor in valores.items():
+                setattr(avaliacao, campo, valor)
+            alteradas.append(avaliacao)
+        anterior = {
+            origem: getattr(avaliacao, origem) for origem in CAMPOS_ANTERIOR.values()
+        }
+    Avaliacao.objects.bulk_update(alteradas, list(CAMPOS_ANTERIOR), batch_size=500)
+    return alteradas
+
+
+def variacoes(usuario=None, de_nivel=None, para_nivel=None, variacao_minima=None):
+    """Pares de avaliações consecutivas, das mais recentes para as mais antigas
+
+    Cada avaliação guarda a anterior do mesmo usuário (ver encadear), de modo
+    que os pares são lidos pelos índices de data, sem comparar o histórico
+    inteiro a cada página. `variacao_minima` mantém só os pares em que a
+    pontuação subiu pelo menos esse valor (1 para "quem piorou").
+    """
+    pares = Avaliacao.objects.filter(pontuacao_anterior__isnull=False)
+    if usuario is not None:
+        pares = pares.filter(usuario=usuario)
+    if de_nivel:
+        pares = pares.filter(nivel_anterior=de_nivel)
+    if para_nivel:
+        pares = pares.filter(nivel_sofrimento=para_nivel)
+    pares = pares.annotate(variacao=F("pontuacao_total") - F("pontuacao_anterior"))
+    if variacao_minima is not None:
+        pares = pares.filter(variacao__gte=variacao_minima)
+    return pares.order_by("-data_avaliacao", "-id")
+
+
+def recalcular_transicoes():
+    """Refaz a tabela TransicaoNivel com uma única consulta agrupada no banco"""
+    linhas = (
+        Avaliacao.objects.filter(nivel_anterior__isnull=False)
+        .values_list("nivel_anterior", "nivel_sofrimento")
+        .annotate(
+            total=Count("id"),
+            soma_variacao=Sum(F("pontuacao_total") - F("pontuacao_anterior")),
+        )
+        .order_by()
+    )
+
+    agora = timezone.now()
+    with transaction.atomic():
+        TransicaoNivel.objects.all().delete()
+        criadas = TransicaoNivel.objects.bulk_create(
+            TransicaoNivel(
+                nivel_origem=origem,
+                nivel_destino=destino,
+                total=total,
+                soma_variacao=soma_variacao,
+                atualizado_em=agora,
+            )
+            for origem, destino, total, soma_variacao in linhas
+        )
+    return len(criadas)
+
+
+def matriz_transicoes():
+    """Matriz níveis × níveis com as transições pré-calculadas"""
+    niveis = [nivel for nivel, _ in Avaliacao.NIVEIS_SOFRIMENTO]
+    indices = {nivel: i for i, nivel in enumerate(niveis)}
+    matriz = [[0] * len(niveis) for _ in niveis]
+    transicoes = []
+    atualizado_em = None
+
+    for transicao in TransicaoNivel.objects.all():
+        origem = indices.get(transicao.nivel_origem)
+        destino = indices.get(transicao.nivel_destino)
+        if origem is not None and destino is not None:
+            matriz[origem][destino] = transicao.total
+        transicoes.append(
+            {
+                "de": transicao.nivel_origem,
+                "para": transicao.nivel_destino,
+                "total": transicao.total,
+                "variacao_media": (
+                    transicao.soma_variacao / transicao.total
+                    if transicao.total
+                    else None
+                ),
+            }
+        )
+        atualizado_em = transicao.atualizado_em
+
+    return {
+        "niveis": niveis,
+        "matriz": matriz,
+        "transicoes": transicoes,
+        "atualizado_em": atualizado_em,
+    }
@@ -1,3 +1,2119 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import numpy as np
+
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import (
+    acessos,
+    agrupamento,
+    arquivo,
+    atividades,
+    cache_analises,
+    estatisticas,
+    exportacao,
+    fila,
+    ingestao,
+    psicometria,
+    questionario,
+    tarefas,
+    tendencias,
+)
+from .models import (
+    AtividadeSugerida,
+    Avaliacao,
+    EstatisticaAvaliacao,
+    HistoricoAcesso,
+    Pergunta,
+    Resposta,
+    ResumoAcesso,
+    TarefaExportacao,
+    Usuario,
+)
+from .services import (
+    drenar_fila,
+    gravar_submissoes,
+    montar_submissao,
+    registrar_submissao,
+)
+from .serializacao import codificar_json, obter_leitura
+from .serializers import (
+    AvaliacaoSerializer,
+    HistoricoAcessoSerializer,
+    RespostaSerializer,
+    ResumoAcessoSerializer,
+    TarefaExportacaoSerializer,
+    VariacaoAvaliacaoSerializer,
+)
+
+# Tabelas de tamanho fixo e pequeno, que podem ser lidas por inteiro
+TABELAS_PEQUENAS = {"core_pergunta", "core_atividadesugerida"}
+
+# Linha do EXPLAIN QUERY PLAN do SQLite que percorre uma tabela inteira, com ou
+# sem índice (SCAN ... USING INDEX lê a tabela toda na ordem do índice)
+VARREDURA = re.compile(r"^SCAN (\w+)( USING (COVERING )?INDEX \w+)?$")
+
+
+def dados_de_exemplo():
+    """Cria usuários, perguntas, avaliações, respostas e acessos para os testes"""
+    agora = timezone.now()
+    perguntas = Pergunta.objects.bulk_create(
+        Pergunta(texto=f"Pergunta {ordem}", ordem=ordem) for ordem in range(1, 21)
+    )
+    usuarios = [
+        Usuario.objects.create_user(
+            username=f"usuario{i}", email=f"usuario{i}@exemplo.com", password="x"
+        )
+        for i in range(3)
+    ]
+    admin = Usuario.objects.create_user(
+        username="admin", email="admin@exemplo.com", password="x", is_staff=True
+    )
+    for i, usuario in enumerate(usuarios):
+        for dia in range(5):
+            pontuacao = (i * 5 + dia) % 21
+            data = agora - timedelta(days=dia, minutes=i)
+            avaliacao = Avaliacao.objects.create(
+                usuario=usuario,
+                pontuacao_total=pontuacao,
+                nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(pontuacao),
+                data_avaliacao=data,
+            )
+            Resposta.objects.bulk_create(
+                Resposta(
+                    usuario=usuario,
+                    pergunta=pergunta,
+                    avaliacao=avaliacao,
+                    resposta=pergunta.ordem <= pontuacao,
+                    data_resposta=data,
+                )
+                for pergunta in perguntas
+            )
+            HistoricoAcesso.objects.create(
+                usuario=usuario, ip="10.0.0.1", data_acesso=data
+            )
+            ResumoAcesso.objects.create(
+                usuario=usuario,
+                ip="10.0.0.1",
+                periodo=ResumoAcesso.inicio_periodo(data),
+                total=1,
+                primeiro_acesso=agora,
+                ultimo_acesso=agora,
+            )
+    return usuarios, admin, perguntas
+
+
+@skipUnless(connection.vendor == "sqlite", "Usa o EXPLAIN QUERY PLAN do SQLite")
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class PlanoDeConsultaTests(TestCase):
+    """Falha se a consulta principal de um endpoint varrer uma tabela inteira"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def planos(self, url, usuario):
+        """Requisita `url` e retorna o plano de cada SELECT executado"""
+        client = APIClient()
+        client.force_authenticate(usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(url)
+            if response.streaming:
+                # As consultas de uma exportação rodam enquanto ela é transmitida
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                if not consulta["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + consulta["sql"])
+                planos.append((consulta["sql"], [linha[3] for linha in cursor]))
+        return response, planos
+
+    def assertSemVarreduraCompleta(
+        self, url, usuario=None, ordenada=False, varreduras=()
+    ):
+        """Falha se algum SELECT de `url` varrer uma tabela grande
+
+        Com `ordenada`, a listagem sem filtros pode percorrer um índice de data,
+        já que lê só a primeira página nessa ordem; uma varredura sem índice
+        continua proibida. `varreduras` lista as tabelas que o endpoint precisa
+        ler por inteiro; justifique cada uma onde o teste a usa.
+        """
+        response, planos = self.planos(url, usuario or self.admin)
+        # SCAN também aparece para subconsultas (ex.: "qualify", usada pelo
+        # Django para filtrar o resultado de uma janela), que não são tabelas
+        tabelas = set(connection.introspection.table_names())
+        for sql, detalhes in planos:
+            for detalhe in detalhes:
+                varredura = VARREDURA.match(detalhe)
+                if (
+                    varredura
+                    and varredura.group(1) in tabelas
+                    and varredura.group(1) not in TABELAS_PEQUENAS
+                    and varredura.group(1) not in varreduras
+                    and not (ordenada and varredura.group(2))
+                ):
+                    self.fail(f"{url}: varredura completa ({detalhe})\n{sql}")
+        return response
+
+    def proxima_pagina(self, response):
+        partes = urlsplit(response.json()["next"])
+        return f"{partes.path}?{partes.query}"
+
+    def test_avaliacoes(self):
+        usuario = self.usuarios[0]
+        avaliacao = usuario.avaliacoes.first()
+        data = avaliacao.data_avaliacao.isoformat().replace("+", "%2B")
+        self.assertSemVarreduraCompleta("/api/avaliacoes/", ordenada=True)
+        for url in (
+            f"/api/avaliacoes/?usuario={usuario.id}",
+            "/api/avaliacoes/?nivel_sofrimento=Leve",
+            f"/api/avaliacoes/?data_avaliacao={data}",
+            f"/api/avaliacoes/{avaliacao.id}/",
+            f"/api/avaliacoes/{avaliacao.id}/respostas/",
+        ):
+            with self.subTest(url=url):
+                self.assertSemVarreduraCompleta(url)
+
+        self.assertSemVarreduraCompleta("/api/avaliacoes/", usuario)
+
+    def test_avaliacoes_pagina_seguinte(self):
+        response = self.assertSemVarreduraCompleta(
+            "/api/avaliacoes/?page_size=2", ordenada=True
+        )
+        self.assertSemVarreduraCompleta(self.proxima_pagina(response))
+
+    def test_respostas(self):
+        usuario = self.usuarios[1]
+        pergunta = self.perguntas[3]
+        avaliacao = usuario.avaliacoes.first()
+        self.assertSemVarreduraCompleta("/api/respostas/", ordenada=True)
+        for url in (
+            f"/api/respostas/?usuario={usuario.id}",
+            f"/api/respostas/?usuario={usuario.id}&pergunta={pergunta.id}",
+            f"/api/respostas/?pergunta={pergunta.id}",
+            f"/api/respostas/?avaliacao={avaliacao.id}",
+        ):
+            with self.subTest(url=url):
+                self.assertSemVarreduraCompleta(url)
+
+        self.assertSemVarreduraCompleta("/api/respostas/", usuario)
+
+    def test_respostas_pagina_seguinte(self):
+        response = self.assertSemVarreduraCompleta(
+            "/api/respostas/?page_size=30", ordenada=True
+        )
+        self.assertSemVarreduraCompleta(self.proxima_pagina(response))
+
+    def test_historico_acessos(self):
+        usuario = self.usuarios[2]
+        for url in ("/api/historico-acessos/", "/api/historico-acessos/?visao=resumo"):
+            self.assertSemVarreduraCompleta(url, ordenada=True)
+        for url in (
+            f"/api/historico-acessos/?usuario={usuario.id}",
+            f"/api/historico-acessos/?visao=resumo&usuario={usuario.id}",
+        ):
+            with self.subTest(url=url):
+                self.assertSemVarreduraCompleta(url)
+
+    def test_historico_acessos_pagina_seguinte(self):
+        response = self.assertSemVarreduraCompleta(
+            "/api/historico-acessos/?page_size=2", ordenada=True
+        )
+        self.assertSemVarreduraCompleta(self.proxima_pagina(response))
+
+    def test_estatisticas(self):
+        cache_analises.obter_cache().limpar()
+        self.addCleanup(cache_analises.obter_cache().limpar)
+        hoje = timezone.localdate()
+        for url in (
+            "/api/avaliacoes/estatisticas/",
+            f"/api/avaliacoes/estatisticas/?inicio={hoje - timedelta(days=1)}",
+            f"/api/avaliacoes/estatisticas/?inicio={hoje - timedelta(days=3)}"
+            f"&fim={hoje}&granularidade=semana",
+        ):
+            with self.subTest(url=url):
+                self.assertSemVarreduraCompleta(url)
+
+    def test_tendencias(self):
+        # Cada avaliação guarda a anterior: os pares são lidos pelo índice de data
+        response = self.assertSemVarreduraCompleta(
+            "/api/avaliacoes/tendencias/?page_size=2&variacao_minima=-1",
+            ordenada=True,
+        )
+        self.assertSemVarreduraCompleta(self.proxima_pagina(response))
+        self.assertSemVarreduraCompleta("/api/avaliacoes/tendencias/", ordenada=True)
+        for url in (
+            f"/api/avaliacoes/tendencias/?usuario={self.usuarios[0].id}",
+            "/api/avaliacoes/tendencias/?para_nivel=Leve",
+        ):
+            with self.subTest(url=url):
+                self.assertSemVarreduraCompleta(url)
+
+    def test_exportacao_incremental(self):
+        ultima = Avaliacao.objects.order_by("-id")[3]
+        cursor = exportacao.criar_cursor(ultima.id)
+        for formato in ("json", "csv"):
+            with self.subTest(formato=formato):
+                self.assertSemVarreduraCompleta(
+                    f"/api/avaliacoes/export/?formato={formato}&cursor={cursor}"
+                )
+
+    def test_exportacoes(self):
+        tarefas = TarefaExportacao.objects.bulk_create(
+            TarefaExportacao(solicitante=self.admin, formato="csv", chave=str(n))
+            for n in range(5)
+        )
+        self.assertSemVarreduraCompleta("/api/exportacoes/", ordenada=True)
+        self.assertSemVarreduraCompleta(f"/api/exportacoes/{tarefas[0].id}/")
+
+
+def acrescentar_linhas(quantidade, avaliacao, perguntas):
+    """Acrescenta `quantidade` linhas a cada tabela listada pela API e pelo admin
+
+    As respostas novas pertencem todas a `avaliacao`, de modo que as páginas
+    que listam os objetos relacionados a ela também crescem.
+    """
+    inicio = Usuario.objects.count()
+    agora = timezone.now()
+    usuarios = Usuario.objects.bulk_create(
+        Usuario(username=f"carga{n}", email=f"carga{n}@exemplo.com")
+        for n in range(inicio, inicio + quantidade)
+    )
+    Avaliacao.objects.bulk_create(
+        Avaliacao(
+            usuario=usuario,
+            pontuacao_total=n % 21,
+            nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(n % 21),
+            data_avaliacao=agora - timedelta(minutes=n),
+        )
+        for n, usuario in enumerate(usuarios)
+    )
+    Resposta.objects.bulk_create(
+        Resposta(
+            usuario=avaliacao.usuario,
+            pergunta=perguntas[n % len(perguntas)],
+            avaliacao=avaliacao,
+            resposta=n % 2 == 0,
+            data_resposta=agora - timedelta(minutes=n),
+        )
+        for n in range(quantidade)
+    )
+    HistoricoAcesso.objects.bulk_create(
+        HistoricoAcesso(usuario=usuario, ip="10.0.0.1", data_acesso=agora)
+        for usuario in usuarios
+    )
+    ResumoAcesso.objects.bulk_create(
+        ResumoAcesso(
+            usuario=usuario,
+            ip="10.0.0.1",
+            periodo=ResumoAcesso.inicio_periodo(agora),
+            total=1,
+            primeiro_acesso=agora,
+            ultimo_acesso=agora,
+        )
+        for usuario in usuarios
+    )
+    TarefaExportacao.objects.bulk_create(
+        TarefaExportacao(solicitante=usuario, formato="csv", chave=f"carga{n}")
+        for n, usuario in enumerate(usuarios)
+    )
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class OrcamentoDeConsultasTests(TestCase):
+    """Número máximo de consultas de cada listagem, que não pode crescer com os dados
+
+    Cada página é medida com 10 e com 1.000 linhas por tabela: o total de
+    consultas deve ser o mesmo nos dois casos e caber no orçamento. Para incluir
+    uma página nova, acrescente-a a `orcamentos`.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perguntas = Pergunta.objects.bulk_create(
+            Pergunta(texto=f"Pergunta {ordem}", ordem=ordem) for ordem in range(1, 21)
+        )
+        AtividadeSugerida.objects.create(nivel_sofrimento="Leve", descricao="Caminhar")
+        cls.admin = Usuario.objects.create_superuser(
+            username="admin", email="admin@exemplo.com", password="x"
+        )
+        cls.usuario = Usuario.objects.create_user(
+            username="usuario", email="usuario@exemplo.com", password="x"
+        )
+        cls.avaliacao = Avaliacao.objects.create(
+            usuario=cls.usuario, pontuacao_total=3, nivel_sofrimento="Leve"
+        )
+        cls.resposta = Resposta.objects.create(
+            usuario=cls.usuario,
+            pergunta=cls.perguntas[0],
+            avaliacao=cls.avaliacao,
+            resposta=True,
+        )
+        cls.acesso = HistoricoAcesso.objects.create(usuario=cls.usuario)
+
+    def orcamentos(self):
+        """(url, usuário que faz a requisição, máximo de consultas)
+
+        Cada requisição à API inclui as 4 consultas do registro de acesso feito
+        pelo HistoricoAcessoMiddleware no modo "ambos" (savepoint, insert do
+        HistoricoAcesso, update do ResumoAcesso e release).
+        """
+        avaliacao, resposta, acesso = (
+            self.avaliacao.id,
+            self.resposta.id,
+            self.acesso.id,
+        )
+        return [
+            ("/api/avaliacoes/?page_size=100", self.admin, 5),
+            ("/api/avaliacoes/?page_size=100", self.usuario, 5),
+            ("/api/avaliacoes/tendencias/?page_size=100", self.admin, 5),
+            (f"/api/avaliacoes/{avaliacao}/respostas/", self.usuario, 6),
+            ("/api/respostas/?page_size=100", self.admin, 5),
+            ("/api/respostas/?page_size=100", self.usuario, 5),
+            ("/api/historico-acessos/?page_size=100", self.admin, 5),
+            ("/api/historico-acessos/?visao=resumo&page_size=100", self.admin, 5),
+            ("/api/exportacoes/", self.admin, 6),
+            ("/api/usuarios/", self.admin, 6),
+            ("/api/perguntas/", self.usuario, 6),
+            ("/api/atividades-sugeridas/", self.admin, 6),
+            ("/admin/core/avaliacao/", self.admin, 8),
+            (f"/admin/core/avaliacao/{avaliacao}/change/", self.admin, 6),
+            (f"/admin/core/avaliacao/{avaliacao}/delete/", self.admin, 10),
+            ("/admin/core/resposta/", self.admin, 8),
+            # O rótulo do campo avaliacao (raw_id_fields) lê o usuário dela
+            (f"/admin/core/resposta/{resposta}/change/", self.admin, 9),
+            ("/admin/core/historicoacesso/", self.admin, 8),
+            (f"/admin/core/historicoacesso/{acesso}/change/", self.admin, 6),
+            ("/admin/core/resumoacesso/", self.admin, 8),
+            ("/admin/core/tarefaexportacao/", self.admin, 8),
+            ("/admin/core/usuario/", self.admin, 8),
+            ("/admin/core/pergunta/", self.admin, 8),
+            ("/admin/core/atividadesugerida/", self.admin, 8),
+        ]
+
+    def contar_consultas(self, url, usuario):
+        if url.startswith("/admin/"):
+            client = Client()
+            client.force_login(usuario)
+        else:
+            client = APIClient()
+            client.force_authenticate(usuario)
+        # A primeira requisição preenche caches (questionário, sessão)
+        client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_nao_crescem_com_os_dados(self):
+        acrescentar_linhas(10, self.avaliacao, self.perguntas)
+        com_poucas = {
+            (url, usuario.username): self.contar_consultas(url, usuario)
+            for url, usuario, _ in self.orcamentos()
+        }
+
+        acrescentar_linhas(990, self.avaliacao, self.perguntas)
+        for url, usuario, maximo in self.orcamentos():
+            with self.subTest(url=url, usuario=usuario.username):
+                com_muitas = self.contar_consultas(url, usuario)
+                self.assertEqual(com_muitas, com_poucas[url, usuario.username])
+                self.assertLessEqual(com_muitas, maximo)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class LeituraRapidaTests(TestCase):
+    """A listagem pela LeituraRapida gera os mesmos bytes que os serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        # IP nulo e datas com e sem microssegundos
+        HistoricoAcesso.objects.create(usuario=cls.usuarios[0], ip=None)
+        Avaliacao.objects.create(
+            usuario=cls.usuarios[0],
+            pontuacao_total=20,
+            nivel_sofrimento="Grave",
+            data_avaliacao=timezone.now().replace(microsecond=0),
+        )
+
+    def obter(self, url, usuario, **cabecalhos):
+        client = APIClient()
+        client.force_authenticate(usuario)
+        return client.get(url, **cabecalhos)
+
+    def assertMesmaResposta(self, url, usuario=None, **cabecalhos):
+        usuario = usuario or self.admin
+        rapida = self.obter(url, usuario, **cabecalhos)
+        with override_settings(SRQ20_LEITURA_RAPIDA=False):
+            serializer = self.obter(url, usuario, **cabecalhos)
+        self.assertEqual(rapida.status_code, 200, url)
+        self.assertEqual(rapida["Content-Type"], serializer["Content-Type"], url)
+        self.assertEqual(rapida.content, serializer.content, url)
+        return rapida
+
+    def test_mesmos_bytes(self):
+        usuario = self.usuarios[0]
+        for url in (
+            "/api/avaliacoes/",
+            "/api/avaliacoes/?page_size=100",
+            f"/api/avaliacoes/?usuario={usuario.id}",
+            "/api/avaliacoes/?nivel_sofrimento=Grave&format=json",
+            "/api/respostas/?page_size=7",
+            f"/api/respostas/?pergunta={self.perguntas[0].id}",
+            # Os acessos do admin mudam a cada requisição (HistoricoAcessoMiddleware)
+            f"/api/historico-acessos/?usuario={usuario.id}&page_size=2",
+            f"/api/historico-acessos/?visao=resumo&usuario={usuario.id}",
+        ):
+            with self.subTest(url=url):
+                response = self.assertMesmaResposta(url)
+                # Resposta montada pela LeituraRapida, não um Response do DRF
+                self.assertFalse(hasattr(response, "data"))
+                if response.json().get("next"):
+                    self.assertMesmaResposta(response.json()["next"])
+
+        self.assertMesmaResposta("/api/avaliacoes/", usuario)
+        self.assertMesmaResposta("/api/respostas/", usuario)
+
+    def test_serializers_suportados(self):
+        for serializer_class in (
+            AvaliacaoSerializer,
+            RespostaSerializer,
+            HistoricoAcessoSerializer,
+            ResumoAcessoSerializer,
+        ):
+            self.assertIsNotNone(obter_leitura(serializer_class), serializer_class)
+        # Campos anotados e SerializerMethodField seguem pelo serializer
+        self.assertIsNone(obter_leitura(VariacaoAvaliacaoSerializer))
+        self.assertIsNone(obter_leitura(TarefaExportacaoSerializer))
+
+    def test_codificar_json(self):
+        texto = "".join(map(chr, range(0x300))) + "\u2028\u2029çã😀"
+        dados = {"texto": texto, "numeros": [0, -1, 2**40], "outros": [True, None]}
+        self.assertEqual(codificar_json(dados), JSONRenderer().render(dados))
+
+    def test_json_indentado_e_api_navegavel_usam_o_serializer(self):
+        response = self.assertMesmaResposta(
+            "/api/avaliacoes/", HTTP_ACCEPT="application/json; indent=2"
+        )
+        self.assertIn(b"\n", response.content)
+        # A página HTML traz um token CSRF diferente a cada requisição
+        response = self.obter("/api/avaliacoes/?format=api", self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class ProjecaoTests(TestCase):
+    """?fields= e ?exclude= reduzem o JSON e as colunas do SELECT"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        cls.usuario = cls.usuarios[0]
+        TarefaExportacao.objects.create(
+            solicitante=cls.admin, formato="csv", chave="x", situacao="concluida"
+        )
+
+    def obter(self, url, usuario=None):
+        client = APIClient()
+        client.force_authenticate(usuario or self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(url)
+        colunas = [
+            consulta["sql"].split(" FROM ")[0]
+            for consulta in consultas.captured_queries
+            if consulta["sql"].startswith("SELECT")
+        ]
+        return response, colunas
+
+    def test_fields_e_exclude(self):
+        for leitura_rapida in (True, False):
+            with self.subTest(leitura_rapida=leitura_rapida), override_settings(
+                SRQ20_LEITURA_RAPIDA=leitura_rapida
+            ):
+                response, colunas = self.obter(
+                    "/api/avaliacoes/?fields=pontuacao_total,data_avaliacao"
+                )
+                self.assertEqual(response.status_code, 200)
+                for avaliacao in response.json()["results"]:
+                    self.assertEqual(
+                        list(avaliacao), ["pontuacao_total", "data_avaliacao"]
+                    )
+                self.assertEqual(len(colunas), 1)
+                self.assertIn('"pontuacao_total"', colunas[0])
+                self.assertNotIn('"nivel_sofrimento"', colunas[0])
+                self.assertNotIn('"respostas_bitmask"', colunas[0])
+
+                response, colunas = self.obter(
+                    "/api/respostas/?exclude=usuario,data_resposta", self.admin
+                )
+                for resposta in response.json()["results"]:
+                    self.assertEqual(list(resposta), ["id", "pergunta", "resposta"])
+                self.assertNotIn('"usuario_id"', colunas[0])
+
+    def test_mesmos_bytes_nos_dois_caminhos(self):
+        for url in (
+            "/api/avaliacoes/?fields=data_avaliacao,pontuacao_total&page_size=3",
+            f"/api/historico-acessos/?usuario={self.usuarios[1].id}&exclude=ip",
+            f"/api/historico-acessos/?visao=resumo&usuario={self.usuarios[1].id}"
+            "&fields=periodo,total",
+        ):
+            with self.subTest(url=url):
+                rapida, _ = self.obter(url, self.admin)
+                with override_settings(SRQ20_LEITURA_RAPIDA=False):
+                    serializer, _ = self.obter(url, self.admin)
+                self.assertEqual(rapida.content, serializer.content)
+
+    def test_pagina_seguinte_mantem_os_campos(self):
+        response, _ = self.obter("/api/avaliacoes/?fields=pontuacao_total&page_size=2")
+        seguinte, colunas = self.obter(response.json()["next"])
+        self.assertEqual(seguinte.status_code, 200)
+        self.assertEqual(len(seguinte.json()["results"]), 2)
+        for avaliacao in seguinte.json()["results"]:
+            self.assertEqual(list(avaliacao), ["pontuacao_total"])
+        self.assertNotIn('"nivel_sofrimento"', colunas[0])
+
+    def test_detalhe_e_outros_endpoints(self):
+        avaliacao = self.usuario.avaliacoes.first()
+        response, colunas = self.obter(
+            f"/api/avaliacoes/{avaliacao.id}/?fields=id,nivel_sofrimento"
+        )
+        self.assertEqual(
+            response.json(), {"id": avaliacao.id, "nivel_sofrimento": "Nenhum"}
+        )
+        self.assertNotIn('"pontuacao_total"', colunas[0])
+
+        response, _ = self.obter("/api/perguntas/?fields=ordem")
+        self.assertEqual(response.json()["results"][0], {"ordem": 1})
+
+        # Campos calculados: a resposta é projetada, o SELECT não
+        response, _ = self.obter("/api/exportacoes/?fields=id,progresso", self.admin)
+        self.assertEqual(list(response.json()["results"][0]), ["id", "progresso"])
+
+    def test_campos_invalidos(self):
+        for url in (
+            "/api/avaliacoes/?fields=pontuacao_total,senha",
+            "/api/avaliacoes/?exclude=nada",
+            "/api/avaliacoes/?fields=id&exclude=id",
+        ):
+            with self.subTest(url=url):
+                response, _ = self.obter(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class CacheQuestionarioTests(TestCase):
+    """Questionário em memória: 304 por ETag e invalidação depois de gravações"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def setUp(self):
+        questionario.invalidar_questionario()
+        self.addCleanup(questionario.invalidar_questionario)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuarios[0])
+
+    def obter(self, url="/api/srq20/", etag=None):
+        if etag is None:
+            return self.client.get(url)
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_304_com_etag_atual(self):
+        for url in ("/api/srq20/", "/api/perguntas/?categoria=outros"):
+            with self.subTest(url=url):
+                primeira = self.obter(url)
+                self.assertEqual(primeira.status_code, 200)
+                segunda = self.obter(url, primeira["ETag"])
+                self.assertEqual(segunda.status_code, 304)
+                self.assertEqual(segunda["ETag"], primeira["ETag"])
+                self.assertEqual(self.obter(url, '"outra"').status_code, 200)
+
+    def test_gravacao_neste_processo_invalida(self):
+        etag = self.obter()["ETag"]
+        pergunta = self.perguntas[0]
+        pergunta.texto = "Texto alterado"
+        pergunta.save()
+
+        response = self.obter(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()[0]["texto"], "Texto alterado")
+
+    def test_gravacao_em_outro_processo_expira(self):
+        etag = self.obter()["ETag"]
+        # Sem sinais neste processo, como uma gravação feita em outro worker
+        Pergunta.objects.filter(id=self.perguntas[0].id).update(texto="De outro")
+        self.assertEqual(self.obter(etag=etag).status_code, 304)
+
+        with override_settings(SRQ20_CACHE_LOCAL_VALIDADE=0):
+            response = self.obter(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["texto"], "De outro")
+        # Remontado sem mudanças, o ETag continua o mesmo
+        novo = response["ETag"]
+        with override_settings(SRQ20_CACHE_LOCAL_VALIDADE=0):
+            self.assertEqual(self.obter(etag=novo).status_code, 304)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class CacheAtividadesTests(TestCase):
+    """Índice de atividades sugeridas em memória e sua invalidação"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leve = AtividadeSugerida.objects.create(
+            nivel_sofrimento="Leve", descricao="Caminhar"
+        )
+        AtividadeSugerida.objects.create(nivel_sofrimento="Grave", descricao="Ajuda")
+
+    def setUp(self):
+        atividades.invalidar_atividades()
+        self.addCleanup(atividades.invalidar_atividades)
+
+    def descricoes(self, nivel):
+        return [a["descricao"] for a in atividades.atividades_por_nivel(nivel)]
+
+    def test_sem_consultas_depois_de_montado(self):
+        self.assertEqual(self.descricoes("Leve"), ["Caminhar"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.descricoes("Grave"), ["Ajuda"])
+            self.assertEqual(self.descricoes("Moderado"), [])
+
+    def test_gravacao_neste_processo_invalida(self):
+        self.descricoes("Leve")
+        AtividadeSugerida.objects.create(nivel_sofrimento="Leve", descricao="Ler")
+        self.assertEqual(self.descricoes("Leve"), ["Caminhar", "Ler"])
+        self.leve.delete()
+        self.assertEqual(self.descricoes("Leve"), ["Ler"])
+
+    def test_gravacao_em_outro_processo_expira(self):
+        self.descricoes("Leve")
+        AtividadeSugerida.objects.filter(id=self.leve.id).update(descricao="Correr")
+        self.assertEqual(self.descricoes("Leve"), ["Caminhar"])
+        with override_settings(SRQ20_CACHE_LOCAL_VALIDADE=0):
+            self.assertEqual(self.descricoes("Leve"), ["Correr"])
+
+
+def ndjson(*itens):
+    return b"\n".join(
+        item if isinstance(item, bytes) else json.dumps(item).encode() for item in itens
+    )
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class IngestaoTests(TestCase):
+    """Envio em lote: cada linha é aceita ou recusada sem afetar as demais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def item(self, usuario, resposta=True):
+        return {
+            "usuario": usuario.id,
+            "respostas": [
+                {"pergunta": pergunta.id, "resposta": resposta}
+                for pergunta in self.perguntas
+            ],
+        }
+
+    def test_linhas_validas_e_invalidas(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        antes = Avaliacao.objects.count()
+        response = client.post(
+            "/api/srq20/lote/",
+            ndjson(
+                self.item(self.usuarios[0]),
+                self.item(self.usuarios[1], resposta=None),
+                self.item(self.usuarios[1], resposta="sim"),
+                b"{nao e json",
+                {**self.item(self.usuarios[0]), "usuario": 999999},
+                self.item(self.usuarios[2], resposta=False),
+            ),
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.status_code, 200)
+        linhas = [json.loads(linha) for linha in response.streaming_content]
+        self.assertEqual(
+            [linha.get("status") for linha in linhas[:-1]],
+            ["ok", "erro", "erro", "erro", "erro", "ok"],
+        )
+        self.assertEqual(linhas[-1], {"resumo": {"total": 6, "ok": 2, "erro": 4}})
+        self.assertEqual(linhas[0]["pontuacao_total"], 20)
+        self.assertEqual(linhas[5]["pontuacao_total"], 0)
+        self.assertEqual(Avaliacao.objects.count(), antes + 2)
+
+    def test_lote_que_falha_e_gravado_item_a_item(self):
+        gravar = ingestao.gravar_submissoes
+        recusado = self.usuarios[1].id
+
+        def gravar_ou_falhar(submissoes):
+            if any(avaliacao.usuario_id == recusado for avaliacao, _ in submissoes):
+                raise DatabaseError("falha simulada")
+            return gravar(submissoes)
+
+        with mock.patch.object(ingestao, "gravar_submissoes", gravar_ou_falhar):
+            linhas = list(
+                ingestao.ingerir_ndjson(
+                    io.BytesIO(
+                        ndjson(*(self.item(usuario) for usuario in self.usuarios))
+                    )
+                )
+            )
+        self.assertEqual(
+            [linha.get("status") for linha in linhas[:-1]], ["ok", "erro", "ok"]
+        )
+        self.assertIn("falha simulada", linhas[1]["erro"])
+        self.assertTrue(Avaliacao.objects.filter(id=linhas[0]["avaliacao"]).exists())
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class FilaTests(TestCase):
+    """Modo assíncrono: a submissão vai para o diário e é gravada pela drenagem"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            SRQ20_ESCRITA_ASSINCRONA=True,
+            SRQ20_FILA_PATH=Path(diretorio.name) / "fila.sqlite3",
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuarios[0])
+
+    def enviar(self, resposta):
+        return self.client.post(
+            "/api/srq20/",
+            {
+                "respostas": [
+                    {"pergunta": pergunta.id, "resposta": resposta}
+                    for pergunta in self.perguntas
+                ]
+            },
+            format="json",
+        )
+
+    def test_enfileirar_e_drenar(self):
+        response = self.enviar(True)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["avaliacao"]["pontuacao_total"], 20)
+        self.assertEqual(fila.estatisticas()["pendentes"], 1)
+
+        antes = Avaliacao.objects.count()
+        self.assertEqual(drenar_fila(10), (1, 0))
+        self.assertEqual(Avaliacao.objects.count(), antes + 1)
+        self.assertEqual(fila.estatisticas()["pendentes"], 0)
+
+    def test_resposta_invalida_nao_e_enfileirada(self):
+        for resposta in (None, "sim", 1):
+            with self.subTest(resposta=resposta):
+                self.assertEqual(self.enviar(resposta).status_code, 400)
+        self.assertEqual(fila.estatisticas()["pendentes"], 0)
+
+    def test_entrada_invalida_e_marcada_com_erro(self):
+        self.enviar(False)
+        fila.enfileirar({"usuario": self.usuarios[0].id, "respostas": [[1, "sim"]]})
+        self.enviar(True)
+
+        antes = Avaliacao.objects.count()
+        self.assertEqual(drenar_fila(10), (2, 1))
+        self.assertEqual(Avaliacao.objects.count(), antes + 2)
+        estatisticas = fila.estatisticas()
+        self.assertEqual((estatisticas["pendentes"], estatisticas["com_erro"]), (0, 1))
+        self.assertEqual(drenar_fila(10), (0, 0))
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class TendenciasTests(TestCase):
+    """Variações entre avaliações consecutivas, paginadas por cursor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def obter(self, url):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.json()
+
+    def pares(self, pagina):
+        return [(par["id"], par["pontuacao_anterior"]) for par in pagina["results"]]
+
+    def test_avancar_e_voltar(self):
+        todos = self.pares(self.obter("/api/avaliacoes/tendencias/?page_size=100"))
+        # 3 usuários com 5 avaliações cada: 4 pares por usuário
+        self.assertEqual(len(todos), 12)
+
+        paginas = [self.obter("/api/avaliacoes/tendencias/?page_size=5")]
+        while paginas[-1]["next"]:
+            paginas.append(self.obter(paginas[-1]["next"]))
+        self.assertEqual(
+            [self.pares(pagina) for pagina in paginas],
+            [todos[0:5], todos[5:10], todos[10:12]],
+        )
+
+        anterior = self.obter(paginas[2]["previous"])
+        self.assertEqual(self.pares(anterior), todos[5:10])
+        anterior = self.obter(anterior["previous"])
+        self.assertEqual(self.pares(anterior), todos[0:5])
+        self.assertIsNone(anterior["previous"])
+
+    def assertAnterioresCorretos(self):
+        esperado = {}
+        for usuario_id in Avaliacao.objects.values_list("usuario_id", flat=True):
+            anterior = None
+            for avaliacao in Avaliacao.objects.filter(usuario_id=usuario_id).order_by(
+                "data_avaliacao", "id"
+            ):
+                esperado[avaliacao.id] = (
+                    anterior and anterior.pontuacao_total,
+                    anterior and anterior.nivel_sofrimento,
+                    anterior and anterior.data_avaliacao,
+                )
+                anterior = avaliacao
+        self.assertEqual(
+            {
+                id_: (pontuacao, nivel, data)
+                for id_, pontuacao, nivel, data in Avaliacao.objects.values_list(
+                    "id", "pontuacao_anterior", "nivel_anterior", "data_anterior"
+                )
+            },
+            esperado,
+        )
+
+    def test_anteriores_mantidos_a_cada_gravacao(self):
+        self.assertAnterioresCorretos()
+        usuario = self.usuarios[0]
+        ontem = timezone.now() - timedelta(days=1, hours=12)
+
+        # Inserida no meio do histórico, pelo save() e em lote
+        meio = Avaliacao.objects.create(
+            usuario=usuario,
+            pontuacao_total=20,
+            nivel_sofrimento="Grave",
+            data_avaliacao=ontem,
+        )
+        self.assertAnterioresCorretos()
+        gravar_submissoes(
+            [
+                montar_submissao(usuario.id, [], ontem - timedelta(days=1)),
+                montar_submissao(self.usuarios[1].id, [], timezone.now()),
+            ]
+        )
+        self.assertAnterioresCorretos()
+
+        # Alterada, movida para outra data e para outro usuário, e apagada
+        meio.pontuacao_total = 3
+        meio.nivel_sofrimento = "Leve"
+        meio.save()
+        self.assertAnterioresCorretos()
+        meio.data_avaliacao = timezone.now() - timedelta(days=10)
+        meio.save()
+        self.assertAnterioresCorretos()
+        meio.usuario = self.usuarios[2]
+        meio.save()
+        self.assertAnterioresCorretos()
+        self.assertEqual(
+            meio.pontuacao_anterior,
+            Avaliacao.objects.get(id=meio.id).pontuacao_anterior,
+        )
+        meio.delete()
+        usuario.avaliacoes.order_by("data_avaliacao")[2].delete()
+        self.assertAnterioresCorretos()
+
+    def test_transicoes(self):
+        linhas = tendencias.recalcular_transicoes()
+        matriz = self.obter("/api/avaliacoes/transicoes/")
+        transicoes = {(t["de"], t["para"]): t["total"] for t in matriz["transicoes"]}
+        pares = self.obter("/api/avaliacoes/tendencias/?page_size=100")["results"]
+        esperado = {}
+        for par in pares:
+            chave = (par["nivel_anterior"], par["nivel_sofrimento"])
+            esperado[chave] = esperado.get(chave, 0) + 1
+        self.assertEqual(linhas, len(esperado))
+        self.assertEqual(transicoes, esperado)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class EstatisticasIncrementaisTests(TestCase):
+    """Os totais mantidos a cada gravação batem com os recalculados do zero"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def totais(self):
+        return {
+            (linha.dimensao, linha.chave): (
+                linha.total,
+                linha.soma_pontuacao,
+                linha.soma_quadrados,
+            )
+            for linha in EstatisticaAvaliacao.objects.filter(total__gt=0)
+        }
+
+    def assertTotaisCorretos(self):
+        incrementais = self.totais()
+        estatisticas.recalcular()
+        self.assertEqual(incrementais, self.totais())
+
+    def test_gravar_alterar_e_apagar(self):
+        self.assertTotaisCorretos()
+
+        client = APIClient()
+        client.force_authenticate(self.usuarios[0])
+        response = client.post(
+            "/api/srq20/",
+            {
+                "respostas": [
+                    {"pergunta": pergunta.id, "resposta": pergunta.ordem <= 9}
+                    for pergunta in self.perguntas
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTotaisCorretos()
+
+        avaliacao = self.usuarios[1].avaliacoes.first()
+        avaliacao.pontuacao_total = 15
+        avaliacao.nivel_sofrimento = Avaliacao.calcular_nivel_sofrimento(15)
+        avaliacao.data_avaliacao -= timedelta(days=30)
+        avaliacao.save()
+        self.assertTotaisCorretos()
+
+        avaliacao.delete()
+        self.assertTotaisCorretos()
+
+    def test_trocar_genero(self):
+        usuario = self.usuarios[2]
+        for genero in ("Feminino", "Outro", None):
+            with self.subTest(genero=genero):
+                usuario.genero = genero
+                usuario.save()
+                self.assertTotaisCorretos()
+                self.assertEqual(
+                    self.totais()[("genero", genero or "")][0],
+                    Avaliacao.objects.filter(usuario__genero=genero).count(),
+                )
+
+        # Gravações que não tocam no gênero não consultam o valor anterior
+        usuario.last_login = timezone.now()
+        with CaptureQueriesContext(connection) as consultas:
+            usuario.save(update_fields=["last_login"])
+        self.assertFalse(
+            any("SELECT" in consulta["sql"] for consulta in consultas.captured_queries)
+        )
+
+
+class SerieTemporalTests(TestCase):
+    """Totais, médias e níveis de cada período da série, no fuso local"""
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = Usuario.objects.create_user(
+            username="usuario", email="usuario@exemplo.com", password="x"
+        )
+        for dia, hora, pontuacao in (
+            ("2024-01-29", 12, 2),
+            ("2024-01-31", 9, 10),
+            ("2024-01-31", 18, 16),
+            ("2024-02-01", 12, 0),
+            ("2024-02-05", 8, 5),
+            # 02:30 do dia 6 em UTC: ainda dia 5 no fuso local
+            ("2024-02-05", 23, 7),
+            ("2024-03-10", 12, 20),
+        ):
+            Avaliacao.objects.create(
+                usuario=usuario,
+                pontuacao_total=pontuacao,
+                nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(pontuacao),
+                data_avaliacao=timezone.make_aware(
+                    datetime.fromisoformat(f"{dia}T{hora:02d}:30")
+                ),
+            )
+
+    def serie(self, **parametros):
+        return [
+            (
+                balde["periodo"],
+                balde["total"],
+                balde["media_pontuacao"],
+                balde["distribuicao_niveis"],
+            )
+            for balde in estatisticas.serie_temporal(**parametros)
+        ]
+
+    def test_granularidades(self):
+        self.assertEqual(
+            self.serie(inicio="2024-01-01", granularidade="dia"),
+            [
+                ("2024-01-29", 1, 2, {"Leve": 1}),
+                ("2024-01-31", 2, 13, {"Moderado": 1, "Grave": 1}),
+                ("2024-02-01", 1, 0, {"Nenhum": 1}),
+                ("2024-02-05", 2, 6, {"Leve": 2}),
+                ("2024-03-10", 1, 20, {"Grave": 1}),
+            ],
+        )
+        # Semanas começando na segunda-feira
+        self.assertEqual(
+            self.serie(inicio="2024-01-01", granularidade="semana"),
+            [
+                (
+                    "2024-01-29",
+                    4,
+                    7,
+                    {"Leve": 1, "Moderado": 1, "Grave": 1, "Nenhum": 1},
+                ),
+                ("2024-02-05", 2, 6, {"Leve": 2}),
+                ("2024-03-04", 1, 20, {"Grave": 1}),
+            ],
+        )
+        self.assertEqual(
+            self.serie(inicio="2024-01-01", granularidade="mes"),
+            [
+                ("2024-01-01", 3, 28 / 3, {"Leve": 1, "Moderado": 1, "Grave": 1}),
+                ("2024-02-01", 3, 4, {"Nenhum": 1, "Leve": 2}),
+                ("2024-03-01", 1, 20, {"Grave": 1}),
+            ],
+        )
+
+    def test_intervalo_inclusivo(self):
+        self.assertEqual(
+            [
+                periodo
+                for periodo, *_ in self.serie(inicio="2024-01-31", fim="2024-02-05")
+            ],
+            ["2024-01-31", "2024-02-01", "2024-02-05"],
+        )
+        self.assertEqual(
+            self.serie(inicio="2024-02-02", fim="2024-02-05"),
+            [("2024-02-05", 2, 6, {"Leve": 2})],
+        )
+        self.assertEqual(self.serie(inicio="2024-02-06", fim="2024-03-09"), [])
+
+    def test_parametros_invalidos(self):
+        for parametros in (
+            {"inicio": "31/01/2024"},
+            {"fim": "2024-13-01"},
+            {"granularidade": "ano"},
+        ):
+            with self.subTest(parametros=parametros), self.assertRaises(ValueError):
+                estatisticas.serie_temporal(**parametros)
+
+
+class RegistroDeAcessosTests(TestCase):
+    """Gravação dos acessos em linhas individuais, contadores por hora ou ambos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(
+            username="usuario", email="usuario@exemplo.com", password="x"
+        )
+
+    def registros(self, quantidade):
+        agora = timezone.now()
+        return [(self.usuario.id, "10.0.0.1", agora)] * quantidade
+
+    def test_modos(self):
+        for modo, linhas, contadores in (
+            ("detalhado", 3, 0),
+            ("resumo", 0, 3),
+            ("ambos", 3, 3),
+        ):
+            with self.subTest(modo=modo), override_settings(HISTORICO_ACESSO_MODO=modo):
+                HistoricoAcesso.objects.all().delete()
+                ResumoAcesso.objects.all().delete()
+                acessos.gravar_acessos(self.registros(3))
+                self.assertEqual(HistoricoAcesso.objects.count(), linhas)
+                self.assertEqual(
+                    sum(ResumoAcesso.objects.values_list("total", flat=True)),
+                    contadores,
+                )
+
+    @override_settings(HISTORICO_ACESSO_MODO="ambos")
+    def test_ambos_na_mesma_transacao(self):
+        with mock.patch.object(
+            acessos, "acumular_resumos", side_effect=DatabaseError("falha simulada")
+        ), self.assertRaises(DatabaseError):
+            acessos.gravar_acessos(self.registros(2))
+        self.assertFalse(HistoricoAcesso.objects.exists())
+
+    def compactar(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        call_command(
+            "compactar_historico_acessos",
+            diretorio=diretorio.name,
+            stdout=io.StringIO(),
+        )
+        return list(arquivo.buscar(diretorio=diretorio.name))
+
+    def test_compactar_no_modo_detalhado(self):
+        uma_hora_atras = timezone.now() - timedelta(hours=1)
+        with override_settings(HISTORICO_ACESSO_MODO="detalhado"):
+            acessos.gravar_acessos(
+                [(self.usuario.id, "10.0.0.1", uma_hora_atras)] * 2
+                + [(self.usuario.id, "10.0.0.1", timezone.now())]
+            )
+            arquivados = self.compactar()
+
+        self.assertEqual(len(arquivados), 2)
+        # O acesso da hora corrente continua no banco, ainda não consolidado
+        self.assertEqual(HistoricoAcesso.objects.count(), 1)
+        resumo = ResumoAcesso.objects.get()
+        self.assertEqual(resumo.total, 2)
+        self.assertEqual(resumo.periodo, ResumoAcesso.inicio_periodo(uma_hora_atras))
+
+    def test_compactar_recusa_os_outros_modos(self):
+        uma_hora_atras = timezone.now() - timedelta(hours=1)
+        for modo in ("ambos", "resumo"):
+            with self.subTest(modo=modo), override_settings(HISTORICO_ACESSO_MODO=modo):
+                acessos.gravar_acessos([(self.usuario.id, "10.0.0.1", uma_hora_atras)])
+                linhas = HistoricoAcesso.objects.count()
+                total = sum(ResumoAcesso.objects.values_list("total", flat=True))
+                with self.assertRaises(CommandError):
+                    self.compactar()
+                self.assertEqual(HistoricoAcesso.objects.count(), linhas)
+                self.assertEqual(
+                    sum(ResumoAcesso.objects.values_list("total", flat=True)), total
+                )
+
+
+class ArquivoAcessosTests(TestCase):
+    """Arquivamento em arquivos diários, exclusão em lotes e busca no arquivo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [
+            Usuario.objects.create_user(
+                username=f"usuario{i}", email=f"usuario{i}@exemplo.com", password="x"
+            )
+            for i in range(2)
+        ]
+        meio_dia = timezone.localtime().replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
+        cls.dias = [
+            (meio_dia - timedelta(days=dias)).date() for dias in (100, 101, 130)
+        ]
+        for dias, quantidade in ((100, 3), (101, 2), (130, 1), (1, 2)):
+            for i in range(quantidade):
+                HistoricoAcesso.objects.create(
+                    usuario=cls.usuarios[i % 2],
+                    ip=f"10.0.0.{i % 2 + 1}",
+                    data_acesso=meio_dia - timedelta(days=dias, minutes=i),
+                )
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+
+    def arquivar(self, **opcoes):
+        saida = io.StringIO()
+        call_command(
+            "arquivar_historico_acessos",
+            dias=90,
+            diretorio=self.diretorio,
+            stdout=saida,
+            **opcoes,
+        )
+        return saida.getvalue()
+
+    def buscar(self, **filtros):
+        return list(arquivo.buscar(diretorio=self.diretorio, **filtros))
+
+    def test_particoes_por_dia_e_exclusao_em_lotes(self):
+        antigos = set(
+            HistoricoAcesso.objects.filter(
+                data_acesso__lt=timezone.now() - timedelta(days=90)
+            ).values_list("id", flat=True)
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            saida = self.arquivar(lote=2)
+
+        # 6 linhas antigas em lotes de 2, cada lote apagado na sua transação
+        self.assertIn("2 rows archived\n4 rows archived\n6 rows archived\n", saida)
+        exclusoes = [
+            consulta["sql"]
+            for consulta in consultas.captured_queries
+            if consulta["sql"].startswith("DELETE")
+        ]
+        self.assertEqual(len(exclusoes), 3)
+        self.assertEqual(HistoricoAcesso.objects.count(), 2)
+
+        self.assertEqual(
+            [
+                Path(caminho).relative_to(self.diretorio)
+                for caminho in arquivo.particoes(diretorio=self.diretorio)
+            ],
+            [
+                Path(f"{dia:%Y}/{dia:%m}/{dia.isoformat()}.ndjson.gz")
+                for dia in sorted(self.dias)
+            ],
+        )
+        for dia, quantidade in zip(self.dias, (3, 2, 1)):
+            registros = self.buscar(de=dia, ate=dia)
+            self.assertEqual(len(registros), quantidade)
+            self.assertTrue(
+                all(r["data_acesso"].startswith(dia.isoformat()) for r in registros)
+            )
+        self.assertEqual({r["id"] for r in self.buscar()}, antigos)
+
+    def test_simular_nao_altera_nada(self):
+        self.assertIn("6 rows", self.arquivar(simular=True))
+        self.assertEqual(HistoricoAcesso.objects.count(), 8)
+        self.assertEqual(self.buscar(), [])
+
+    def test_refazer_apos_interrupcao_nao_duplica(self):
+        # Arquivamento interrompido depois de gravar o arquivo e antes de apagar
+        corte = timezone.now() - timedelta(days=90)
+        arquivo.anexar_registros(
+            arquivo.registros_para_arquivar(
+                HistoricoAcesso.objects.filter(data_acesso__lt=corte).order_by("id")
+            ),
+            self.diretorio,
+        )
+        self.arquivar()
+
+        caminho = arquivo.caminho_particao(self.dias[0], self.diretorio)
+        with gzip.open(caminho, "rt") as particao:
+            self.assertEqual(len(particao.readlines()), 6)
+        self.assertEqual(len(self.buscar(de=self.dias[0], ate=self.dias[0])), 3)
+        self.assertEqual(len(self.buscar()), 6)
+
+    def test_filtros_da_busca(self):
+        self.arquivar()
+        usuario = self.usuarios[1]
+        for filtros, quantidade in (
+            ({}, 6),
+            ({"usuario": usuario.id}, 2),
+            ({"usuario": usuario.username}, 2),
+            ({"ip": "10.0.0.1"}, 4),
+            ({"ip": "10.0.0.2", "usuario": self.usuarios[0].id}, 0),
+            ({"de": self.dias[1]}, 5),
+            ({"ate": self.dias[1]}, 3),
+            ({"de": self.dias[1], "ate": self.dias[1]}, 2),
+        ):
+            with self.subTest(filtros=filtros):
+                self.assertEqual(len(self.buscar(**filtros)), quantidade)
+
+        saida = io.StringIO()
+        call_command(
+            "buscar_arquivo_acessos",
+            diretorio=self.diretorio,
+            usuario=str(usuario.id),
+            de=self.dias[1],
+            stdout=saida,
+        )
+        registros = [json.loads(linha) for linha in saida.getvalue().splitlines()]
+        self.assertEqual(len(registros), 2)
+        self.assertTrue(all(r["username"] == usuario.username for r in registros))
+
+        saida = io.StringIO()
+        call_command(
+            "buscar_arquivo_acessos",
+            diretorio=self.diretorio,
+            usuario=self.usuarios[0].username,
+            contar=True,
+            stdout=saida,
+        )
+        self.assertEqual(saida.getvalue().strip(), "4")
+
+
+class BufferAcessosTests(SimpleTestCase):
+    """O buffer grava os acessos ao completar um lote ou a cada intervalo"""
+
+    def setUp(self):
+        self.lotes = []
+        self.gravou = threading.Event()
+
+        def gravar(registros, batch_size=None):
+            self.lotes.append([usuario_id for usuario_id, _, _ in registros])
+            self.gravou.set()
+
+        substituicao = mock.patch.object(acessos, "gravar_acessos", gravar)
+        substituicao.start()
+        self.addCleanup(substituicao.stop)
+
+    def buffer(self, **configuracao):
+        return acessos.BufferAcessos(
+            **{
+                "tamanho_lote": 3,
+                "intervalo": 60.0,
+                "capacidade": 100,
+                "politica": "descartar",
+                "taxa_amostragem": 10,
+                **configuracao,
+            }
+        )
+
+    def test_por_tamanho(self):
+        buffer = self.buffer()
+        buffer.registrar(1, "10.0.0.1")
+        buffer.registrar(2, "10.0.0.1")
+        self.assertFalse(self.gravou.wait(0.2))
+        buffer.registrar(3, "10.0.0.1")
+        self.assertTrue(self.gravou.wait(5))
+        self.assertEqual(self.lotes, [[1, 2, 3]])
+
+    def test_por_tempo(self):
+        buffer = self.buffer(tamanho_lote=100, intervalo=0.05)
+        buffer.registrar(1, "10.0.0.1")
+        self.assertTrue(self.gravou.wait(5))
+        self.assertEqual(self.lotes, [[1]])
+
+    def test_capacidade(self):
+        buffer = self.buffer(tamanho_lote=100, capacidade=2)
+        for usuario_id in (1, 2, 3):
+            buffer.registrar(usuario_id, "10.0.0.1")
+        self.assertEqual(buffer.descartados, 1)
+        self.assertEqual(buffer.descarregar(), 2)
+        self.assertEqual(self.lotes, [[1, 2]])
+        self.assertEqual(buffer.gravados, 2)
+
+
+class CacheAnalisesTests(SimpleTestCase):
+    """Valores válidos por TTL, servidos obsoletos durante o recálculo"""
+
+    def setUp(self):
+        self.agora = 1000.0
+        relogio = mock.patch.object(
+            cache_analises.time, "monotonic", lambda: self.agora
+        )
+        relogio.start()
+        self.addCleanup(relogio.stop)
+        self.cache = cache_analises.CacheAnalises(
+            ttl=30, ttl_obsoleto=300, max_entradas=2
+        )
+        self.calculos = 0
+
+    def calcular(self):
+        self.calculos += 1
+        return self.calculos
+
+    def test_hit_obsoleto_e_miss(self):
+        obter = self.cache.obter
+        self.assertEqual(obter("teste", {}, self.calcular), (1, "miss"))
+        self.agora += 29
+        self.assertEqual(obter("teste", {}, self.calcular), (1, "hit"))
+        # Outros parâmetros são outra entrada
+        self.assertEqual(obter("teste", {"a": 1}, self.calcular), (2, "miss"))
+
+        # Vencido o TTL, quem recalcula trava a entrada; os demais (aqui, uma
+        # chamada feita durante o próprio cálculo) recebem o valor anterior
+        self.agora += 2
+        durante = []
+
+        def recalcular():
+            durante.append(obter("teste", {}, self.calcular))
+            return self.calcular()
+
+        self.assertEqual(obter("teste", {}, recalcular), (3, "miss"))
+        self.assertEqual(durante, [(1, "obsoleto")])
+
+        # Depois de TTL_OBSOLETO o valor não é mais servido
+        self.agora += 301
+        self.assertEqual(obter("teste", {}, self.calcular), (4, "miss"))
+
+        metricas = self.cache.metricas()["consultas"]["teste"]
+        self.assertEqual(
+            (metricas["hits"], metricas["obsoletos"], metricas["misses"]), (1, 1, 4)
+        )
+
+    def test_excecao_nao_e_guardada(self):
+        def falhar():
+            raise ValueError("falha")
+
+        with self.assertRaises(ValueError):
+            self.cache.obter("teste", {}, falhar)
+        self.assertEqual(self.cache.obter("teste", {}, self.calcular), (1, "miss"))
+
+    def test_limite_de_entradas(self):
+        for parametro in (1, 2, 3):
+            self.cache.obter("teste", {"p": parametro}, self.calcular)
+        self.assertEqual(self.cache.metricas()["entradas"], 2)
+        # A entrada mais antiga foi descartada
+        self.assertEqual(self.cache.obter("teste", {"p": 1}, self.calcular)[1], "miss")
+
+
+class PsicometriaTests(TestCase):
+    """calcular() confere com o cálculo direto em NumPy sobre a matriz inteira"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorias = ["sintomas físicos"] * 8 + ["distúrbios psicoemocionais"] * 8
+        categorias += ["outros"] * 4
+        Pergunta.objects.bulk_create(
+            Pergunta(texto=f"Pergunta {ordem}", ordem=ordem, categoria=categoria)
+            for ordem, categoria in enumerate(categorias, start=1)
+        )
+        usuario = Usuario.objects.create_user(
+            username="usuario", email="usuario@exemplo.com", password="x"
+        )
+
+        # Itens correlacionados por um fator latente; a pergunta 20 nunca é
+        # respondida com Sim (variância nula)
+        gerador = np.random.default_rng(20)
+        latente = gerador.normal(size=(60, 1))
+        cls.matriz = (latente + gerador.normal(size=(60, 20)) > 0.5).astype(float)
+        cls.matriz[:, 19] = 0
+        Avaliacao.objects.bulk_create(
+            Avaliacao(
+                usuario=usuario,
+                pontuacao_total=int(linha.sum()),
+                nivel_sofrimento=Avaliacao.calcular_nivel_sofrimento(int(linha.sum())),
+                respostas_bitmask=Avaliacao.codificar_respostas(
+                    {ordem: bool(valor) for ordem, valor in enumerate(linha, start=1)}
+                ),
+            )
+            for linha in cls.matriz
+        )
+        Avaliacao.objects.create(
+            usuario=usuario, pontuacao_total=3, nivel_sofrimento="Leve"
+        )
+
+    @staticmethod
+    def alfa(matriz):
+        k = matriz.shape[1]
+        return k / (k - 1) * (1 - matriz.var(axis=0).sum() / matriz.sum(axis=1).var())
+
+    def test_confere_com_numpy(self):
+        matriz = self.matriz
+        resultado = psicometria.calcular(tamanho_bloco=7)
+
+        self.assertEqual(resultado["total_avaliacoes"], 60)
+        self.assertEqual(resultado["sem_bitmask"], 1)
+        self.assertAlmostEqual(resultado["alfa_cronbach"], self.alfa(matriz))
+
+        correlacao = np.corrcoef(matriz[:, :19].T)
+        for i, item in enumerate(resultado["itens"]):
+            with self.subTest(ordem=item["ordem"]):
+                self.assertEqual(item["ordem"], i + 1)
+                self.assertAlmostEqual(item["prevalencia"], matriz[:, i].mean())
+                self.assertAlmostEqual(item["variancia"], matriz[:, i].var())
+                if i == 19:
+                    self.assertIsNone(item["correlacao_item_total"])
+                    self.assertTrue(
+                        all(valor is None for valor in resultado["correlacao"][i])
+                    )
+                    continue
+                resto = matriz.sum(axis=1) - matriz[:, i]
+                self.assertAlmostEqual(
+                    item["correlacao_item_total"],
+                    np.corrcoef(matriz[:, i], resto)[0, 1],
+                )
+                np.testing.assert_allclose(
+                    resultado["correlacao"][i][:19], correlacao[i]
+                )
+
+        subescalas = {sub["categoria"]: sub for sub in resultado["subescalas"]}
+        for categoria, ordens in (
+            ("sintomas físicos", range(1, 9)),
+            ("distúrbios psicoemocionais", range(9, 17)),
+            ("outros", range(17, 21)),
+        ):
+            with self.subTest(categoria=categoria):
+                sub = subescalas[categoria]
+                colunas = matriz[:, [ordem - 1 for ordem in ordens]]
+                self.assertEqual(sub["ordens"], list(ordens))
+                self.assertAlmostEqual(sub["media"], colunas.sum(axis=1).mean())
+                self.assertAlmostEqual(sub["desvio_padrao"], colunas.sum(axis=1).std())
+                self.assertAlmostEqual(sub["alfa_cronbach"], self.alfa(colunas))
+
+    def test_sem_bitmask(self):
+        Avaliacao.objects.update(respostas_bitmask=None)
+        resultado = psicometria.calcular()
+        self.assertEqual(resultado["total_avaliacoes"], 0)
+        self.assertEqual(resultado["sem_bitmask"], 61)
+        self.assertIsNone(resultado["alfa_cronbach"])
+        self.assertEqual(resultado["itens"], [])
+
+
+class AgrupamentoTests(SimpleTestCase):
+    """Cada resposta antiga vai para a primeira avaliação do usuário no mesmo instante ou depois"""
+
+    def test_agrupar_respostas(self):
+        t = [timezone.now() + timedelta(minutes=minutos) for minutos in range(6)]
+        avaliacoes = [(10, 1, t[1]), (11, 1, t[3]), (20, 2, t[1])]
+        respostas = [
+            (1, 1, 100, True, t[0]),
+            (2, 1, 101, False, t[1]),  # mesmo instante da avaliação 10
+            (3, 1, 100, False, t[2]),
+            (4, 1, 100, True, t[4]),  # depois da última avaliação do usuário
+            (5, 2, 100, True, t[0]),
+            (6, 3, 100, True, t[0]),  # usuário sem avaliações
+        ]
+        self.assertEqual(
+            agrupamento.agrupar_respostas(reversed(avaliacoes), respostas),
+            {
+                10: [(1, 100, True), (2, 101, False)],
+                11: [(3, 100, False)],
+                20: [(5, 100, True)],
+            },
+        )
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class PreenchimentoRetroativoTests(TestCase):
+    """vincular_respostas_avaliacoes e preencher_bitmask_respostas sobre dados antigos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perguntas = Pergunta.objects.bulk_create(
+            Pergunta(texto=f"Pergunta {ordem}", ordem=ordem) for ordem in range(1, 21)
+        )
+        cls.usuarios = [
+            Usuario.objects.create_user(
+                username=f"usuario{i}", email=f"usuario{i}@exemplo.com", password="x"
+            )
+            for i in range(3)
+        ]
+        # Caminho antigo: respostas gravadas sem vínculo um pouco antes da
+        # avaliação, que não tinha bitmask
+        inicio = timezone.now() - timedelta(days=10)
+        cls.esperado = {}
+        for u, usuario in enumerate(cls.usuarios):
+            for n in range(3):
+                data = inicio + timedelta(days=n, minutes=u)
+                respostas = {
+                    pergunta.id: (pergunta.ordem + n + u) % 3 == 0
+                    for pergunta in cls.perguntas
+                }
+                for i, (pergunta_id, resposta) in enumerate(respostas.items()):
+                    Resposta.objects.create(
+                        usuario=usuario,
+                        pergunta_id=pergunta_id,
+                        resposta=resposta,
+                        data_resposta=data - timedelta(milliseconds=50 - i),
+                    )
+                avaliacao = Avaliacao.objects.create(
+                    usuario=usuario,
+                    pontuacao_total=sum(respostas.values()),
+                    nivel_sofrimento="Leve",
+                    data_avaliacao=data,
+                )
+                cls.esperado[avaliacao.id] = respostas
+        # Respondida depois da última avaliação: não pertence a nenhuma
+        cls.sem_avaliacao = Resposta.objects.create(
+            usuario=cls.usuarios[0], pergunta=cls.perguntas[0], resposta=True
+        )
+
+    def executar(self, comando, **opcoes):
+        saida = io.StringIO()
+        call_command(comando, lote=2, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def assertVinculadas(self):
+        for avaliacao_id, respostas in self.esperado.items():
+            self.assertEqual(
+                dict(
+                    Resposta.objects.filter(avaliacao_id=avaliacao_id).values_list(
+                        "pergunta_id", "resposta"
+                    )
+                ),
+                respostas,
+            )
+        self.sem_avaliacao.refresh_from_db()
+        self.assertIsNone(self.sem_avaliacao.avaliacao_id)
+
+    def assertBitmasks(self):
+        ordens = {pergunta.id: pergunta.ordem for pergunta in self.perguntas}
+        for avaliacao in Avaliacao.objects.all():
+            self.assertEqual(
+                avaliacao.decodificar_respostas(),
+                {
+                    ordens[pergunta_id]: resposta
+                    for pergunta_id, resposta in self.esperado[avaliacao.id].items()
+                },
+            )
+
+    def test_vincular(self):
+        saida = self.executar("vincular_respostas_avaliacoes")
+        self.assertIn("Backfill complete: 180 answers linked", saida)
+        self.assertVinculadas()
+
+        saida = self.executar("vincular_respostas_avaliacoes")
+        self.assertIn("Backfill complete: 0 answers linked", saida)
+        self.assertVinculadas()
+
+    def test_preencher_bitmask(self):
+        saida = self.executar("preencher_bitmask_respostas")
+        self.assertIn("Backfill complete: 9 assessments updated", saida)
+        self.assertBitmasks()
+        self.assertEqual(
+            [
+                avaliacao.pontuacao_total
+                for avaliacao in Avaliacao.objects.order_by("id")
+            ],
+            [
+                bin(bitmask).count("1")
+                for bitmask in Avaliacao.objects.order_by("id").values_list(
+                    "respostas_bitmask", flat=True
+                )
+            ],
+        )
+
+        saida = self.executar("preencher_bitmask_respostas")
+        self.assertIn("Backfill complete: 0 assessments updated", saida)
+        self.assertBitmasks()
+
+        # Sem --refazer, um bitmask já preenchido é mantido
+        Avaliacao.objects.filter(id=min(self.esperado)).update(respostas_bitmask=0)
+        self.executar("preencher_bitmask_respostas")
+        self.assertEqual(
+            Avaliacao.objects.get(id=min(self.esperado)).respostas_bitmask, 0
+        )
+        saida = self.executar("preencher_bitmask_respostas", refazer=True)
+        self.assertIn("Backfill complete: 9 assessments updated", saida)
+        self.assertBitmasks()
+
+    def test_preencher_depois_de_vincular(self):
+        self.executar("vincular_respostas_avaliacoes")
+        self.executar("preencher_bitmask_respostas")
+        self.assertVinculadas()
+        self.assertBitmasks()
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class CacheEstatisticasTests(TestCase):
+    """O endpoint de estatísticas informa no cabeçalho X-Cache se usou o cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def test_cabecalho_x_cache(self):
+        cache_analises.obter_cache().limpar()
+        self.addCleanup(cache_analises.obter_cache().limpar)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        primeira = client.get("/api/avaliacoes/estatisticas/")
+        segunda = client.get("/api/avaliacoes/estatisticas/")
+        self.assertEqual((primeira["X-Cache"], segunda["X-Cache"]), ("miss", "hit"))
+        self.assertEqual(primeira.json(), segunda.json())
+        self.assertEqual(primeira.json()["total_avaliacoes"], 15)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class ExportacaoIncrementalTests(TestCase):
+    """?cursor= exporta só as avaliações gravadas desde a exportação anterior"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def exportar(self, cursor):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get(
+            "/api/avaliacoes/export/", {"formato": "ndjson", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+        linhas = b"".join(response.streaming_content).decode().splitlines()
+        ids = [json.loads(linha)["id"] for linha in linhas]
+        return ids, response["X-Cursor-Exportacao"]
+
+    def test_ida_e_volta(self):
+        self.assertEqual(exportacao.ler_cursor(exportacao.criar_cursor(42)), 42)
+        self.assertEqual(exportacao.ler_cursor(""), 0)
+
+        ids, cursor = self.exportar("")
+        self.assertEqual(
+            ids, list(Avaliacao.objects.order_by("id").values_list("id", flat=True))
+        )
+        self.assertEqual(self.exportar(cursor), ([], cursor))
+
+        # Uma avaliação com data no passado ainda entra na próxima exportação
+        nova = Avaliacao.objects.create(
+            usuario=self.usuarios[0],
+            pontuacao_total=1,
+            nivel_sofrimento="Nenhum",
+            data_avaliacao=timezone.now() - timedelta(days=365),
+        )
+        ids, seguinte = self.exportar(cursor)
+        self.assertEqual(ids, [nova.id])
+        self.assertEqual(exportacao.ler_cursor(seguinte), nova.id)
+
+    def test_cursor_invalido(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for cursor in ("nao-e-cursor", exportacao.criar_cursor(-1)):
+            with self.subTest(cursor=cursor):
+                response = client.get("/api/avaliacoes/export/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class ExportacaoMatrizTests(TestCase):
+    """Matriz de respostas com avaliações com e sem bitmask intercaladas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # As avaliações de exemplo não têm bitmask: respostas vêm de Resposta
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        agora = timezone.now()
+        usuario = cls.usuarios[1]
+        for dias, bitmask in ((0.5, 0b1011), (2.5, 0), (3.5, (1 << 20) - 1)):
+            Avaliacao.objects.create(
+                usuario=usuario,
+                pontuacao_total=bin(bitmask).count("1"),
+                nivel_sofrimento="Leve",
+                data_avaliacao=agora - timedelta(days=dias),
+                respostas_bitmask=bitmask,
+            )
+        # Sem bitmask: só algumas respostas gravadas, nenhuma, e duas na mesma data
+        parcial = Avaliacao.objects.create(
+            usuario=usuario,
+            pontuacao_total=1,
+            nivel_sofrimento="Leve",
+            data_avaliacao=agora - timedelta(days=1.5),
+        )
+        Resposta.objects.bulk_create(
+            Resposta(
+                usuario=usuario,
+                pergunta=cls.perguntas[ordem - 1],
+                avaliacao=parcial,
+                resposta=ordem == 3,
+            )
+            for ordem in (3, 7, 20)
+        )
+        Avaliacao.objects.create(
+            usuario=usuario,
+            pontuacao_total=0,
+            nivel_sofrimento="Nenhum",
+            data_avaliacao=agora - timedelta(days=1.5),
+        )
+        Avaliacao.objects.create(
+            usuario=cls.usuarios[2],
+            pontuacao_total=0,
+            nivel_sofrimento="Nenhum",
+            data_avaliacao=agora,
+        )
+        # Resposta sem avaliação: não entra em nenhuma linha
+        Resposta.objects.create(
+            usuario=usuario, pergunta=cls.perguntas[0], resposta=True
+        )
+
+    def esperado(self):
+        linhas = {}
+        for avaliacao in Avaliacao.objects.order_by(
+            "usuario_id", "data_avaliacao", "id"
+        ):
+            if avaliacao.respostas_bitmask is not None:
+                valores = avaliacao.decodificar_respostas()
+            else:
+                valores = {
+                    resposta.pergunta.ordem: resposta.resposta
+                    for resposta in avaliacao.respostas.select_related("pergunta")
+                }
+            linhas[avaliacao.id] = [
+                valores.get(ordem) for ordem in range(1, Avaliacao.TOTAL_PERGUNTAS + 1)
+            ]
+        return linhas
+
+    def test_linhas(self):
+        esperado = self.esperado()
+        self.assertEqual(
+            Avaliacao.objects.filter(respostas_bitmask__isnull=False).count(), 3
+        )
+        for tamanho_lote in (1, 2, 7, 2000):
+            with self.subTest(tamanho_lote=tamanho_lote):
+                linhas = list(exportacao.linhas_matriz(tamanho_lote=tamanho_lote))
+                self.assertEqual([linha[0] for linha in linhas], list(esperado))
+                self.assertEqual(
+                    {linha[0]: list(linha[6:]) for linha in linhas}, esperado
+                )
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get("/api/avaliacoes/export/?formato=ndjson&modo=matriz")
+        self.assertEqual(response.status_code, 200)
+        registros = [
+            json.loads(linha)
+            for linha in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            {
+                registro["id"]: [registro[f"p{ordem}"] for ordem in range(1, 21)]
+                for registro in registros
+            },
+            self.esperado(),
+        )
+        self.assertEqual(
+            {registro["id"]: registro["usuario"] for registro in registros},
+            dict(Avaliacao.objects.values_list("id", "usuario__username")),
+        )
+
+
+@skipUnless(exportacao.pyarrow_disponivel(), "Requer o pacote pyarrow")
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class ExportacaoColunarTests(TestCase):
+    """Parquet e Arrow lidos de volta com o pyarrow"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        cls.usuarios[0].genero = "Feminino"
+        cls.usuarios[0].save()
+
+    def ler(self, formato, conteudo):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if formato == "parquet":
+            return pq.read_table(io.BytesIO(conteudo))
+        return pa.ipc.open_stream(conteudo).read_all()
+
+    def test_ida_e_volta(self):
+        import pyarrow as pa
+
+        for formato in exportacao.FORMATOS_COLUNARES:
+            for matriz in (False, True):
+                with self.subTest(formato=formato, matriz=matriz):
+                    linhas = list(exportacao.linhas_exportacao(matriz=matriz))
+                    conteudo = b"".join(
+                        exportacao.gerar_colunar(
+                            iter(linhas), formato, matriz, tamanho_lote=4
+                        )
+                    )
+                    tabela = self.ler(formato, conteudo)
+
+                    colunas = (
+                        exportacao.COLUNAS_MATRIZ if matriz else exportacao.COLUNAS
+                    )
+                    self.assertEqual(tabela.schema.names, list(colunas))
+                    self.assertEqual(tabela.schema.field("id").type, pa.int64())
+                    self.assertEqual(tabela.schema.field("pontuacao").type, pa.int16())
+                    self.assertEqual(
+                        tabela.schema.field("data").type, pa.timestamp("us", tz="UTC")
+                    )
+                    if matriz:
+                        self.assertEqual(tabela.schema.field("p1").type, pa.bool_())
+                    self.assertEqual(tabela.num_rows, Avaliacao.objects.count())
+                    self.assertEqual(
+                        [tuple(linha.values()) for linha in tabela.to_pylist()],
+                        linhas,
+                    )
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        for formato in exportacao.FORMATOS_COLUNARES:
+            with self.subTest(formato=formato):
+                response = client.get(f"/api/avaliacoes/export/?formato={formato}")
+                self.assertEqual(response.status_code, 200)
+                tabela = self.ler(formato, b"".join(response.streaming_content))
+                self.assertEqual(
+                    sorted(tabela.column("id").to_pylist()),
+                    sorted(Avaliacao.objects.values_list("id", flat=True)),
+                )
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class TarefasExportacaoTests(TestCase):
+    """Exportações em segundo plano: reaproveitamento, abandono e download"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            MEDIA_ROOT=diretorio.name,
+            SRQ20_EXPORTACAO={"EXECUTAR_EM_THREAD": False, "TEMPO_LIMITE": 60},
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def criar(self, **dados):
+        return self.client.post(
+            "/api/exportacoes/", {"formato": "csv", **dados}, format="json"
+        )
+
+    def test_reaproveita_tarefa_identica(self):
+        primeira = self.criar()
+        self.assertEqual(primeira.status_code, 202)
+        repetida = self.criar()
+        self.assertEqual(repetida.status_code, 200)
+        self.assertEqual(repetida.json()["id"], primeira.json()["id"])
+        self.assertEqual(self.criar(modo="matriz").status_code, 202)
+
+        TarefaExportacao.objects.filter(id=primeira.json()["id"]).update(
+            situacao="erro"
+        )
+        self.assertNotEqual(self.criar().json()["id"], primeira.json()["id"])
+
+    def test_tarefa_abandonada(self):
+        primeira = self.criar().json()["id"]
+        TarefaExportacao.objects.filter(id=primeira).update(
+            situacao="executando", iniciado_em=timezone.now() - timedelta(seconds=30)
+        )
+        # Ainda dentro do tempo limite: reaproveitada
+        self.assertEqual(self.criar().json()["id"], primeira)
+
+        TarefaExportacao.objects.filter(id=primeira).update(
+            iniciado_em=timezone.now() - timedelta(seconds=120)
+        )
+        nova = self.criar()
+        self.assertEqual(nova.status_code, 202)
+        self.assertNotEqual(nova.json()["id"], primeira)
+        self.assertEqual(TarefaExportacao.objects.get(id=primeira).situacao, "erro")
+
+        # O processador também as marca, e executa as pendentes
+        TarefaExportacao.objects.filter(id=nova.json()["id"]).update(
+            situacao="executando", iniciado_em=timezone.now() - timedelta(seconds=120)
+        )
+        pendente = self.criar(modo="matriz").json()["id"]
+        self.assertEqual(tarefas.executar_pendentes(), 1)
+        self.assertEqual(
+            TarefaExportacao.objects.get(id=nova.json()["id"]).situacao, "erro"
+        )
+        self.assertEqual(
+            TarefaExportacao.objects.get(id=pendente).situacao, "concluida"
+        )
+
+    def test_download_com_range(self):
+        tarefa = self.criar().json()["id"]
+        url = f"/api/exportacoes/{tarefa}/download/"
+        self.assertEqual(self.client.get(url).status_code, 409)
+        tarefas.executar_pendentes()
+
+        completo = self.client.get(url)
+        self.assertEqual(completo.status_code, 200)
+        conteudo = b"".join(completo.streaming_content)
+        tamanho = len(conteudo)
+        self.assertEqual(completo["Content-Length"], str(tamanho))
+
+        parcial = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial["Content-Range"], f"bytes 10-{tamanho - 1}/{tamanho}")
+        self.assertEqual(b"".join(parcial.streaming_content), conteudo[10:])
+
+        sufixo = self.client.get(url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(sufixo.streaming_content), conteudo[-5:])
+
+        fora = self.client.get(url, HTTP_RANGE=f"bytes={tamanho}-")
+        self.assertEqual(fora.status_code, 416)
+        self.assertEqual(fora["Content-Range"], f"bytes */{tamanho}")
+
+        # If-Range com outro ETag: o arquivo inteiro
+        outro = self.client.get(url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE='"x"')
+        self.assertEqual(outro.status_code, 200)
+        self.assertEqual(b"".join(outro.streaming_content), conteudo)
+
+
+@override_settings(HISTORICO_ACESSO_BUFFER={"ATIVO": False})
+class SubmissaoTests(TestCase):
+    """POST /api/srq20/ grava a avaliação e as respostas de uma vez, ou nada"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios, cls.admin, cls.perguntas = dados_de_exemplo()
+        cls.usuario = cls.usuarios[0]
+
+    def respostas(self, resposta=lambda pergunta: pergunta.ordem <= 5):
+        return [
+            {"pergunta": pergunta.id, "resposta": resposta(pergunta)}
+            for pergunta in self.perguntas
+        ]
+
+    def gravados(self):
+        return (
+            Avaliacao.objects.count(),
+            Resposta.objects.count(),
+            sorted(EstatisticaAvaliacao.objects.values_list("total", flat=True)),
+        )
+
+    def test_grava_avaliacao_e_respostas(self):
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+        response = client.post(
+            "/api/srq20/", {"respostas": self.respostas()}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        avaliacao = Avaliacao.objects.get(id=response.json()["avaliacao"]["id"])
+        self.assertEqual(avaliacao.pontuacao_total, 5)
+        self.assertEqual(avaliacao.respostas.count(), 20)
+        self.assertEqual(
+            avaliacao.decodificar_respostas(),
+            {pergunta.ordem: pergunta.ordem <= 5 for pergunta in self.perguntas},
+        )
+
+    def test_consultas(self):
+        registrar_submissao(self.usuario, self.respostas())
+        # Validação, savepoint, avaliação anterior, avaliação, 3 estatísticas,
+        # respostas e release
+        with self.assertNumQueries(9):
+            registrar_submissao(self.usuario, self.respostas())
+
+    def test_nada_e_gravado_se_uma_insercao_falhar(self):
+        antes = self.gravados()
+        with mock.patch.object(
+            Resposta.objects, "bulk_create", side_effect=DatabaseError("falha")
+        ), self.assertRaises(DatabaseError):
+            registrar_submissao(self.usuario, self.respostas())
+        self.assertEqual(self.gravados(), antes)
+
+    def test_submissao_invalida(self):
+        client = APIClient()
+        client.force_authenticate(self.usuario)
+        antes = self.gravados()
+        for respostas in (
+            self.respostas(lambda pergunta: None),
+            self.respostas(lambda pergunta: "sim"),
+            self.respostas() + [{"pergunta": 999999, "resposta": True}],
+            self.respostas() + ["sim"],
+            [[self.perguntas[0].id, True]],
+            "sim",
+            {"pergunta": self.perguntas[0].id, "resposta": True},
+            None,
+        ):
+            with self.subTest(respostas=respostas):
+                response = client.post(
+                    "/api/srq20/", {"respostas": respostas}, format="json"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+        response = client.post("/api/srq20/", self.respostas(), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.gravados(), antes)
@@ -7,11 +7,19 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from django.db.models import Avg, Count, Sum, Max, Min
 from django.conf import settings
+from django.http import HttpResponseNotModified, StreamingHttpResponse
 import json
-import csv
-import io
-
-from .models import Pergunta, Resposta, Avaliacao, AtividadeSugerida, HistoricoAcesso
+import os
+
+from .models import (
+    Pergunta,
+    Resposta,
+    Avaliacao,
+    AtividadeSugerida,
+    HistoricoAcesso,
+    ResumoAcesso,
+    TarefaExportacao,
+)
 from .serializers import (
     UsuarioSerializer,
     UsuarioRegistroSerializer,
@@ -19,14 +27,42 @@ from .serializers import (
     RespostaSerializer,
     RespostaCreateSerializer,
     AvaliacaoSerializer,
+    VariacaoAvaliacaoSerializer,
     AtividadeSugeridaSerializer,
     HistoricoAcessoSerializer,
+    ResumoAcessoSerializer,
+    TarefaExportacaoSerializer,
+)
+from .services import registrar_submissao, enfileirar_submissao, SubmissaoInvalida
+from .fila import estatisticas as estatisticas_fila
+from .ingestao import ingerir_ndjson
+from .atividades import atividades_por_nivel
+from . import psicometria
+from .cache_analises import em_cache, obter_cache as obter_cache_analises
+from .exportacao import (
+    FORMATOS_COLUNARES,
+    avaliacoes_desde,
+    exportar,
+    ler_cursor,
+    pyarrow_disponivel,
+    resposta_arquivo,
+)
+from .tarefas import arquivo_download, criar_tarefa
+from .paginacao import PaginacaoPorCursor
+from .serializacao import ListagemRapidaMixin, ProjecaoMixin
+from .tendencias import matriz_transicoes, variacoes
+from .estatisticas import resumo as resumo_estatisticas, serie_temporal
+from .questionario import (
+    obter_questionario,
+    resposta_questionario,
+    etag_corresponde,
+    adicionar_cabecalhos,
 )
 
 Usuario = get_user_model()
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(ProjecaoMixin, viewsets.ModelViewSet):
     queryset = Usuario.objects.all()
     serializer_class = UsuarioSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -50,20 +86,35 @@ class RegistroAPIView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 
-class PerguntaViewSet(viewsets.ModelViewSet):
+class PerguntaViewSet(ProjecaoMixin, viewsets.ModelViewSet):
     queryset = Pergunta.objects.all().order_by("ordem")
     serializer_class = PerguntaSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["categoria"]
 
-
-class RespostaViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        # Responde 304 sem consultar o banco se o cliente já tem esta página
+        # na versão atual do questionário
+        questionario = obter_questionario()
+        etag = questionario.etag_para(request.get_full_path())
+        if etag_corresponde(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return adicionar_cabecalhos(response, etag, questionario.versao)
+
+
+class RespostaViewSet(ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = Resposta.objects.all()
     serializer_class = RespostaSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ["usuario", "pergunta", "data_resposta"]
+    filterset_fields = ["usuario", "avaliacao", "pergunta", "data_resposta"]
+    pagination_class = PaginacaoPorCursor
+    ordenacao_cursor = ("-data_resposta", "-id")
 
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
@@ -81,71 +132,74 @@ class SRQ20ViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
-        """Retorna todas as perguntas do SRQ-20"""
-        perguntas = Pergunta.objects.all().order_by("ordem")
-        serializer = PerguntaSerializer(perguntas, many=True)
-        return Response(serializer.data)
+        """Retorna todas as perguntas do SRQ-20 a partir do cache versionado"""
+        return resposta_questionario(request)
 
     def create(self, request):
         """Recebe as respostas do questionário e calcula a avaliação"""
-        respostas_data = request.data.get("respostas", [])
-        user = request.user
-
-        # Salvar respostas
-        for resposta_data in respostas_data:
-            pergunta_id = resposta_data.get("pergunta")
-            resposta_valor = resposta_data.get("resposta")
-
-            try:
-                pergunta = Pergunta.objects.get(id=pergunta_id)
-                Resposta.objects.create(
-                    usuario=user, pergunta=pergunta, resposta=resposta_valor
-                )
-            except Pergunta.DoesNotExist:
-                return Response(
-                    {"error": f"Pergunta com ID {pergunta_id} não existe"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        # Calcular pontuação
-        pontuacao_total = sum(
-            1 for resposta in respostas_data if resposta.get("resposta") is True
-        )
-        nivel_sofrimento = Avaliacao.calcular_nivel_sofrimento(pontuacao_total)
-
-        # Criar avaliação
-        avaliacao = Avaliacao.objects.create(
-            usuario=user,
-            pontuacao_total=pontuacao_total,
-            nivel_sofrimento=nivel_sofrimento,
+        # Um corpo que não é um objeto (ex.: uma lista) é recusado na validação
+        respostas_data = (
+            request.data.get("respostas", [])
+            if isinstance(request.data, dict)
+            else None
         )
+        user = request.user
 
-        # Buscar atividades sugeridas
+        # Salvar respostas e avaliação em uma única transação, ou apenas
+        # enfileirar a gravação no modo assíncrono. O acesso é registrado
+        # pelo HistoricoAcessoMiddleware.
+        assincrono = settings.SRQ20_ESCRITA_ASSINCRONA
+        try:
+            if assincrono:
+                avaliacao = enfileirar_submissao(user, respostas_data)
+            else:
+                avaliacao = registrar_submissao(user, respostas_data)
+        except SubmissaoInvalida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        nivel_sofrimento = avaliacao.nivel_sofrimento
+
+        # Buscar atividades sugeridas (índice em memória, sem consulta)
         atividades = []
         if nivel_sofrimento != "Nenhum":
-            atividades = AtividadeSugerida.objects.filter(
-                nivel_sofrimento=nivel_sofrimento
-            )
-            atividades = AtividadeSugeridaSerializer(atividades, many=True).data
-
-        # Registrar acesso
-        ip = request.META.get("REMOTE_ADDR", "")
-        HistoricoAcesso.objects.create(usuario=user, ip=ip)
+            atividades = atividades_por_nivel(nivel_sofrimento)
 
         return Response(
             {
                 "avaliacao": AvaliacaoSerializer(avaliacao).data,
                 "atividades_sugeridas": atividades,
-            }
+            },
+            status=status.HTTP_202_ACCEPTED if assincrono else status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="lote",
+        permission_classes=[permissions.IsAdminUser],
+    )
+    def lote(self, request):
+        """Recebe questionários em lote no formato NDJSON, um por linha"""
+        resultados = ingerir_ndjson(request.stream)
+        return StreamingHttpResponse(
+            (json.dumps(resultado) + "\n" for resultado in resultados),
+            content_type="application/x-ndjson",
         )
 
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def fila(self, request):
+        """Retorna a profundidade e o atraso de drenagem da fila de gravação"""
+        return Response(estatisticas_fila())
+
 
-class AvaliacaoViewSet(viewsets.ModelViewSet):
+class AvaliacaoViewSet(ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = Avaliacao.objects.all()
     serializer_class = AvaliacaoSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["usuario", "nivel_sofrimento", "data_avaliacao"]
+    # Também usada por `tendencias`, que lê os pares pelos mesmos índices
+    pagination_class = PaginacaoPorCursor
+    ordenacao_cursor = ("-data_avaliacao", "-id")
 
     def get_queryset(self):
         user = self.request.user
@@ -153,6 +207,40 @@ class AvaliacaoViewSet(viewsets.ModelViewSet):
             return Avaliacao.objects.all()
         return Avaliacao.objects.filter(usuario=user)
 
+    @action(detail=True, methods=["get"])
+    def respostas(self, request, pk=None):
+        """Retorna a avaliação com as respostas do questionário correspondente"""
+        avaliacao = self.get_object()
+        ordens = obter_questionario().ordens
+
+        respostas = [
+            {
+                "pergunta": pergunta_id,
+                "ordem": ordens.get(pergunta_id),
+                "resposta": valor,
+            }
+            for pergunta_id, valor in Resposta.objects.filter(
+                avaliacao_id=avaliacao.id
+            ).values_list("pergunta_id", "resposta")
+        ]
+        if not respostas and avaliacao.respostas_bitmask is not None:
+            # Avaliações gravadas sem linhas de Resposta: usa o bitmask
+            decodificadas = avaliacao.decodificar_respostas()
+            respostas = [
+                {
+                    "pergunta": pergunta_id,
+                    "ordem": ordem,
+                    "resposta": decodificadas[ordem],
+                }
+                for pergunta_id, ordem in ordens.items()
+                if ordem in decodificadas
+            ]
+        respostas.sort(key=lambda resposta: resposta["ordem"] or 0)
+
+        return Response(
+            {"avaliacao": AvaliacaoSerializer(avaliacao).data, "respostas": respostas}
+        )
+
     @action(detail=False, methods=["get"])
     def estatisticas(self, request):
         """Retorna estatísticas gerais das avaliações"""
@@ -162,34 +250,91 @@ class AvaliacaoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Estatísticas gerais
-        total_avaliacoes = Avaliacao.objects.count()
-        media_pontuacao = Avaliacao.objects.aggregate(media=Avg("pontuacao_total"))[
-            "media"
-        ]
-
-        # Contagem por nível de sofrimento
-        distribuicao_niveis = (
-            Avaliacao.objects.values("nivel_sofrimento")
-            .annotate(total=Count("id"))
-            .order_by("nivel_sofrimento")
-        )
-
-        # Estatísticas por gênero
-        por_genero = (
-            Avaliacao.objects.values("usuario__genero")
-            .annotate(media=Avg("pontuacao_total"), total=Count("id"))
-            .order_by("usuario__genero")
-        )
+        params = request.query_params
+        parametros = {
+            nome: params[nome]
+            for nome in ("inicio", "fim", "granularidade")
+            if params.get(nome)
+        }
+
+        def calcular():
+            # Lidas das tabelas de resumo mantidas a cada avaliação gravada
+            dados = resumo_estatisticas()
+            # Série temporal opcional: ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD&granularidade=dia|semana|mes
+            if parametros:
+                dados["serie"] = serie_temporal(
+                    inicio=parametros.get("inicio"),
+                    fim=parametros.get("fim"),
+                    granularidade=parametros.get("granularidade", "dia"),
+                )
+            return dados
+
+        try:
+            dados, situacao = em_cache("estatisticas", parametros, calcular)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = Response(dados)
+        response["X-Cache"] = situacao
+        return response
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def tendencias(self, request):
+        """Lista a variação entre avaliações consecutivas de cada usuário
+
+        Filtros: ?usuario=, ?de_nivel=, ?para_nivel= e ?variacao_minima= (1 para
+        listar apenas quem piorou).
+        """
+        params = request.query_params
+        niveis = {nivel for nivel, _ in Avaliacao.NIVEIS_SOFRIMENTO}
+        for nome in ("de_nivel", "para_nivel"):
+            if params.get(nome) and params[nome] not in niveis:
+                return Response(
+                    {"error": f"Nível de sofrimento inválido: {params[nome]}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        try:
+            usuario = int(params["usuario"]) if params.get("usuario") else None
+            variacao_minima = (
+                int(params["variacao_minima"])
+                if params.get("variacao_minima")
+                else None
+            )
+        except ValueError:
+            return Response(
+                {
+                    "error": "Os parâmetros usuario e variacao_minima devem ser inteiros."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response(
-            {
-                "total_avaliacoes": total_avaliacoes,
-                "media_pontuacao": media_pontuacao,
-                "distribuicao_niveis": distribuicao_niveis,
-                "por_genero": por_genero,
-            }
+        pares = variacoes(
+            usuario=usuario,
+            de_nivel=params.get("de_nivel"),
+            para_nivel=params.get("para_nivel"),
+            variacao_minima=variacao_minima,
         )
+        pagina = self.paginate_queryset(pares)
+        serializer = VariacaoAvaliacaoSerializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def transicoes(self, request):
+        """Retorna a matriz de transições entre níveis de sofrimento pré-calculada"""
+        return Response(matriz_transicoes())
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def psicometria(self, request):
+        """Retorna prevalência por pergunta, correlações, alfa de Cronbach e subescalas"""
+        dados, situacao = em_cache("psicometria", {}, psicometria.calcular)
+        response = Response(dados)
+        response["X-Cache"] = situacao
+        return response
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAdminUser])
+    def cache(self, request):
+        """Retorna acertos, falhas e tempos de recálculo do cache de estatísticas"""
+        return Response(obter_cache_analises().metricas())
 
     @action(detail=False, methods=["get"])
     def export(self, request):
@@ -201,9 +346,51 @@ class AvaliacaoViewSet(viewsets.ModelViewSet):
             )
 
         formato = request.query_params.get("formato", "json").lower()
+        if formato not in ("json", "csv", "ndjson", *FORMATOS_COLUNARES):
+            return Response(
+                {
+                    "error": 'Formato não suportado. Use "json", "csv", "ndjson", '
+                    '"parquet" ou "arrow".'
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if formato in FORMATOS_COLUNARES and not pyarrow_disponivel():
+            return Response(
+                {"error": f'O formato "{formato}" requer o pacote pyarrow.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+
+        # ?modo=matriz: uma coluna por pergunta, ordenado por usuário e data
+        modo = request.query_params.get("modo", "avaliacoes")
+        if modo not in ("avaliacoes", "matriz"):
+            return Response(
+                {"error": 'Modo não suportado. Use "avaliacoes" ou "matriz".'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        matriz = modo == "matriz"
+
         avaliacoes = Avaliacao.objects.all().select_related("usuario")
 
+        # Exportação incremental: ?cursor= (vazio na primeira vez) retorna apenas
+        # as avaliações novas e o próximo cursor no cabeçalho X-Cursor-Exportacao
+        cursor = None
+        if "cursor" in request.query_params:
+            try:
+                avaliacoes, cursor = avaliacoes_desde(
+                    request.query_params["cursor"], avaliacoes
+                )
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         if formato == "json":
+            if matriz:
+                return Response(
+                    {
+                        "error": 'O modo "matriz" está disponível nos formatos "csv", '
+                        '"ndjson", "parquet" e "arrow".'
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             data = []
             for avaliacao in avaliacoes:
                 data.append(
@@ -216,39 +403,16 @@ class AvaliacaoViewSet(viewsets.ModelViewSet):
                         "genero": avaliacao.usuario.genero,
                     }
                 )
-            return Response(data)
-
-        elif formato == "csv":
-            buffer = io.StringIO()
-            writer = csv.writer(buffer)
-            writer.writerow(
-                ["ID", "Usuário", "Pontuação", "Nível de Sofrimento", "Data", "Gênero"]
-            )
-
-            for avaliacao in avaliacoes:
-                writer.writerow(
-                    [
-                        avaliacao.id,
-                        avaliacao.usuario.username,
-                        avaliacao.pontuacao_total,
-                        avaliacao.nivel_sofrimento,
-                        avaliacao.data_avaliacao,
-                        avaliacao.usuario.genero,
-                    ]
-                )
+            response = Response(data)
+        else:
+            response = exportar(formato, avaliacoes, matriz)
 
-            buffer.seek(0)
-            response_content = buffer.getvalue()
+        if cursor is not None:
+            response["X-Cursor-Exportacao"] = cursor
+        return response
 
-            return Response(response_content)
-
-        return Response(
-            {"error": 'Formato não suportado. Use "json" ou "csv".'},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
 
-
-class AtividadeSugeridaViewSet(viewsets.ModelViewSet):
+class AtividadeSugeridaViewSet(ProjecaoMixin, viewsets.ModelViewSet):
     queryset = AtividadeSugerida.objects.all()
     serializer_class = AtividadeSugeridaSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -256,9 +420,101 @@ class AtividadeSugeridaViewSet(viewsets.ModelViewSet):
     filterset_fields = ["nivel_sofrimento"]
 
 
-class HistoricoAcessoViewSet(viewsets.ReadOnlyModelViewSet):
+class HistoricoAcessoViewSet(ListagemRapidaMixin, viewsets.ReadOnlyModelViewSet):
+    """Acessos individuais, ou os resumos por hora com ?visao=resumo"""
+
     queryset = HistoricoAcesso.objects.all()
     serializer_class = HistoricoAcessoSerializer
     permission_classes = [permissions.IsAdminUser]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ["usuario", "data_acesso"]
+    pagination_class = PaginacaoPorCursor
+
+    @property
+    def visao_resumo(self):
+        return self.request.query_params.get("visao") == "resumo"
+
+    @property
+    def ordenacao_cursor(self):
+        if self.visao_resumo:
+            return ("-periodo", "-id")
+        return ("-data_acesso", "-id")
+
+    @property
+    def filterset_fields(self):
+        if self.visao_resumo:
+            return ["usuario", "ip", "periodo"]
+        return ["usuario", "data_acesso"]
+
+    def get_queryset(self):
+        if self.visao_resumo:
+            return ResumoAcesso.objects.all()
+        return HistoricoAcesso.objects.all()
+
+    def get_serializer_class(self):
+        if self.visao_resumo:
+            return ResumoAcessoSerializer
+        return self.serializer_class
+
+
+class TarefaExportacaoViewSet(ProjecaoMixin, viewsets.ReadOnlyModelViewSet):
+    """Exportações de avaliações geradas em segundo plano
+
+    POST cria (ou reaproveita) uma tarefa; GET no detalhe acompanha o progresso
+    e /download/ entrega o arquivo, com suporte a Range.
+    """
+
+    queryset = TarefaExportacao.objects.all()
+    serializer_class = TarefaExportacaoSerializer
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ["formato", "situacao"]
+
+    def create(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        formato = serializer.validated_data["formato"]
+        if formato in FORMATOS_COLUNARES and not pyarrow_disponivel():
+            return Response(
+                {"error": f'O formato "{formato}" requer o pacote pyarrow.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+
+        parametros = {}
+        if serializer.validated_data.get("modo", "avaliacoes") == "matriz":
+            parametros["modo"] = "matriz"
+        if "cursor" in serializer.validated_data:
+            try:
+                ler_cursor(serializer.validated_data["cursor"])
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            parametros["cursor"] = serializer.validated_data["cursor"]
+
+        tarefa, criada = criar_tarefa(request.user, formato, parametros)
+        return Response(
+            self.get_serializer(tarefa).data,
+            status=status.HTTP_202_ACCEPTED if criada else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """Entrega o arquivo gerado; envie Range para retomar um download"""
+        tarefa = self.get_object()
+        if tarefa.situacao != "concluida":
+            return Response(
+                {"error": "A exportação ainda não foi concluída."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        caminho = tarefa.arquivo.path
+        if not os.path.exists(caminho):
+            return Response(
+                {"error": "O arquivo desta exportação não está mais disponível."},
+                status=status.HTTP_410_GONE,
+            )
+        content_type, nome_arquivo = arquivo_download(tarefa)
+        return resposta_arquivo(
+            request,
+            caminho,
+            content_type,
+            nome_arquivo,
+            f'"{tarefa.chave[:16]}-{tarefa.id}"',
+        )
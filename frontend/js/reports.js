@@ -13,7 +13,14 @@ async function loadMetrics() {
       return;
     }
 
-    const metricsData = await apiRequest("/avaliacoes/estatisticas/");
+    // Weekly trend over the last 12 weeks
+    const inicio = new Date();
+    inicio.setDate(inicio.getDate() - 7 * 12);
+    const metricsData = await apiRequest(
+      `/avaliacoes/estatisticas/?granularidade=semana&inicio=${inicio
+        .toISOString()
+        .slice(0, 10)}`
+    );
     if (!metricsData) return;
 
     displayMetrics(metricsData);
@@ -70,6 +77,21 @@ function displayMetrics(data) {
     metricsContainer.appendChild(genderCard);
   }
 
+  // Weekly trend
+  if (data.serie && data.serie.length > 0) {
+    const trendCard = document.createElement("div");
+    trendCard.className = "card";
+    trendCard.innerHTML = `
+      <h2 class="card-title">Tendência Semanal</h2>
+      <div class="card-body">
+        <div class="chart-container">
+          <canvas id="trendChart"></canvas>
+        </div>
+      </div>
+    `;
+    metricsContainer.appendChild(trendCard);
+  }
+
   // Data export section
   const exportCard = document.createElement("div");
   exportCard.className = "card";
@@ -203,6 +225,68 @@ function createCharts(data) {
       });
     }
   }
+
+  // Weekly trend chart
+  if (data.serie && data.serie.length > 0) {
+    const ctx = document.getElementById("trendChart");
+    if (ctx) {
+      const labels = data.serie.map((item) => item.periodo);
+
+      new Chart(ctx, {
+        type: "line",
+        data: {
+          labels: labels,
+          datasets: [
+            {
+              label: "Pontuação média",
+              data: data.serie.map((item) => item.media_pontuacao),
+              borderColor: "#2980b9",
+              backgroundColor: "#3498db",
+              yAxisID: "y",
+            },
+            {
+              label: "Avaliações",
+              data: data.serie.map((item) => item.total),
+              borderColor: "#239b56",
+              backgroundColor: "#d4efdf",
+              yAxisID: "y1",
+            },
+          ],
+        },
+        options: {
+          responsive: true,
+          scales: {
+            y: {
+              beginAtZero: true,
+              max: 20,
+              position: "left",
+              title: {
+                display: true,
+                text: "Pontuação média",
+              },
+            },
+            y1: {
+              beginAtZero: true,
+              position: "right",
+              grid: {
+                drawOnChartArea: false,
+              },
+              title: {
+                display: true,
+                text: "Avaliações",
+              },
+            },
+          },
+          plugins: {
+            title: {
+              display: true,
+              text: "Tendência semanal",
+            },
+          },
+        },
+      });
+    }
+  }
 }
 
 // Initialize the reports page
@@ -179,7 +179,10 @@ function displaySRQ20Result() {
 // Load user evaluation history
 async function loadEvaluationHistory() {
   try {
-    const evaluations = await apiRequest("/avaliacoes/");
+    // Only the fields shown in the history list
+    const evaluations = await apiRequest(
+      "/avaliacoes/?fields=id,pontuacao_total,nivel_sofrimento,data_avaliacao"
+    );
     if (!evaluations) return;
 
     const historyContainer = document.getElementById("historyContainer");
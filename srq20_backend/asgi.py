@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'srq20_backend.settings')
 
 application = get_asgi_application()
+
+# Pre-build the in-process caches so the first request is cheap
+from core.atividades import aquecer_atividades  # noqa: E402
+from core.questionario import aquecer_questionario  # noqa: E402
+
+aquecer_questionario()
+aquecer_atividades()
@@ -130,6 +130,15 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
 }
 
+# Largest ?page_size= accepted by the cursor-paginated lists (respostas,
+# avaliacoes, historico-acessos); PAGE_SIZE above is the default.
+SRQ20_PAGINACAO_MAXIMA = 100
+
+# Serve the JSON of the respostas, avaliacoes and historico-acessos lists from
+# .values() rows instead of the ModelSerializers (same bytes; uses orjson when
+# installed). Set to False to always go through the serializers.
+SRQ20_LEITURA_RAPIDA = True
+
 # JWT settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
@@ -167,6 +176,70 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# SRQ-20 submissions
+# When enabled, POST /api/srq20/ answers with 202 and queues the writes in a local
+# SQLite journal, drained by `python manage.py processar_fila_srq20`.
+SRQ20_ESCRITA_ASSINCRONA = False
+SRQ20_FILA_PATH = BASE_DIR / "fila_srq20.sqlite3"
+# Answers are always packed into Avaliacao.respostas_bitmask; set to False to stop
+# also writing one Resposta row per answer.
+SRQ20_GRAVAR_RESPOSTAS_INDIVIDUAIS = True
+
+# Seconds the in-process questionnaire and suggested-activity caches are trusted
+# before they are rebuilt from the database. Writes invalidate them at once in the
+# process that made them; other gunicorn/ASGI workers pick the change up within
+# this period. ETags are derived from the content, so a rebuild with no change
+# keeps them valid.
+SRQ20_CACHE_LOCAL_VALIDADE = 60.0
+
+# How core.middleware.HistoricoAcessoMiddleware stores accesses: "detalhado"
+# writes one HistoricoAcesso row per request, "resumo" keeps only hourly
+# per-user/per-IP counters in ResumoAcesso (no per-request audit rows) and
+# "ambos" does both in the same transaction.
+HISTORICO_ACESSO_MODO = "ambos"
+
+# Access history retention: `python manage.py arquivar_historico_acessos` moves
+# HistoricoAcesso rows older than this many days into compressed daily files.
+HISTORICO_ACESSO_RETENCAO_DIAS = 90
+HISTORICO_ACESSO_ARQUIVO_DIR = os.path.join(BASE_DIR, "arquivo", "historico_acessos")
+
+# Access log buffering for core.middleware.HistoricoAcessoMiddleware
+# Entries are written with bulk_create every TAMANHO_LOTE entries or INTERVALO
+# seconds, and on shutdown. When the buffer holds CAPACIDADE entries new ones are
+# dropped; with POLITICA "amostrar", only 1 in TAXA_AMOSTRAGEM entries is kept
+# once the buffer is half full. Set ATIVO to False to write synchronously.
+HISTORICO_ACESSO_BUFFER = {
+    "ATIVO": True,
+    "TAMANHO_LOTE": 200,
+    "INTERVALO": 5.0,
+    "CAPACIDADE": 10000,
+    "POLITICA": "descartar",
+    "TAXA_AMOSTRAGEM": 10,
+}
+
+# Per-process cache for the admin analytics endpoints (/api/avaliacoes/estatisticas/)
+# Results are reused for TTL seconds. After that, one request recomputes while
+# concurrent ones get the previous result for up to TTL_OBSOLETO seconds. Hit/miss
+# counters and recomputation times are served at /api/avaliacoes/cache/.
+SRQ20_CACHE_ANALISES = {
+    "TTL": 30.0,
+    "TTL_OBSOLETO": 300.0,
+    "MAX_ENTRADAS": 256,
+}
+
+# Background exports (POST /api/exportacoes/)
+# Files are written to MEDIA_ROOT/exportacoes/ by a thread in the web process, or
+# by `python manage.py processar_exportacoes` when EXECUTAR_EM_THREAD is False.
+# A request identical to one made less than JANELA_REUSO seconds ago reuses it.
+# A job still running TEMPO_LIMITE seconds after it started is assumed abandoned
+# (e.g. the process restarted) and marked as failed; keep it above the longest
+# expected export.
+SRQ20_EXPORTACAO = {
+    "JANELA_REUSO": 600,
+    "EXECUTAR_EM_THREAD": True,
+    "TEMPO_LIMITE": 3600,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -36,6 +36,7 @@ from core.views import (
     AvaliacaoViewSet,
     AtividadeSugeridaViewSet,
     HistoricoAcessoViewSet,
+    TarefaExportacaoViewSet,
 )
 
 router = DefaultRouter()
@@ -46,6 +47,7 @@ router.register("srq20", SRQ20ViewSet, basename="srq20")
 router.register("avaliacoes", AvaliacaoViewSet)
 router.register("atividades-sugeridas", AtividadeSugeridaViewSet)
 router.register("historico-acessos", HistoricoAcessoViewSet)
+router.register("exportacoes", TarefaExportacaoViewSet)
 
 urlpatterns = [
     path("admin/", admin.site.urls),